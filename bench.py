@@ -0,0 +1,179 @@
+"""`plox bench`: runs the Lox programs in benchmarks/ on every engine and
+reports their wall time and peak memory.
+
+Every run is a fresh `lox.py` process without the compiled-program cache,
+so times include startup, compilation and execution, and peak memory is
+the high water mark of that process alone.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from lox import ENGINES
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BENCHMARKS = os.path.join(ROOT, "benchmarks")
+# version of the JSON results, bumped when their layout changes
+FORMAT = 1
+
+
+def available() -> List[str]:
+    """Names of the benchmarks, the .lox files in benchmarks/"""
+    return sorted(
+        name[: -len(".lox")] for name in os.listdir(BENCHMARKS) if name.endswith(".lox")
+    )
+
+
+def runOnce(path: str, engine: str) -> Tuple[float, float, int, bytes]:
+    """Runs a benchmark, returning its wall time in seconds, peak memory in
+    megabytes, exit status and output"""
+    command = [sys.executable, os.path.join(ROOT, "lox.py"), "--no-cache"]
+    command += [f"--engine={engine}", path]
+    with tempfile.TemporaryFile() as output:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, stdout=output, stderr=subprocess.DEVNULL)
+        # wait4 instead of wait, for the resource usage of this child only
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+        output.seek(0)
+        stdout = output.read()
+    peak = usage.ru_maxrss / 1024
+    if sys.platform == "darwin":
+        peak /= 1024
+    return elapsed, peak, process.returncode, stdout
+
+
+def measure(name: str, engine: str, runs: int, reference: Optional[bytes]) -> Dict:
+    """Runs a benchmark `runs` times after one warm-up run"""
+    path = os.path.join(BENCHMARKS, f"{name}.lox")
+    result = {"benchmark": name, "engine": engine}
+    _, _, status, stdout = runOnce(path, engine)
+    if status != 0:
+        result["error"] = f"exited with status {status}"
+        return result
+    if reference is not None and stdout != reference:
+        result["error"] = "prints something else than the first engine"
+        return result
+    result["output"] = stdout
+    times = []
+    peaks = []
+    for _ in range(runs):
+        elapsed, peak, _, _ = runOnce(path, engine)
+        times.append(elapsed)
+        peaks.append(peak)
+    result["median"] = statistics.median(times)
+    result["min"] = min(times)
+    result["peakRssMB"] = max(peaks)
+    result["times"] = times
+    return result
+
+
+def compare(result: Dict, baseline: Dict[Tuple[str, str], Dict]) -> Optional[float]:
+    """Relative change of the median from the baseline, None when either run
+    has no time"""
+    before = baseline.get((result["benchmark"], result["engine"]))
+    if before is None or "median" not in before or "median" not in result:
+        return None
+    return result["median"] / before["median"] - 1
+
+
+def main(argv=None) -> int:
+    argparser = argparse.ArgumentParser(
+        prog="plox bench", description=__doc__.split("\n\n")[0]
+    )
+    argparser.add_argument(
+        "benchmarks",
+        nargs="*",
+        help=f"benchmarks to run, all of {available()} by default",
+    )
+    argparser.add_argument("--runs", type=int, default=5, help="timed runs of each")
+    argparser.add_argument(
+        "--engines",
+        default=",".join(ENGINES),
+        help="comma separated engines to run them on, the first one's output is "
+        "the reference the others must print",
+    )
+    argparser.add_argument("--json", help="write the results to this file")
+    argparser.add_argument(
+        "--baseline", help="results written by an earlier --json to compare against"
+    )
+    argparser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="with --baseline, exit with status 1 when a median is this much "
+        "slower, 0.1 by default",
+    )
+    args = argparser.parse_args(argv)
+
+    names = args.benchmarks or available()
+    for name in names:
+        if name not in available():
+            argparser.error(f"no benchmark {name}, the benchmarks are {available()}")
+    engines = args.engines.split(",")
+    for engine in engines:
+        if engine not in ENGINES:
+            argparser.error(f"no engine {engine}, the engines are {ENGINES}")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            for before in json.load(f)["results"]:
+                baseline[(before["benchmark"], before["engine"])] = before
+
+    print(
+        f"{'benchmark':<18}{'engine':<9}{'median s':>10}{'min s':>10}"
+        f"{'peak MB':>10}{'change':>10}"
+    )
+    results = []
+    regressions = 0
+    for name in names:
+        reference = None
+        for engine in engines:
+            result = measure(name, engine, args.runs, reference)
+            if reference is None:
+                reference = result.pop("output", None)
+            result.pop("output", None)
+            results.append(result)
+            line = f"{name:<18}{engine:<9}"
+            if "error" in result:
+                print(f"{line}{result['error']}", flush=True)
+                continue
+            line += (
+                f"{result['median']:>10.3f}{result['min']:>10.3f}"
+                f"{result['peakRssMB']:>10.1f}"
+            )
+            change = compare(result, baseline)
+            if change is not None:
+                line += f"{change:>+10.1%}"
+                if change > args.threshold:
+                    line += "  slower"
+                    regressions += 1
+            print(line, flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {
+                    "format": FORMAT,
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "runs": args.runs,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""Expressions per second of the Pratt parser and the recursive descent it
+replaced, on the same tokens.
+
+    python3 benchmarks/parse_throughput.py [expressions]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser import TokenIter, assignment, expression  # noqa: E402
+from scanner import RegexScanner  # noqa: E402
+from tokens import TokenType  # noqa: E402
+
+EXPRESSIONS = [
+    "1",
+    "count",
+    '"text"',
+    "a + b * c - d / e % f",
+    "(a + b) * (c - d)",
+    "x < y and y <= z or !done",
+    "total = total + price * quantity",
+    "point.x = point.y * -scale",
+    "ready ? first : second",
+    "list.first().next(1, 2, 3).value",
+    "a == b != c >= d",
+    "callback = fun (v) { return v + 1; }",
+]
+
+
+def generate(count: int) -> str:
+    random.seed(0)
+    return ";\n".join(random.choice(EXPRESSIONS) for _ in range(count)) + ";"
+
+
+def parseAll(tokens, parse):
+    ti = TokenIter(tokens)
+    out = []
+    while not ti.isAtEnd():
+        out.append(parse(ti))
+        ti.consume(TokenType.SEMICOLON, "Expect ';' after expression")
+    return out
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    tokens = RegexScanner(generate(count)).scanTokens()
+    print(f"{count} expressions, {len(tokens)} tokens")
+    reference = None
+    for name, parse in [("descent", assignment), ("pratt", expression)]:
+        start = time.perf_counter()
+        nodes = parseAll(tokens, parse)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = nodes
+        elif nodes != reference:
+            raise SystemExit(f"{name} parser gives different nodes")
+        print(
+            f"{name:>7}: {elapsed:.2f}s, {count / elapsed:,.0f} expressions/s, "
+            f"{len(tokens) / elapsed:,.0f} tokens/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Tokens per second, and memory held by the tokens, of each scanner on a
+generated Lox file.
+
+    python3 benchmarks/scan_throughput.py [megabytes]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner import SCANNERS  # noqa: E402
+
+CHUNK = """// chunk {n}: a bit of everything the scanner knows about
+class Shape{n} < Base {{
+  init(width, height) {{ this.width = width; this.height = height; }}
+  area() {{ return this.width * this.height; }}
+}}
+fun fib{n}(n) {{
+  if (n <= 2) return 1;
+  return fib{n}(n - 1) + fib{n}(n - 2);
+}}
+var label{n} = "chunk number {n}";
+for (var i = 0; i < 10.5; i = i + 1) {{
+  if (i % 2 == 0 and !(i >= 8) or i != 3) print label{n} + i;
+}}
+"""
+
+
+def generate(megabytes: float) -> str:
+    chunks = []
+    size = 0
+    n = 0
+    while size < megabytes * 1024 * 1024:
+        chunk = CHUNK.format(n=n)
+        chunks.append(chunk)
+        size += len(chunk)
+        n += 1
+    return "".join(chunks)
+
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+    source = generate(megabytes)
+    print(f"{len(source) / 1024 / 1024:.1f} MB, {source.count(chr(10))} lines")
+    reference = None
+    for name, scanner in SCANNERS.items():
+        start = time.perf_counter()
+        tokens = scanner(source).scanTokens()
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = list(tokens)
+        elif list(tokens) != reference:
+            raise SystemExit(f"{name} scanner gives different tokens")
+        del tokens
+
+        # measured separately, tracing slows the scanners down
+        tracemalloc.start()
+        tokens = scanner(source).scanTokens()
+        held = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(
+            f"{name:>7}: {len(tokens)} tokens in {elapsed:.2f}s, "
+            f"{len(tokens) / elapsed:,.0f} tokens/s, {held / 1024 / 1024:.1f} MB"
+        )
+        del tokens
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Time to first statement: how long after `plox` is started the first
+`print` of a script shows up, for a small script and a large library.
+
+    python3 benchmarks/startup.py [runs] [--socket=PATH]
+
+With --socket, also times `plox --client` against a server already running
+on that socket.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SMALL = 'print "ready";\n'
+
+FUNCTION = """fun f{n}(a, b) {{
+  var c = a * {n} + b;
+  if (c > 10) {{ return c - 1; }} else {{ while (c < 5) c = c + 1; }}
+  return f{n}(c, b);
+}}
+"""
+
+
+def library(functions: int) -> str:
+    body = "".join(FUNCTION.format(n=n) for n in range(functions))
+    return 'print "ready";\n' + body + "print f1(20, 1);\n"
+
+
+def firstStatement(command) -> float:
+    """Seconds until the command prints its first line"""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    process.stdout.readline()
+    elapsed = time.perf_counter() - start
+    process.stdout.close()
+    process.wait()
+    return elapsed
+
+
+def main():
+    runs = 10
+    socket = None
+    for arg in sys.argv[1:]:
+        if arg.startswith("--socket="):
+            socket = arg[len("--socket=") :]
+        else:
+            runs = int(arg)
+
+    configurations = [
+        ("python", ["python3", "-c", "print()"], False),
+        ("no cache", ["python3", "lox.py", "--no-cache"], True),
+        ("cached", ["python3", "lox.py"], True),
+        ("lazy", ["python3", "lox.py", "--no-cache", "--lazy"], True),
+    ]
+    if socket is not None:
+        configurations.append(
+            ("client", ["python3", "server.py", "--client", f"--socket={socket}"], True)
+        )
+
+    with tempfile.TemporaryDirectory() as directory:
+        scripts = []
+        for name, source in [("small", SMALL), ("library", library(2000))]:
+            path = os.path.join(directory, f"{name}.lox")
+            with open(path, "w") as f:
+                f.write(source)
+            scripts.append((name, path))
+
+        print(f"{'':<12}{'script':<10}{'median ms':>10}{'min ms':>10}")
+        for label, command, takesScript in configurations:
+            for name, path in scripts if takesScript else [("-", None)]:
+                full = command + [path] if takesScript else command
+                times = [firstStatement(full) for _ in range(runs)]
+                print(
+                    f"{label:<12}{name:<10}{statistics.median(times) * 1e3:>10.1f}"
+                    f"{min(times) * 1e3:>10.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import gc
+import os
+import sys
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+
+from stmt import Stmt
+
+# entries start with this, followed by the digest of their key
+MAGIC = b"LOXC\x01"
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "plox"
+)
+
+# the modules whose code decides what a source compiles to
+COMPILER_MODULES = [
+    "environment",
+    "expr",
+    "interpreter",
+    "optimizer",
+    "parser",
+    "resolver",
+    "rope",
+    "scanner",
+    "stmt",
+    "tokens",
+    "util",
+]
+
+
+class Compiled(NamedTuple):
+    """A parsed and resolved program"""
+
+    program: List[Stmt]
+    # global names in the order the resolver numbered them, engines intern
+    # them in this order so the slots on the nodes match their globals
+    globals: List[str]
+    # nodes the optimizer removed
+    eliminated: int = 0
+
+
+@lru_cache(maxsize=None)
+def interpreterVersion() -> str:
+    """Digest of the Python version and the sources of the compiler, so any
+    change to either makes earlier entries stale"""
+    import hashlib
+
+    digest = hashlib.sha256(sys.version.encode())
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for module in COMPILER_MODULES:
+        with open(os.path.join(directory, f"{module}.py"), "rb") as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+def cacheKey(content: str, optimizeLevel: int = 0) -> bytes:
+    import hashlib
+
+    digest = hashlib.sha256(interpreterVersion().encode())
+    digest.update(f"-O{optimizeLevel}\0".encode())
+    digest.update(content.encode())
+    return digest.digest()
+
+
+class ProgramCache:
+    """Compiled programs stored in `directory`, one file per source.
+
+    Entries are named by the hash of the source, the optimization level and
+    the interpreter version, and hold a compressed pickle of the `Compiled`
+    program. An entry that can't be read for any reason is a miss, and the
+    program is compiled again and stored over it.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR):
+        self.directory = directory
+
+    def path(self, key: bytes) -> str:
+        return os.path.join(self.directory, f"{key.hex()}.loxc")
+
+    def load(self, content: str, optimizeLevel: int = 0) -> Optional[Compiled]:
+        # imported here, so runs with --no-cache don't pay for them
+        import pickle
+        import zlib
+
+        key = cacheKey(content, optimizeLevel)
+        try:
+            with open(self.path(key), "rb") as entry:
+                data = entry.read()
+        except OSError:
+            return None
+        header = MAGIC + key
+        if not data.startswith(header):
+            return None
+        # the collector would walk the growing tree again and again while it
+        # is unpickled, and an AST has no cycles to collect
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            compiled = pickle.loads(zlib.decompress(data[len(header) :]))
+        except Exception:
+            return None
+        finally:
+            if collecting:
+                gc.enable()
+        if type(compiled) is not Compiled:
+            return None
+        return compiled
+
+    def store(self, content: str, compiled: Compiled, optimizeLevel: int = 0):
+        """Writes an entry, or nothing when the program can't be stored"""
+        import pickle
+        import tempfile
+        import zlib
+
+        key = cacheKey(content, optimizeLevel)
+        try:
+            data = zlib.compress(pickle.dumps(compiled, pickle.HIGHEST_PROTOCOL), 1)
+        except RecursionError:
+            # pickling recurses, programs nested too deep are not cached
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # written aside and renamed, so readers never see half an entry
+            fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "wb") as entry:
+                entry.write(MAGIC + key + data)
+            os.replace(temporary, self.path(key))
+        except OSError:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
@@ -0,0 +1,623 @@
+import operator
+from typing import Any, Callable, Dict, List
+
+from environment import Environment, Globals, Undeclared, Undefined
+from expr import ExprVisitor, Expr, Call, Get, Super
+from interpreter import (
+    ClockFn,
+    JoinFn,
+    LoxClass,
+    LoxFunction,
+    LoxInstance,
+    div,
+    plus,
+    superMethod,
+)
+from stmt import StmtVisitor, Stmt, Function
+from tokens import TokenType
+from util import BREAK, RETURN, TAIL_CALL, Completion, RuntimeException
+
+# A compiled node: takes the environment it runs in and returns its value.
+# Statements return a `Completion` when they return or break.
+Node = Callable[[Environment], Any]
+
+NUMBER_OPERATIONS = {
+    TokenType.MINUS: operator.sub,
+    TokenType.STAR: operator.mul,
+    TokenType.MOD: operator.mod,
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+}
+
+
+def _nonFloat(left, right):
+    if type(left) is not float:
+        return RuntimeException(f"Non-float in number operation: {left}")
+    return RuntimeException(f"Non-float in number operation: {right}")
+
+
+class ClosureCompiler(ExprVisitor, StmtVisitor):
+    """Compiles the resolved AST into nested Python closures.
+
+    Every node is visited once and turned into a closure specialised for
+    that node, e.g. a `+` becomes a function that calls its two operand
+    closures and adds. Running a program then only calls closures, there
+    is no per-node visitor dispatch or operator lookup left.
+    """
+
+    functions: Dict[Function, Node]
+
+    def __init__(self):
+        self.functions = {}
+        # value of the last `return`, read by the function returning
+        self.returnValue = None
+        # (function, this, args) of the tail call being returned
+        self.pendingCall = None
+        self.globals = Globals()
+        self.globals.define(self.globals.index("clock"), ClockFn())
+        self.globals.define(self.globals.index("join"), JoinFn())
+
+    def interpret(self, program: List[Stmt]):
+        compiled = [stmt.visit(self) for stmt in program]
+        for stmt in compiled:
+            stmt(self.globals)
+
+    def executeFunction(self, declaration: Function, env: Environment):
+        return self.functions[declaration](env)
+
+    def sequence(self, statements: List[Stmt]) -> Node:
+        compiled = tuple(stmt.visit(self) for stmt in statements)
+
+        def sequence(env):
+            for stmt in compiled:
+                result = stmt(env)
+                if result.__class__ is Completion:
+                    return result
+
+        return sequence
+
+    # statements
+
+    def visitExpression(self, val):
+        return val.expression.visit(self)
+
+    def visitPrint(self, val):
+        expression = val.expression.visit(self)
+
+        def printStmt(env):
+            print(expression(env))
+
+        return printStmt
+
+    def visitVar(self, val):
+        slot = val.slot
+        value = val.value.visit(self) if val.value is not None else None
+        if val.depth is None:
+            define = self.globals.define
+            if value is None:
+
+                def declareGlobal(env):
+                    define(slot, Undefined)
+
+                return declareGlobal
+
+            def defineGlobal(env):
+                define(slot, value(env))
+
+            return defineGlobal
+
+        if value is None:
+
+            def declare(env):
+                env.values[slot] = Undefined
+
+            return declare
+
+        def defineLocal(env):
+            env.values[slot] = value(env)
+
+        return defineLocal
+
+    def visitBlock(self, val):
+        body = self.sequence(val.statements)
+        size = val.size
+
+        def block(env):
+            return body(Environment(env, size))
+
+        return block
+
+    def visitIfStmt(self, val):
+        condition = val.condition.visit(self)
+        thenBranch = val.thenBranch.visit(self)
+        if val.elseBranch is None:
+
+            def ifStmt(env):
+                test = condition(env)
+                if test is not None and test is not False:
+                    return thenBranch(env)
+
+            return ifStmt
+
+        elseBranch = val.elseBranch.visit(self)
+
+        def ifElseStmt(env):
+            test = condition(env)
+            if test is not None and test is not False:
+                return thenBranch(env)
+            return elseBranch(env)
+
+        return ifElseStmt
+
+    def visitWhileStmt(self, val):
+        condition = val.condition.visit(self)
+        body = val.body.visit(self)
+
+        def whileStmt(env):
+            while True:
+                test = condition(env)
+                if test is None or test is False:
+                    return
+                result = body(env)
+                if result.__class__ is Completion:
+                    if result is BREAK:
+                        return
+                    return result
+
+        return whileStmt
+
+    def visitBreakStmt(self, val):
+        def breakStmt(env):
+            return BREAK
+
+        return breakStmt
+
+    def visitFunction(self, val):
+        self.functions[val] = self.sequence(val.body)
+        if val.name is None:
+
+            def function(env):
+                return LoxFunction(val, env)
+
+            return function
+
+        slot = val.slot
+        if val.depth is None:
+            define = self.globals.define
+
+            def globalDeclaration(env):
+                fn = LoxFunction(val, env)
+                define(slot, fn)
+                return fn
+
+            return globalDeclaration
+
+        def declaration(env):
+            fn = LoxFunction(val, env)
+            env.values[slot] = fn
+            return fn
+
+        return declaration
+
+    def visitReturn(self, val):
+        engine = self
+        if val.expression is None:
+
+            def returnNil(env):
+                engine.returnValue = None
+                return RETURN
+
+            return returnNil
+        if val.tail:
+            return self.tailCall(val.expression)
+
+        expression = val.expression.visit(self)
+
+        def returnStmt(env):
+            engine.returnValue = expression(env)
+            return RETURN
+
+        return returnStmt
+
+    def tailCall(self, val: Call) -> Node:
+        """Compiles `return f(...)` to leave calls to Lox functions to
+        `LoxFunction.run`, like `Interpreter.tailCall`"""
+        callee = val.callee
+        arguments = tuple(arg.visit(self) for arg in val.arguments)
+        argc = len(arguments)
+        engine = self
+
+        if type(callee) is Get:
+            obj = callee.obj.visit(self)
+            cache = callee.cache
+
+            def target(env):
+                instance = obj(env)
+                if type(instance) is not LoxInstance:
+                    raise RuntimeError("Only instances can have proerties")
+                method = cache.find(instance)
+                if method.__class__ is int:
+                    return instance.values[method], None
+                return method, instance
+
+        elif type(callee) is Super:
+            distance = callee.depth - 1
+
+            def target(env):
+                frame = env.ancestor(distance)
+                return superMethod(callee, frame.parent.values[0]), frame.values[0]
+
+        else:
+            function = callee.visit(self)
+
+            def target(env):
+                return function(env), None
+
+        def returnCall(env):
+            function, this = target(env)
+            args = [arg(env) for arg in arguments]
+            callFunc = getattr(function, "call", None)
+            arityFunc = getattr(function, "arity", None)
+            if callFunc is None or arityFunc is None:
+                raise RuntimeException("Can only call functions and classes")
+            if arityFunc() != argc:
+                raise RuntimeException("Wrong arity for function")
+            if type(function) is not LoxFunction:
+                engine.returnValue = callFunc(engine, args)
+                return RETURN
+            if this is None:
+                this = function.receiver
+            engine.pendingCall = (function, this, args)
+            return TAIL_CALL
+
+        return returnCall
+
+    def visitClass(self, val):
+        name = val.name.lexeme
+        superclass = val.superclass.visit(self) if val.superclass else None
+        for method in val.methods:
+            self.functions[method] = self.sequence(method.body)
+        methods = [
+            (method.name.lexeme, method, method.name.lexeme == "init")
+            for method in val.methods
+        ]
+        slot = val.slot
+        isGlobal = val.depth is None
+        globals = self.globals
+
+        def classStmt(env):
+            parent = None
+            if superclass is not None:
+                parent = superclass(env)
+                if type(parent) is not LoxClass:
+                    raise RuntimeException("superclass must be a class")
+
+            if isGlobal:
+                globals.define(slot, None)
+            closure = env
+            if parent is not None:
+                closure = Environment(env, 1)
+                closure.values[0] = parent
+            klass = LoxClass(
+                name,
+                {
+                    methodName: LoxFunction(method, closure, isInit)
+                    for methodName, method, isInit in methods
+                },
+                parent,
+            )
+            if isGlobal:
+                globals.assign(slot, klass)
+            else:
+                env.values[slot] = klass
+
+        return classStmt
+
+    # expressions
+
+    def visitLiteral(self, val):
+        value = val.value
+
+        def literal(env):
+            return value
+
+        return literal
+
+    def visitGrouping(self, val):
+        return val.expr.visit(self)
+
+    def visitUnary(self, val):
+        operand = val.value.visit(self)
+        if val.operator.type == TokenType.MINUS:
+
+            def negate(env):
+                value = operand(env)
+                if not isinstance(value, float):
+                    raise RuntimeException(f"not able to negate number {val} == {value}")
+                return 0 - value
+
+            return negate
+
+        if val.operator.type == TokenType.BANG:
+
+            def bang(env):
+                value = operand(env)
+                return value is None or value is False
+
+            return bang
+
+        raise RuntimeException(f"invalid unary: {val.operator} {val.value}")
+
+    def visitBinary(self, val):
+        operatorType = val.operator.type
+        left = val.left.visit(self)
+        right = val.right.visit(self)
+
+        if operatorType == TokenType.COMMA:
+
+            def comma(env):
+                left(env)
+                return right(env)
+
+            return comma
+
+        if operatorType == TokenType.PLUS:
+
+            def add(env):
+                lhs = left(env)
+                rhs = right(env)
+                if type(lhs) is float and type(rhs) is float:
+                    return lhs + rhs
+                return plus(lhs, rhs)
+
+            return add
+
+        if operatorType == TokenType.EQUAL_EQUAL:
+
+            def equal(env):
+                return left(env) == right(env)
+
+            return equal
+
+        if operatorType == TokenType.BANG_EQUAL:
+
+            def notEqual(env):
+                return left(env) != right(env)
+
+            return notEqual
+
+        if operatorType == TokenType.SLASH:
+
+            def divide(env):
+                lhs = left(env)
+                rhs = right(env)
+                if type(lhs) is float and type(rhs) is float:
+                    return div(lhs, rhs)
+                raise _nonFloat(lhs, rhs)
+
+            return divide
+
+        if operatorType not in NUMBER_OPERATIONS:
+            raise RuntimeException(f"Binary operation not implemented: {val.operator}")
+        opr = NUMBER_OPERATIONS[operatorType]
+
+        def number(env):
+            lhs = left(env)
+            rhs = right(env)
+            if type(lhs) is float and type(rhs) is float:
+                return opr(lhs, rhs)
+            raise _nonFloat(lhs, rhs)
+
+        return number
+
+    def visitTernary(self, val):
+        test = val.test.visit(self)
+        left = val.left.visit(self)
+        right = val.right.visit(self)
+
+        def ternary(env):
+            value = test(env)
+            if value is None or value is False:
+                return right(env)
+            return left(env)
+
+        return ternary
+
+    def visitLogical(self, val):
+        left = val.left.visit(self)
+        right = val.right.visit(self)
+        if val.operator.type == TokenType.OR:
+
+            def logicalOr(env):
+                value = left(env)
+                if value is None or value is False:
+                    return right(env)
+                return value
+
+            return logicalOr
+
+        def logicalAnd(env):
+            value = left(env)
+            if value is None or value is False:
+                return value
+            return right(env)
+
+        return logicalAnd
+
+    def lookup(self, val: Expr, name: str) -> Node:
+        depth = val.depth
+        slot = val.slot
+        if depth is None:
+            get = self.globals.get
+            values = self.globals.values
+
+            def globalVariable(env):
+                value = values[slot]
+                if value is Undefined or value is Undeclared:
+                    return get(slot)
+                return value
+
+            return globalVariable
+
+        if depth == 0:
+
+            def local(env):
+                return env.values[slot]
+
+            return local
+
+        if depth == 1:
+
+            def enclosing(env):
+                return env.parent.values[slot]
+
+            return enclosing
+
+        def ancestor(env):
+            return env.ancestor(depth).values[slot]
+
+        return ancestor
+
+    def visitVariable(self, val):
+        return self.lookup(val, val.name.lexeme)
+
+    def visitThis(self, val):
+        return self.lookup(val, "this")
+
+    def visitAssign(self, val):
+        value = val.value.visit(self)
+        depth = val.depth
+        slot = val.slot
+        if depth is None:
+            assign = self.globals.assign
+
+            def assignGlobal(env):
+                result = value(env)
+                assign(slot, result)
+                return result
+
+            return assignGlobal
+
+        def assignLocal(env):
+            result = value(env)
+            env.ancestor(depth).values[slot] = result
+            return result
+
+        return assignLocal
+
+    def visitSuper(self, val):
+        distance = val.depth - 1
+
+        def superBound(env):
+            frame = env.ancestor(distance)
+            return superMethod(val, frame.parent.values[0]).bind(frame.values[0])
+
+        return superBound
+
+    def invokeSuper(self, val: Call) -> Node:
+        """Compiles `super.name(...)` to call the method without binding it"""
+        node = val.callee
+        distance = node.depth - 1
+        arguments = tuple(arg.visit(self) for arg in val.arguments)
+        argc = len(arguments)
+        engine = self
+
+        def invoke(env):
+            frame = env.ancestor(distance)
+            method = superMethod(node, frame.parent.values[0])
+            args = [arg(env) for arg in arguments]
+            if method.arity() != argc:
+                raise RuntimeException("Wrong arity for function")
+            return method.invoke(engine, frame.values[0], args)
+
+        return invoke
+
+    def visitCall(self, val):
+        if type(val.callee) is Get:
+            return self.invoke(val)
+        if type(val.callee) is Super:
+            return self.invokeSuper(val)
+        callee = val.callee.visit(self)
+        arguments = tuple(arg.visit(self) for arg in val.arguments)
+        argc = len(arguments)
+        engine = self
+
+        def call(env):
+            function = callee(env)
+            args = [arg(env) for arg in arguments]
+            callFunc = getattr(function, "call", None)
+            arityFunc = getattr(function, "arity", None)
+            if callFunc is None or arityFunc is None:
+                raise RuntimeException("Can only call functions and classes")
+            if arityFunc() != argc:
+                raise RuntimeException("Wrong arity for function")
+            return callFunc(engine, args)
+
+        return call
+
+    def invoke(self, val: Call) -> Node:
+        """Compiles `obj.name(...)` to call the method without binding it"""
+        obj = val.callee.obj.visit(self)
+        cache = val.callee.cache
+        arguments = tuple(arg.visit(self) for arg in val.arguments)
+        argc = len(arguments)
+        engine = self
+
+        def invoke(env):
+            instance = obj(env)
+            if type(instance) is not LoxInstance:
+                raise RuntimeError("Only instances can have proerties")
+            if instance.shape is cache.methodShape:
+                method = cache.method
+            else:
+                method = cache.find(instance)
+                if method.__class__ is int:
+                    function = instance.values[method]
+                    args = [arg(env) for arg in arguments]
+                    callFunc = getattr(function, "call", None)
+                    arityFunc = getattr(function, "arity", None)
+                    if callFunc is None or arityFunc is None:
+                        raise RuntimeException("Can only call functions and classes")
+                    if arityFunc() != argc:
+                        raise RuntimeException("Wrong arity for function")
+                    return callFunc(engine, args)
+            args = [arg(env) for arg in arguments]
+            if method.arity() != argc:
+                raise RuntimeException("Wrong arity for function")
+            return method.invoke(engine, instance, args)
+
+        return invoke
+
+    def visitGet(self, val):
+        obj = val.obj.visit(self)
+        cache = val.cache
+
+        def get(env):
+            instance = obj(env)
+            if type(instance) is not LoxInstance:
+                raise RuntimeError("Only instances can have proerties")
+            if instance.shape is cache.shape:
+                return instance.values[cache.slot]
+            return cache.get(instance)
+
+        return get
+
+    def visitSet(self, val):
+        obj = val.obj.visit(self)
+        value = val.val.visit(self)
+        cache = val.cache
+
+        def set(env):
+            instance = obj(env)
+            if type(instance) != LoxInstance:
+                raise RuntimeError("Only instances have fields")
+            result = value(env)
+            if instance.shape is cache.shape:
+                instance.values[cache.slot] = result
+            else:
+                cache.set(instance, result)
+            return result
+
+        return set
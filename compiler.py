@@ -0,0 +1,518 @@
+from enum import IntEnum
+from typing import Any, Dict, List, Optional, Tuple
+
+from environment import Undefined
+from interpreter import PropertyCache
+from expr import ExprVisitor
+from stmt import StmtVisitor, Stmt, Function
+from tokens import TokenType, Token
+from util import RuntimeException
+
+
+class OpCode(IntEnum):
+    CONSTANT = 0
+    NIL = 1
+    TRUE = 2
+    FALSE = 3
+    POP = 4
+    GET_LOCAL = 5
+    SET_LOCAL = 6
+    GET_GLOBAL = 7
+    DEFINE_GLOBAL = 8
+    SET_GLOBAL = 9
+    GET_UPVALUE = 10
+    SET_UPVALUE = 11
+    GET_PROPERTY = 12
+    SET_PROPERTY = 13
+    GET_SUPER = 14
+    EQUAL = 15
+    NOT_EQUAL = 16
+    GREATER = 17
+    GREATER_EQUAL = 18
+    LESS = 19
+    LESS_EQUAL = 20
+    ADD = 21
+    SUBTRACT = 22
+    MULTIPLY = 23
+    DIVIDE = 24
+    MODULO = 25
+    NOT = 26
+    NEGATE = 27
+    PRINT = 28
+    JUMP = 29
+    JUMP_IF_FALSE = 30
+    JUMP_IF_TRUE = 31
+    POP_JUMP_IF_FALSE = 32
+    LOOP = 33
+    CALL = 34
+    CLOSURE = 35
+    CLOSE_UPVALUE = 36
+    RETURN = 37
+    CLASS = 38
+
+
+# Number of inline operands that follow each opcode in the code list.
+OPERAND_COUNT = {
+    OpCode.CONSTANT: 1,
+    OpCode.GET_LOCAL: 1,
+    OpCode.SET_LOCAL: 1,
+    OpCode.GET_GLOBAL: 1,
+    OpCode.DEFINE_GLOBAL: 1,
+    OpCode.SET_GLOBAL: 1,
+    OpCode.GET_UPVALUE: 1,
+    OpCode.SET_UPVALUE: 1,
+    OpCode.GET_PROPERTY: 1,
+    OpCode.SET_PROPERTY: 1,
+    OpCode.GET_SUPER: 1,
+    OpCode.JUMP: 1,
+    OpCode.JUMP_IF_FALSE: 1,
+    OpCode.JUMP_IF_TRUE: 1,
+    OpCode.POP_JUMP_IF_FALSE: 1,
+    OpCode.LOOP: 1,
+    OpCode.CALL: 1,
+    OpCode.CLOSURE: 1,
+    OpCode.CLASS: 3,
+}
+
+# Opcodes whose first operand indexes into the constant pool.
+CONSTANT_OPERAND_OPCODES = {
+    OpCode.CONSTANT,
+    OpCode.GET_GLOBAL,
+    OpCode.DEFINE_GLOBAL,
+    OpCode.SET_GLOBAL,
+    OpCode.GET_PROPERTY,
+    OpCode.SET_PROPERTY,
+    OpCode.GET_SUPER,
+    OpCode.CLOSURE,
+    OpCode.CLASS,
+}
+
+BINARY_OPCODES = {
+    TokenType.PLUS: OpCode.ADD,
+    TokenType.MINUS: OpCode.SUBTRACT,
+    TokenType.STAR: OpCode.MULTIPLY,
+    TokenType.MOD: OpCode.MODULO,
+    TokenType.SLASH: OpCode.DIVIDE,
+    TokenType.BANG_EQUAL: OpCode.NOT_EQUAL,
+    TokenType.EQUAL_EQUAL: OpCode.EQUAL,
+    TokenType.LESS: OpCode.LESS,
+    TokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+    TokenType.GREATER: OpCode.GREATER,
+    TokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+}
+
+
+class FunctionProto:
+    """The compiled form of a function body.
+
+    `code` is a flat list of opcodes with their operands inlined, jump
+    operands are absolute offsets into `code` and `lines` maps every
+    offset back to a source line.
+    """
+
+    def __init__(self, name: str, arity: int = 0, kind: str = "function"):
+        self.name = name
+        self.arity = arity
+        self.kind = kind
+        self.code: List[int] = []
+        self.lines: List[int] = []
+        self.constants: List[Any] = []
+        self.upvalues: List[Tuple[bool, int]] = []
+
+    def __repr__(self):
+        return f"<proto {self.name}>"
+
+
+class _Local:
+    def __init__(self, name: str, depth: int):
+        self.name = name
+        self.depth = depth
+        self.captured = False
+
+
+class _Loop:
+    def __init__(self, scopeDepth: int):
+        self.scopeDepth = scopeDepth
+        self.breaks: List[int] = []
+
+
+class _FunctionState:
+    def __init__(self, proto: FunctionProto, enclosing, receiver: str = ""):
+        self.proto = proto
+        self.enclosing: Optional[_FunctionState] = enclosing
+        # slot zero holds the callee, or `this` for methods
+        self.locals: List[_Local] = [_Local(receiver, 0)]
+        self.scopeDepth = 0
+        self.loops: List[_Loop] = []
+        self.constantIndex: Dict[Tuple[type, Any], int] = {}
+
+
+class Compiler(ExprVisitor, StmtVisitor):
+    """Compiles a resolved program into bytecode for the `vm` engine."""
+
+    def __init__(self):
+        self.state: _FunctionState = None
+        self.line = 1
+
+    def compile(self, program: List[Stmt]) -> FunctionProto:
+        self.state = _FunctionState(FunctionProto("script"), None)
+        for stmt in program:
+            stmt.visit(self)
+        self.emit(OpCode.NIL)
+        self.emit(OpCode.RETURN)
+        return self.state.proto
+
+    # emitting
+
+    def emit(self, *code: int):
+        proto = self.state.proto
+        for c in code:
+            proto.code.append(int(c))
+            proto.lines.append(self.line)
+
+    def emitJump(self, op: OpCode) -> int:
+        self.emit(op, -1)
+        return len(self.state.proto.code) - 1
+
+    def patchJump(self, offset: int):
+        self.state.proto.code[offset] = len(self.state.proto.code)
+
+    def makeConstant(self, value: Any) -> int:
+        state = self.state
+        key = (type(value), value)
+        if key not in state.constantIndex:
+            state.constantIndex[key] = len(state.proto.constants)
+            state.proto.constants.append(value)
+        return state.constantIndex[key]
+
+    def identifier(self, name: Token) -> int:
+        self.line = name.line
+        return self.makeConstant(name.lexeme)
+
+    # scopes and variables
+
+    def beginScope(self):
+        self.state.scopeDepth += 1
+
+    def endScope(self):
+        state = self.state
+        state.scopeDepth -= 1
+        while state.locals and state.locals[-1].depth > state.scopeDepth:
+            local = state.locals.pop()
+            self.emit(OpCode.CLOSE_UPVALUE if local.captured else OpCode.POP)
+
+    def addLocal(self, name: Token):
+        state = self.state
+        for local in reversed(state.locals):
+            if local.depth != -1 and local.depth < state.scopeDepth:
+                break
+            if local.name == name.lexeme:
+                raise RuntimeException(f"Variable already defined: {name.lexeme}")
+        state.locals.append(_Local(name.lexeme, -1))
+
+    def markInitialized(self):
+        self.state.locals[-1].depth = self.state.scopeDepth
+
+    def resolveLocal(self, state: _FunctionState, name: Token) -> int:
+        for i in range(len(state.locals) - 1, -1, -1):
+            local = state.locals[i]
+            if local.name == name.lexeme:
+                if local.depth == -1:
+                    raise RuntimeException(
+                        f"Can't read local variable in its own initializer: {name.lexeme}"
+                    )
+                return i
+        return -1
+
+    def addUpvalue(self, state: _FunctionState, isLocal: bool, index: int) -> int:
+        upvalues = state.proto.upvalues
+        if (isLocal, index) in upvalues:
+            return upvalues.index((isLocal, index))
+        upvalues.append((isLocal, index))
+        return len(upvalues) - 1
+
+    def resolveUpvalue(self, state: _FunctionState, name: Token) -> int:
+        if state.enclosing is None:
+            return -1
+        local = self.resolveLocal(state.enclosing, name)
+        if local != -1:
+            state.enclosing.locals[local].captured = True
+            return self.addUpvalue(state, True, local)
+        upvalue = self.resolveUpvalue(state.enclosing, name)
+        if upvalue != -1:
+            return self.addUpvalue(state, False, upvalue)
+        return -1
+
+    def namedVariable(self, name: Token, assign: bool):
+        self.line = name.line
+        arg = self.resolveLocal(self.state, name)
+        if arg != -1:
+            op = OpCode.SET_LOCAL if assign else OpCode.GET_LOCAL
+        else:
+            arg = self.resolveUpvalue(self.state, name)
+            if arg != -1:
+                op = OpCode.SET_UPVALUE if assign else OpCode.GET_UPVALUE
+            else:
+                arg = self.identifier(name)
+                op = OpCode.SET_GLOBAL if assign else OpCode.GET_GLOBAL
+        self.emit(op, arg)
+
+    def declareVariable(self, name: Token):
+        if self.state.scopeDepth > 0:
+            self.addLocal(name)
+
+    def defineVariable(self, name: Token):
+        if self.state.scopeDepth > 0:
+            self.markInitialized()
+            return
+        self.emit(OpCode.DEFINE_GLOBAL, self.identifier(name))
+
+    # statements
+
+    def visitExpression(self, val):
+        val.expression.visit(self)
+        self.emit(OpCode.POP)
+
+    def visitPrint(self, val):
+        val.expression.visit(self)
+        self.emit(OpCode.PRINT)
+
+    def visitVar(self, val):
+        self.declareVariable(val.name)
+        if val.value is not None:
+            val.value.visit(self)
+        else:
+            self.emit(OpCode.CONSTANT, self.makeConstant(Undefined))
+        self.defineVariable(val.name)
+
+    def visitBlock(self, val):
+        self.beginScope()
+        for stmt in val.statements:
+            stmt.visit(self)
+        self.endScope()
+
+    def visitIfStmt(self, val):
+        val.condition.visit(self)
+        elseJump = self.emitJump(OpCode.POP_JUMP_IF_FALSE)
+        val.thenBranch.visit(self)
+        if val.elseBranch is None:
+            self.patchJump(elseJump)
+            return
+        endJump = self.emitJump(OpCode.JUMP)
+        self.patchJump(elseJump)
+        val.elseBranch.visit(self)
+        self.patchJump(endJump)
+
+    def visitWhileStmt(self, val):
+        loopStart = len(self.state.proto.code)
+        val.condition.visit(self)
+        exitJump = self.emitJump(OpCode.POP_JUMP_IF_FALSE)
+
+        loop = _Loop(self.state.scopeDepth)
+        self.state.loops.append(loop)
+        val.body.visit(self)
+        self.state.loops.pop()
+
+        self.emit(OpCode.LOOP, loopStart)
+        self.patchJump(exitJump)
+        for offset in loop.breaks:
+            self.patchJump(offset)
+
+    def visitBreakStmt(self, val):
+        if not self.state.loops:
+            raise RuntimeException("Can't break outside of a loop")
+        loop = self.state.loops[-1]
+        # unwind the locals of every scope that the break jumps out of
+        for local in reversed(self.state.locals):
+            if local.depth <= loop.scopeDepth:
+                break
+            self.emit(OpCode.CLOSE_UPVALUE if local.captured else OpCode.POP)
+        loop.breaks.append(self.emitJump(OpCode.JUMP))
+
+    def function(self, val: Function, kind: str):
+        name = val.name.lexeme if val.name is not None else "lambda"
+        proto = FunctionProto(name, len(val.params), kind)
+        receiver = "this" if kind in {"method", "initializer"} else ""
+        self.state = _FunctionState(proto, self.state, receiver)
+        self.beginScope()
+        for param in val.params:
+            self.addLocal(param)
+            self.markInitialized()
+        for stmt in val.body:
+            stmt.visit(self)
+        self.emitReturn()
+        self.state = self.state.enclosing
+        self.emit(OpCode.CLOSURE, self.makeConstant(proto))
+
+    def emitReturn(self):
+        if self.state.proto.kind == "initializer":
+            self.emit(OpCode.GET_LOCAL, 0)
+        else:
+            self.emit(OpCode.NIL)
+        self.emit(OpCode.RETURN)
+
+    def visitFunction(self, val):
+        if val.name is None:
+            self.function(val, "lambda")
+            return
+        self.declareVariable(val.name)
+        if self.state.scopeDepth > 0:
+            self.markInitialized()
+        self.function(val, "function")
+        self.defineVariable(val.name)
+
+    def visitReturn(self, val):
+        self.line = val.keyword.line
+        if val.expression is None:
+            self.emitReturn()
+            return
+        val.expression.visit(self)
+        self.emit(OpCode.RETURN)
+
+    def visitClass(self, val):
+        name = self.identifier(val.name)
+        self.declareVariable(val.name)
+        self.emit(OpCode.NIL)
+        self.defineVariable(val.name)
+
+        if val.superclass is not None:
+            val.superclass.visit(self)
+            self.beginScope()
+            self.addLocal(Token(TokenType.SUPER, "super", None, val.name.line))
+            self.markInitialized()
+
+        for method in val.methods:
+            kind = "method"
+            if method.name.lexeme == "init":
+                kind = "initializer"
+            self.function(method, kind)
+
+        self.line = val.name.line
+        self.emit(OpCode.CLASS, name, len(val.methods), val.superclass is not None)
+        self.namedVariable(val.name, assign=True)
+        self.emit(OpCode.POP)
+
+        if val.superclass is not None:
+            self.endScope()
+
+    # expressions
+
+    def visitLiteral(self, val):
+        if val.value is None:
+            self.emit(OpCode.NIL)
+        elif val.value is True:
+            self.emit(OpCode.TRUE)
+        elif val.value is False:
+            self.emit(OpCode.FALSE)
+        else:
+            self.emit(OpCode.CONSTANT, self.makeConstant(val.value))
+
+    def visitGrouping(self, val):
+        val.expr.visit(self)
+
+    def visitUnary(self, val):
+        val.value.visit(self)
+        self.line = val.operator.line
+        if val.operator.type == TokenType.MINUS:
+            self.emit(OpCode.NEGATE)
+        elif val.operator.type == TokenType.BANG:
+            self.emit(OpCode.NOT)
+        else:
+            raise RuntimeException(f"invalid unary: {val.operator} {val.value}")
+
+    def visitBinary(self, val):
+        if val.operator.type == TokenType.COMMA:
+            val.left.visit(self)
+            self.emit(OpCode.POP)
+            val.right.visit(self)
+            return
+
+        if val.operator.type not in BINARY_OPCODES:
+            raise RuntimeException(f"Binary operation not implemented: {val.operator}")
+        val.left.visit(self)
+        val.right.visit(self)
+        self.line = val.operator.line
+        self.emit(BINARY_OPCODES[val.operator.type])
+
+    def visitTernary(self, val):
+        val.test.visit(self)
+        elseJump = self.emitJump(OpCode.POP_JUMP_IF_FALSE)
+        val.left.visit(self)
+        endJump = self.emitJump(OpCode.JUMP)
+        self.patchJump(elseJump)
+        val.right.visit(self)
+        self.patchJump(endJump)
+
+    def visitLogical(self, val):
+        val.left.visit(self)
+        if val.operator.type == TokenType.OR:
+            endJump = self.emitJump(OpCode.JUMP_IF_TRUE)
+        else:
+            endJump = self.emitJump(OpCode.JUMP_IF_FALSE)
+        self.emit(OpCode.POP)
+        val.right.visit(self)
+        self.patchJump(endJump)
+
+    def visitVariable(self, val):
+        self.namedVariable(val.name, assign=False)
+
+    def visitAssign(self, val):
+        val.value.visit(self)
+        self.namedVariable(val.name, assign=True)
+
+    def visitCall(self, val):
+        val.callee.visit(self)
+        for arg in val.arguments:
+            arg.visit(self)
+        self.line = val.paren.line
+        self.emit(OpCode.CALL, len(val.arguments))
+
+    def property(self, name: Token) -> int:
+        # super operands keep the whole token for its line
+        self.line = name.line
+        return self.makeConstant(name)
+
+    def propertyCache(self, name: Token) -> int:
+        # every site gets its own cache, caches never compare equal so
+        # they are not deduplicated
+        self.line = name.line
+        return self.makeConstant(PropertyCache(name.lexeme))
+
+    def visitGet(self, val):
+        val.obj.visit(self)
+        self.emit(OpCode.GET_PROPERTY, self.propertyCache(val.name))
+
+    def visitSet(self, val):
+        val.obj.visit(self)
+        val.val.visit(self)
+        self.emit(OpCode.SET_PROPERTY, self.propertyCache(val.name))
+
+    def visitThis(self, val):
+        self.namedVariable(val.keyword, assign=False)
+
+    def visitSuper(self, val):
+        self.namedVariable(Token(TokenType.THIS, "this", None, val.keyword.line), False)
+        self.namedVariable(val.keyword, assign=False)
+        self.emit(OpCode.GET_SUPER, self.property(val.method))
+
+
+def disassemble(proto: FunctionProto) -> str:
+    """Renders `proto` and every function nested in it as readable text."""
+    out = [f"== {proto.name} =="]
+    code = proto.code
+    offset = 0
+    while offset < len(code):
+        op = OpCode(code[offset])
+        count = OPERAND_COUNT.get(op, 0)
+        operands = code[offset + 1 : offset + 1 + count]
+        text = f"{offset:04d} {proto.lines[offset]:4d} {op.name:<18}"
+        if operands:
+            text += " ".join(str(o) for o in operands)
+        if op in CONSTANT_OPERAND_OPCODES:
+            text += f" ({proto.constants[operands[0]]!r})"
+        out.append(text)
+        offset += 1 + count
+    for constant in proto.constants:
+        if isinstance(constant, FunctionProto):
+            out.append(disassemble(constant))
+    return "\n".join(out)
@@ -1,53 +1,84 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from util import RuntimeException
-from tokens import Token
 
 
 class Undefined:
     pass
 
 
-class Environment:
-    data: Dict[str, Any]
+class Undeclared:
+    """Value of a global slot whose name was resolved but never declared"""
 
-    def __init__(self, parent=None):
-        self.parent: Optional[Environment] = parent
-        self.data = {}
 
-    def define(self, name, value: Any = Undefined):
-        if name in self.data:
-            raise RuntimeException(f"Variable already defined: {name}")
-        self.data[name] = value
+class Globals:
+    """The top level variables.
+
+    The resolver interns every global name to a fixed index, so reads and
+    writes are a list index plus identity checks against the `Undefined`
+    and `Undeclared` sentinels.
+    """
+
+    names: Dict[str, int]
+    values: List[Any]
+
+    def __init__(self):
+        self.names = {}
+        self.keys: List[str] = []
+        self.values = []
+
+    def index(self, name: str) -> int:
+        index = self.names.get(name)
+        if index is None:
+            index = self.names[name] = len(self.values)
+            self.keys.append(name)
+            self.values.append(Undeclared)
+        return index
 
-    def assign(self, name, value):
-        if name in self.data:
-            self.data[name] = value
-            return
-        if self.parent:
-            return self.parent.assign(name, value)
+    def define(self, index: int, value: Any = Undefined):
+        if self.values[index] is not Undeclared:
+            raise RuntimeException(f"Variable already defined: {self.keys[index]}")
+        self.values[index] = value
 
-        raise RuntimeException(f"Assignment to undefined variable: {name}")
+    def assign(self, index: int, value: Any):
+        if self.values[index] is Undeclared:
+            raise RuntimeException(
+                f"Assignment to undefined variable: {self.keys[index]}"
+            )
+        self.values[index] = value
 
-    def get(self, name):
-        if name in self.data:
-            value = self.data[name]
-            if value == Undefined:
-                raise RuntimeException(f"Variable initialized but not defined: {name}")
-            return self.data[name]
-        if self.parent:
-            return self.parent.get(name)
+    def get(self, index: int) -> Any:
+        value = self.values[index]
+        if value is Undefined:
+            raise RuntimeException(
+                f"Variable initialized but not defined: {self.keys[index]}"
+            )
+        if value is Undeclared:
+            raise RuntimeException(f"Get to undefined variable: {self.keys[index]}")
+        return value
 
-        raise RuntimeException(f"Get to undefined variable: {name}")
 
-    def getAt(self, depth: int, name: str) -> Any:
-        return self.ancestor(depth).data[name]
+class Environment:
+    """A frame of local variables.
+
+    The resolver gives every local a slot in the scope declaring it, so a
+    frame is a fixed size list and variables are found by walking up
+    `depth` parents and indexing `values`.
+    """
+
+    __slots__ = ("parent", "values")
+
+    def __init__(self, parent=None, size: int = 0):
+        self.parent: Optional[Environment] = parent
+        self.values: List[Any] = [Undefined] * size
+
+    def getAt(self, depth: int, slot: int) -> Any:
+        return self.ancestor(depth).values[slot]
 
     def ancestor(self, depth: int):
         cur = self
         for _ in range(depth):
-            if cur.parent:
-                cur = cur.parent
+            cur = cur.parent
         return cur
 
-    def assignAt(self, depth: int, name: Token, value: Any):
-        self.ancestor(depth).data[name.lexeme] = value
+    def assignAt(self, depth: int, slot: int, value: Any):
+        self.ancestor(depth).values[slot] = value
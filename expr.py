@@ -1,4 +1,4 @@
-from typing import Any, List, NamedTuple
+from typing import Any, List, NamedTuple, Optional
 
 from tokens import Token
 from abc import ABC, abstractmethod
@@ -33,7 +33,9 @@ class _Unary(NamedTuple):
 
 
 class Unary(Expr, _Unary):
-    pass
+    # handler the interpreter specialized the node to after its first
+    # evaluation, False once it fell back to the generic path
+    quick: Any = None
 
 
 class _Grouping(NamedTuple):
@@ -61,7 +63,8 @@ class _Binary(NamedTuple):
 
 
 class Binary(Expr, _Binary):
-    pass
+    # specialized handler, like `Unary.quick`
+    quick: Any = None
 
 
 class _Variable(NamedTuple):
@@ -69,7 +72,14 @@ class _Variable(NamedTuple):
 
 
 class Variable(Expr, _Variable):
-    pass
+    # set by the resolver: `depth` is the number of scopes between the use
+    # and the declaration, and `slot` the index of the variable in that
+    # scope. Globals keep depth None, their slot indexes the global table.
+    # `Assign`, `This` and `Super` use the same two attributes, and so do
+    # the `Var`, `Function` and `Class` declarations, which always resolve
+    # to their own scope: depth 0, or None for globals
+    depth: Optional[int] = None
+    slot: int = 0
 
 
 class _Assign(NamedTuple):
@@ -78,7 +88,8 @@ class _Assign(NamedTuple):
 
 
 class Assign(Expr, _Assign):
-    pass
+    depth: Optional[int] = None
+    slot: int = 0
 
 
 class _Logical(NamedTuple):
@@ -88,7 +99,8 @@ class _Logical(NamedTuple):
 
 
 class Logical(Expr, _Logical):
-    pass
+    # specialized handler, like `Unary.quick`
+    quick: Any = None
 
 
 class _Get(NamedTuple):
@@ -97,7 +109,8 @@ class _Get(NamedTuple):
 
 
 class Get(Expr, _Get):
-    pass
+    # `PropertyCache` of the site, set by the resolver
+    cache: Any = None
 
 
 class _Set(NamedTuple):
@@ -107,7 +120,8 @@ class _Set(NamedTuple):
 
 
 class Set(Expr, _Set):
-    pass
+    # `PropertyCache` of the site, set by the resolver
+    cache: Any = None
 
 
 class _This(NamedTuple):
@@ -115,7 +129,9 @@ class _This(NamedTuple):
 
 
 class This(_This, Expr):
-    pass
+    # `this` is always local: slot 0 of the method's frame
+    depth: Optional[int] = None
+    slot: int = 0
 
 
 class _Super(NamedTuple):
@@ -124,7 +140,12 @@ class _Super(NamedTuple):
 
 
 class Super(_Super, Expr):
-    pass
+    # `super` is always local: slot 0 of the scope around the methods
+    depth: Optional[int] = None
+    slot: int = 0
+    # the method found last, and the superclass it was found on
+    target: Any = None
+    targetClass: Any = None
 
 
 class ExprVisitor(ABC):
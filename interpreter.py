@@ -1,14 +1,15 @@
 import time
 import operator
 from abc import ABC, abstractmethod
-from typing import List, Any, Dict, NamedTuple
+from typing import List, Any, Dict, NamedTuple, Optional
 
-from environment import Environment, Undefined
-from expr import ExprVisitor, Expr
+from environment import Environment, Globals, Undeclared, Undefined
+from expr import ExprVisitor, Expr, Call, Get, Super
 from util import ToDoException
-from stmt import StmtVisitor, Function, Block
+from stmt import StmtVisitor, Stmt, Function, Block
 from tokens import TokenType, Token
-from util import BreakException, RuntimeException, ReturnException
+from util import BREAK, RETURN, TAIL_CALL, Completion, RuntimeException
+from rope import Rope, concat, join
 
 
 def isTruthy(value):
@@ -22,8 +23,8 @@ def isTruthy(value):
 def plus(left, right):
     if type(left) == type(right) == float:
         return operator.add(left, right)
-    if type(left) == str and type(right) in [float, str]:
-        return f"{left}{right}"
+    if type(left) in [str, Rope] and type(right) in [float, str, Rope]:
+        return concat(left, right)
 
     raise RuntimeException(f"Unknown behavior for `+` with values: {left} and {right}")
 
@@ -59,15 +60,66 @@ NUMBER_BINARY_OPERATIONS = {
 }
 
 
-class Interpreter(ExprVisitor, StmtVisitor):
-    locals: Dict[Expr, int]
-    """"""
+def negate(value):
+    return 0 - value
+
+
+def alwaysTrue(value):
+    return True
+
+
+def alwaysFalse(value):
+    return False
+
+
+# Specialized operations for the operand types a node has seen, keyed by
+# (operator, left type, right type). They skip the checks of the generic
+# path, so only pairs the generic path would accept are listed
+QUICK_BINARY = {
+    (TokenType.PLUS, float, float): operator.add,
+}
+for _left in (str, Rope):
+    for _right in (str, Rope, float):
+        QUICK_BINARY[(TokenType.PLUS, _left, _right)] = concat
+for _type in NUMBER_BINARY_OPERATIONS:
+    QUICK_BINARY[(_type, float, float)] = BINARY_OPERATIONS[_type]
+for _type in (TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL):
+    for _operand in (float, str, Rope, bool, type(None)):
+        QUICK_BINARY[(_type, _operand, _operand)] = BINARY_OPERATIONS[_type]
+
+# keyed by (operator, operand type)
+QUICK_UNARY = {
+    (TokenType.MINUS, float): negate,
+    (TokenType.BANG, bool): operator.not_,
+    (TokenType.BANG, type(None)): alwaysTrue,
+    (TokenType.BANG, float): alwaysFalse,
+    (TokenType.BANG, str): alwaysFalse,
+    (TokenType.BANG, Rope): alwaysFalse,
+}
+
+
+def superMethod(val: Super, superclass: "LoxClass"):
+    """The method `super.name` names, cached on the node per superclass"""
+    if superclass is val.targetClass:
+        return val.target
+    method = superclass.findMethod(val.method.lexeme)
+    if method is None:
+        raise Exception(f"undefined method: {val.method.lexeme}")
+    val.targetClass = superclass
+    val.target = method
+    return method
+
 
+class Interpreter(ExprVisitor, StmtVisitor):
     def __init__(self):
-        self.locals = {}
-        self.globals = Environment()
+        self.globals = Globals()
+        # value of the last `return`, read by the function returning
+        self.returnValue = None
+        # (function, this, args) of the tail call being returned
+        self.pendingCall = None
         self.env = self.globals
-        self.globals.define("clock", ClockFn())
+        self.globals.define(self.globals.index("clock"), ClockFn())
+        self.globals.define(self.globals.index("join"), JoinFn())
 
     def visitLiteral(self, val):
         return val.value
@@ -79,11 +131,29 @@ class Interpreter(ExprVisitor, StmtVisitor):
         """
         if operator == '-' and
         if value.type == number then return - number
+
+        After the first evaluation the node keeps `(type, operation)` for the
+        type of its operand in `quick`, and takes the generic path for good
+        once another type shows up.
         """
+        quick = val.quick
+        if quick:
+            value = val.value.visit(self)
+            if value.__class__ is quick[0]:
+                return quick[1](value)
+            val.quick = False
+            return self.unary(val, value)
+
+        value = val.value.visit(self)
+        if quick is None:
+            operation = QUICK_UNARY.get((val.operator.type, value.__class__))
+            val.quick = operation is not None and (value.__class__, operation)
+        return self.unary(val, value)
+
+    def unary(self, val, value):
         if val.operator.type not in {TokenType.MINUS, TokenType.BANG}:
             raise RuntimeException(f"invalid unary: {val.operator} {val.value}")
 
-        value = val.value.visit(self)
         if val.operator.type == TokenType.MINUS:
             if not isinstance(value, float):
                 raise RuntimeException(f"not able to negate number {val} == {value}")
@@ -96,15 +166,41 @@ class Interpreter(ExprVisitor, StmtVisitor):
         raise RuntimeException("Unary expression not implemented")
 
     def visitBinary(self, val):
+        """Evaluates a binary operation, specializing the node as it goes.
+
+        After the first evaluation `quick` holds `(left type, right type,
+        operation)` for the operand types seen, and a later evaluation with
+        other types de-optimizes the node back to the generic path.
+        """
+        quick = val.quick
+        if quick:
+            left = val.left.visit(self)
+            right = val.right.visit(self)
+            if left.__class__ is quick[0] and right.__class__ is quick[1]:
+                return quick[2](left, right)
+            val.quick = False
+            return self.binary(val, left, right)
+
         if val.operator.type == TokenType.COMMA:
             val.left.visit(self)
             return val.right.visit(self)
 
-        if val.operator.type not in BINARY_OPERATIONS:
-            raise RuntimeException(f"Binary operation not implemented: {val.operator}")
-
         left = val.left.visit(self)
         right = val.right.visit(self)
+        if quick is None:
+            operation = QUICK_BINARY.get(
+                (val.operator.type, left.__class__, right.__class__)
+            )
+            val.quick = operation is not None and (
+                left.__class__,
+                right.__class__,
+                operation,
+            )
+        return self.binary(val, left, right)
+
+    def binary(self, val, left, right):
+        if val.operator.type not in BINARY_OPERATIONS:
+            raise RuntimeException(f"Binary operation not implemented: {val.operator}")
 
         if val.operator.type in NUMBER_BINARY_OPERATIONS:
             if type(left) is not float:
@@ -132,40 +228,53 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return self.lookupVariable(val.name, val)
 
     def lookupVariable(self, name: Token, expr: Expr):
-        depth = None
-        if expr in self.locals:
-            depth = self.locals[expr]
-        if depth is None:
-            return self.globals.get(name.lexeme)
+        if expr.depth is None:
+            value = self.globals.values[expr.slot]
+            if value is Undefined or value is Undeclared:
+                return self.globals.get(expr.slot)
+            return value
 
-        return self.env.getAt(depth, name.lexeme)
+        return self.env.getAt(expr.depth, expr.slot)
+
+    def define(self, decl: Stmt, value: Any):
+        if decl.depth is None:
+            self.globals.define(decl.slot, value)
+        else:
+            self.env.values[decl.slot] = value
 
     def visitVar(self, val):
         value = Undefined
         if val.value:
             value = val.value.visit(self)
-        self.env.define(val.name.lexeme, value)
+        self.define(val, value)
 
     def visitAssign(self, val):
         value = val.value.visit(self)
-        dist = self.locals.get(val)
-        if dist is not None:
-            self.env.assignAt(dist, val.name, value)
+        if val.depth is not None:
+            self.env.assignAt(val.depth, val.slot, value)
         else:
-            self.globals.assign(val.name.lexeme, value)
+            self.globals.assign(val.slot, value)
+        return value
 
     def visitBlock(self, val):
-        self.executeBlock(val, Environment(self.env))
+        return self.executeBlock(val, Environment(self.env, val.size))
 
     def executeBlock(self, val, env):
+        """Runs the statements of `val` in `env`, returning their `Completion`"""
         prior = self.env
         try:
             self.env = env
             for stmt in val.statements:
-                stmt.visit(self)
+                result = stmt.visit(self)
+                if result.__class__ is Completion:
+                    return result
         finally:
             self.env = prior
 
+    def executeFunction(self, declaration: Function, env: Environment):
+        """Runs the body of `declaration` in `env`, called by `LoxFunction`"""
+        return self.executeBlock(Block(declaration.body), env)
+
     def visitClass(self, val):
         superclass = None
 
@@ -173,9 +282,12 @@ class Interpreter(ExprVisitor, StmtVisitor):
             superclass = val.superclass.visit(self)
             if type(superclass) is not LoxClass:
                 raise RuntimeException("superclass must be a class")
-            self.env.define("super", superclass)
 
-        self.env.define(val.name.lexeme, None)
+        self.define(val, None)
+        if superclass is not None:
+            self.env = Environment(self.env, 1)
+            self.env.values[0] = superclass
+
         methods = dict(
             [
                 (
@@ -190,31 +302,45 @@ class Interpreter(ExprVisitor, StmtVisitor):
             ]
         )
         klass = LoxClass(val.name.lexeme, methods, superclass)
-        if (
-            superclass is not None and self.env and self.env.parent
-        ):  # lot of defensiveness
+        if superclass is not None:
             self.env = self.env.parent
 
-        self.env.assign(val.name.lexeme, klass)
+        if val.depth is None:
+            self.globals.assign(val.slot, klass)
+        else:
+            self.env.values[val.slot] = klass
 
     def visitSuper(self, val):
-        distance = self.locals.get(val, 0)
-        superclass = self.env.getAt(distance, "super")
-        obj = self.env.getAt(distance - 1, "this")
-        method = superclass.findMethod(val.method.lexeme)
-        if method is None:
-            raise Exception(f"undefined method: {method}")
-
-        return method.bind(obj)
+        # the frame of the method holds `this`, the scope around it `super`
+        frame = self.env.ancestor(val.depth - 1)
+        method = superMethod(val, frame.parent.values[0])
+        return method.bind(frame.values[0])
 
     def visitIfStmt(self, val):
         if isTruthy(val.condition.visit(self)):
             return val.thenBranch.visit(self)
         if val.elseBranch is not None:
-            val.elseBranch.visit(self)
+            return val.elseBranch.visit(self)
 
     def visitLogical(self, val):
+        """Short-circuits `and`/`or`.
+
+        A node whose left operand was a bool is specialized to `(bool, value
+        that short-circuits)`, True for `or` and False for `and`.
+        """
         left = val.left.visit(self)
+        quick = val.quick
+        if quick:
+            if left.__class__ is quick[0]:
+                if left is quick[1]:
+                    return left
+                return val.right.visit(self)
+            val.quick = False
+        elif quick is None:
+            val.quick = left.__class__ is bool and (
+                bool,
+                val.operator.type == TokenType.OR,
+            )
         if val.operator.type == TokenType.OR and isTruthy(left):
             return left
         if val.operator.type == TokenType.AND and not isTruthy(left):
@@ -223,15 +349,25 @@ class Interpreter(ExprVisitor, StmtVisitor):
 
     def visitWhileStmt(self, val):
         while isTruthy(val.condition.visit(self)):
-            try:
-                val.body.visit(self)
-            except BreakException as _:
-                return
+            result = val.body.visit(self)
+            if result.__class__ is Completion:
+                if result is BREAK:
+                    return
+                return result
 
     def visitBreakStmt(self, val):
-        raise BreakException()
+        return BREAK
 
     def visitCall(self, val):
+        if type(val.callee) is Get:
+            return self.invoke(val)
+        if type(val.callee) is Super:
+            frame = self.env.ancestor(val.callee.depth - 1)
+            method = superMethod(val.callee, frame.parent.values[0])
+            args = [arg.visit(self) for arg in val.arguments]
+            if method.arity() != len(args):
+                raise RuntimeException("Wrong arity for function")
+            return method.invoke(self, frame.values[0], args)
         callee = val.callee.visit(self)
         args = [arg.visit(self) for arg in val.arguments]
 
@@ -245,45 +381,123 @@ class Interpreter(ExprVisitor, StmtVisitor):
 
         return callFunc(self, args)
 
+    def invoke(self, val: Call):
+        """Calls `obj.name(...)` without creating a bound method.
+
+        The `PropertyCache` of the `Get` finds the method for the shape of
+        the instance, and the method runs with the instance as `this`.
+        Fields holding functions are called like any other value.
+        """
+        get = val.callee
+        obj = get.obj.visit(self)
+        if type(obj) is not LoxInstance:
+            raise RuntimeError("Only instances can have proerties")
+
+        method = get.cache.find(obj)
+        if method.__class__ is int:
+            callee = obj.values[method]
+            args = [arg.visit(self) for arg in val.arguments]
+            callFunc = getattr(callee, "call", None)
+            arityFunc = getattr(callee, "arity")
+            if callFunc is None or arityFunc is None:
+                raise RuntimeException("Can only call functions and classes")
+            if arityFunc() != len(args):
+                raise RuntimeException("Wrong arity for function")
+            return callFunc(self, args)
+
+        args = [arg.visit(self) for arg in val.arguments]
+        if method.arity() != len(args):
+            raise RuntimeException("Wrong arity for function")
+        return method.invoke(self, obj, args)
+
     def visitFunction(self, val):
         fn = LoxFunction(val, self.env)
         if val.name is not None:
-            self.env.define(val.name.lexeme, fn)
+            self.define(val, fn)
         return fn
 
     def visitReturn(self, val):
+        if val.tail:
+            return self.tailCall(val.expression)
         value = None
         if val.expression is not None:
             value = val.expression.visit(self)
-        raise ReturnException(value)
+        self.returnValue = value
+        return RETURN
+
+    def tailCall(self, val: Call):
+        """Evaluates the callee and arguments of `return f(...)`.
+
+        Calls to Lox functions are left in `pendingCall` for `LoxFunction.run`
+        to make once the current frame is gone, other callables are called
+        right away.
+        """
+        callee = val.callee
+        this = None
+        if type(callee) is Get:
+            obj = callee.obj.visit(self)
+            if type(obj) is not LoxInstance:
+                raise RuntimeError("Only instances can have proerties")
+            function = callee.cache.find(obj)
+            if function.__class__ is int:
+                function = obj.values[function]
+            else:
+                this = obj
+        elif type(callee) is Super:
+            frame = self.env.ancestor(callee.depth - 1)
+            function = superMethod(callee, frame.parent.values[0])
+            this = frame.values[0]
+        else:
+            function = callee.visit(self)
+        args = [arg.visit(self) for arg in val.arguments]
+
+        callFunc = getattr(function, "call", None)
+        arityFunc = getattr(function, "arity", None)
+        if callFunc is None or arityFunc is None:
+            raise RuntimeException("Can only call functions and classes")
+        if arityFunc() != len(args):
+            raise RuntimeException("Wrong arity for function")
+        if type(function) is not LoxFunction:
+            self.returnValue = callFunc(self, args)
+            return RETURN
+        if this is None:
+            this = function.receiver
+        self.pendingCall = (function, this, args)
+        return TAIL_CALL
 
     def visitGet(self, val):
         obj = val.obj.visit(self)
         if type(obj) is not LoxInstance:
             raise RuntimeError("Only instances can have proerties")
 
-        return obj.get(val.name)
+        return val.cache.get(obj)
 
     def visitSet(self, val):
         obj = val.obj.visit(self)
         if type(obj) != LoxInstance:
             raise RuntimeError("Only instances have fields")
         value = val.val.visit(self)
-        obj.set(val.name, value)
-        return val
+        val.cache.set(obj, value)
+        return value
 
     def visitThis(self, val):
         return self.lookupVariable(val.keyword, val)
 
-    def resolve(self, expr: Expr, depth: int):
-        self.locals[expr] = depth
-
 
 if __name__ == "__main__":
     inpr = Interpreter()
 
 
+def showFunction(name: Optional[str]) -> str:
+    """How every engine prints the function called `name`, None for lambdas"""
+    return f"<fn {name or 'lambda'}>"
+
+
 class LoxCallable(ABC):
+    def __repr__(self):
+        # functions and classes show their names, only natives keep this
+        return "<native fn>"
+
     @abstractmethod
     def arity(self) -> int:
         raise Exception("not implemented")
@@ -301,33 +515,91 @@ class ClockFn(LoxCallable):
         return time.time_ns()
 
 
+class JoinFn(LoxCallable):
+    """`join(a, b)`: the two values as `print` shows them, concatenated"""
+
+    def arity(self):
+        return 2
+
+    def call(self, inpr, args):
+        return join(args[0], args[1])
+
+
 class LoxFunction(LoxCallable):
-    def __init__(self, declaration: Function, closure: Environment, isintializer=False):
+    def __init__(
+        self,
+        declaration: Function,
+        closure: Environment,
+        isinitializer=False,
+        receiver: Any = None,
+    ):
         self.declaration = declaration
         self.closure = closure
-        self.isintializer = False
+        self.isinitializer = isinitializer
+        # the instance a method was bound to, methods keep `this` in slot 0
+        # of their frame
+        self.receiver = receiver
+
+    def __repr__(self):
+        name = self.declaration.name
+        return showFunction(None if name is None else name.lexeme)
 
     def arity(self):
         return len(self.declaration.params)
 
     def call(self, inpr, args):
-        env = Environment(self.closure)
+        if self.receiver is not None:
+            return self.invoke(inpr, self.receiver, args)
+        if self.declaration.lazy is not None:
+            self.declaration.lazy.complete(inpr)
+        env = Environment(self.closure, self.declaration.size)
+        env.values[: len(args)] = args
+        return self.run(inpr, env)
+
+    def invoke(self, inpr, instance, args):
+        """Calls a method on `instance` without binding it first"""
+        if self.declaration.lazy is not None:
+            self.declaration.lazy.complete(inpr)
+        env = Environment(self.closure, self.declaration.size)
+        values = env.values
+        values[0] = instance
+        values[1 : len(args) + 1] = args
+        return self.run(inpr, env)
+
+    def frame(self, this, args) -> Environment:
+        env = Environment(self.closure, self.declaration.size)
+        values = env.values
+        if this is None:
+            values[: len(args)] = args
+        else:
+            values[0] = this
+            values[1 : len(args) + 1] = args
+        return env
 
-        for i in range(self.arity()):
-            env.define(self.declaration.params[i].lexeme, args[i])
+    def run(self, inpr, env: Environment):
+        """Runs the body in `env`, then any tail calls it returns.
 
-        try:
-            inpr.executeBlock(Block(self.declaration.body), env)
-        except ReturnException as e:
-            if self.isintializer:
-                return self.closure.getAt(0, "this")
-            return e.value
+        A tail call replaces the frame of the function making it instead of
+        nesting inside it, so tail recursion runs in constant stack.
+        """
+        function = self
+        while True:
+            result = inpr.executeFunction(function.declaration, env)
+            if result is RETURN:
+                if function.isinitializer:
+                    return env.values[0]
+                return inpr.returnValue
+            if result is not TAIL_CALL:
+                # `init()` returns `this` when called again on an instance
+                return env.values[0] if function.isinitializer else None
+            function, this, args = inpr.pendingCall
+            inpr.pendingCall = None
+            if function.declaration.lazy is not None:
+                function.declaration.lazy.complete(inpr)
+            env = function.frame(this, args)
 
     def bind(self, instance):
-        env = Environment(self.closure)
-        env.define("this", instance)
-        # raise Exception(str(env.data))
-        return LoxFunction(self.declaration, env, self.isintializer)
+        return LoxFunction(self.declaration, self.closure, self.isinitializer, instance)
 
 
 class _LoxClass(NamedTuple):
@@ -337,51 +609,184 @@ class _LoxClass(NamedTuple):
 
 
 class LoxClass(_LoxClass, LoxCallable):
+    """A class with its inherited methods copied down into one table.
+
+    Classes never change once created, so `table`, the initializer and
+    its arity are computed once, when the class statement runs.
+    """
+
+    def __init__(self, name: str, methods: Dict[str, Any], superclass: Any):
+        table = {}
+        if superclass is not None:
+            table.update(superclass.table)
+        table.update(methods)
+        self.table: Dict[str, Any] = table
+        self.initializer = table.get("init")
+        self.initArity = 0 if self.initializer is None else self.initializer.arity()
+        # root shape of the instances, they start with no fields
+        self.shape = Shape(self, {})
+
     def __repr__(self):
         return self.name
 
     def arity(self):
-        initializer = self.findMethod("init")
-        if initializer is None:
-            return 0
-        return initializer.arity()
+        return self.initArity
 
     def call(self, inpr, args):
-        instance = LoxInstance(self, {})
-        initializer = self.findMethod("init")
-        if initializer is not None:
-            initializer.bind(instance).call(inpr, args)
+        instance = LoxInstance(self)
+        if self.initializer is not None:
+            self.initializer.invoke(inpr, instance, args)
         return instance
 
     def findMethod(self, name: str):
-        if name in self.methods:
-            return self.methods.get(name, None)
-        if self.superclass is not None:
-            return self.superclass.findMethod(name)
+        return self.table.get(name)
+
+
+class Shape:
+    """The layout of the fields of an instance: the slot of every field.
+
+    Instances start with the root shape of their class and follow cached
+    transitions as they gain fields, so instances that get the same fields
+    in the same order share one shape. Shapes are never mutated, which lets
+    property sites cache what they found for a shape.
+    """
 
+    __slots__ = ("klass", "slots", "transitions")
 
-class _LoxInstance(NamedTuple):
-    klass: LoxClass
-    fields: Dict[str, Any]
+    def __init__(self, klass: LoxClass, slots: Dict[str, int]):
+        self.klass = klass
+        self.slots = slots
+        self.transitions: Dict[str, Shape] = {}
 
+    def withField(self, name: str) -> "Shape":
+        shape = self.transitions.get(name)
+        if shape is None:
+            shape = Shape(self.klass, {**self.slots, name: len(self.slots)})
+            self.transitions[name] = shape
+        return shape
 
-class LoxInstance(_LoxInstance):
+
+class LoxInstance:
+    __slots__ = ("klass", "shape", "values")
+
+    def __init__(self, klass: LoxClass):
+        self.klass = klass
+        self.shape: Shape = klass.shape
+        self.values: List[Any] = []
 
     def __repr__(self):
         return f"{self.klass.name} instance"
 
+    @property
+    def fields(self) -> Dict[str, Any]:
+        return {name: self.values[slot] for name, slot in self.shape.slots.items()}
+
     def get(self, name: Token) -> Any:
-        if name.lexeme in self.fields:
-            return self.fields[name.lexeme]
+        slot = self.shape.slots.get(name.lexeme)
+        if slot is not None:
+            return self.values[slot]
 
         method = self.klass.findMethod(name.lexeme)
         if method is not None:
             return method.bind(self)
 
-        print(name, self.fields, self.klass.methods)
         raise RuntimeError(
             f"Field '{name.lexeme}' is not in class instance of {self.klass.name}"
         )
 
     def set(self, name: Token, value: Any):
-        self.fields[name.lexeme] = value
+        slot = self.shape.slots.get(name.lexeme)
+        if slot is None:
+            self.shape = self.shape.withField(name.lexeme)
+            self.values.append(value)
+        else:
+            self.values[slot] = value
+
+
+# shapes a property site remembers before it stops caching
+POLYMORPHIC_LIMIT = 4
+
+
+class PropertyCache:
+    """Inline cache of one `Get` or `Set` site, keyed by instance shape.
+
+    The first field slot found is kept in `shape`/`slot`, and the first
+    method in `methodShape`/`method`, so the common monomorphic cases are
+    one identity check. Other shapes go to `entries`, where a read entry
+    is a field slot or the method found on the class, and a write entry
+    is a slot or the shape to move to for a new field.
+    """
+
+    __slots__ = ("name", "shape", "slot", "methodShape", "method", "entries")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.shape: Optional[Shape] = None
+        self.slot = 0
+        self.methodShape: Optional[Shape] = None
+        self.method: Any = None
+        self.entries: Dict[Shape, Any] = {}
+
+    def __repr__(self):
+        return self.name
+
+    def remember(self, shape: Shape, entry: Any):
+        if entry.__class__ is int:
+            if self.shape is None:
+                self.shape = shape
+                self.slot = entry
+                return
+        elif self.methodShape is None:
+            self.methodShape = shape
+            self.method = entry
+            return
+        if len(self.entries) < POLYMORPHIC_LIMIT:
+            self.entries[shape] = entry
+
+    def find(self, instance: LoxInstance) -> Any:
+        """The slot of the field or the unbound method named by the site"""
+        shape = instance.shape
+        if shape is self.methodShape:
+            return self.method
+        if shape is self.shape:
+            return self.slot
+        entry = self.entries.get(shape)
+        if entry is None:
+            entry = shape.slots.get(self.name)
+            if entry is None:
+                entry = instance.klass.findMethod(self.name)
+                if entry is None:
+                    raise RuntimeError(
+                        f"Field '{self.name}' is not in class instance of "
+                        f"{instance.klass.name}"
+                    )
+            self.remember(shape, entry)
+        return entry
+
+    def get(self, instance: LoxInstance) -> Any:
+        if instance.shape is self.shape:
+            return instance.values[self.slot]
+        entry = self.find(instance)
+        if entry.__class__ is int:
+            return instance.values[entry]
+        return entry.bind(instance)
+
+    def set(self, instance: LoxInstance, value: Any):
+        shape = instance.shape
+        if shape is self.shape:
+            instance.values[self.slot] = value
+            return
+        entry = self.entries.get(shape)
+        if entry is None:
+            entry = shape.slots.get(self.name)
+            if entry is not None:
+                self.remember(shape, entry)
+            else:
+                entry = shape.withField(self.name)
+                if len(self.entries) < POLYMORPHIC_LIMIT:
+                    self.entries[shape] = entry
+        if entry.__class__ is int:
+            instance.values[entry] = value
+        else:
+            instance.shape = entry
+            instance.values.append(value)
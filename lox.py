@@ -1,26 +1,171 @@
-import sys
-from interpreter import Interpreter
-from parser import Parse
-from resolver import Resolver
+import time
+
+# before the other imports, the import phase of --timings starts here
+STARTED = time.perf_counter(), time.process_time()
+
+import argparse  # noqa: E402
+import sys  # noqa: E402
+from contextlib import nullcontext  # noqa: E402
+from cache import DEFAULT_CACHE_DIR, Compiled, ProgramCache  # noqa: E402
+from interpreter import Interpreter  # noqa: E402
+from parser import Parse, parseTokens  # noqa: E402
+from resolver import Resolver  # noqa: E402
+from scanner import SCANNERS  # noqa: E402
+from timings import Timings, timed  # noqa: E402
+
+# engines, the optimizer, the server and the profilers are imported when they
+# are used, so a run only pays for what it needs
+IMPORTED = time.perf_counter(), time.process_time()
+
+ENGINES = ["tree", "closure", "vm", "python"]
+
+# what a server runs before taking requests
+WARM_UP = """
+class Point { init(x) { this.x = x; } }
+fun add(a, b) { return a + b; }
+var total = 0;
+for (var i = 0; i < 10; i = i + 1) total = add(total, Point(i).x);
+print "total " + total;
+"""
 
 
 def err(line, message):
     print(f"[line {line}] Error where: {message}")
 
 
-def run(content):
-    inpr = Interpreter()
-    resolver = Resolver(inpr)
-    program = Parse(content)
-    resolver.resolve(program)
-    for line in program:
-        line.visit(inpr)
+def running(profiler):
+    """`profiler.running()`, or nothing when `profiler` is None, for both
+    `profiler.Profiler` and `sampler.Sampler`"""
+    if profiler is None:
+        return nullcontext()
+    return profiler.running()
+
+
+def reportOptimized(optimizeLevel, eliminated):
+    if optimizeLevel >= 1:
+        print(f"-O{optimizeLevel}: eliminated {eliminated} nodes", file=sys.stderr)
+
 
+def compileProgram(
+    content, optimizeLevel=0, scanner="regex", cache=None, lazy=False, timings=None
+):
+    """Parses, optimizes and resolves a program, or loads it from `cache`
+    when it was compiled before.
 
-def runFile(filename):
+    `lazy` leaves function bodies to be parsed and resolved on their first
+    call. Such programs keep their tokens and are not stored in the cache.
+    """
+    if cache is not None:
+        with timed(timings, "cache"):
+            compiled = cache.load(content, optimizeLevel)
+        if compiled is not None:
+            reportOptimized(optimizeLevel, compiled.eliminated)
+            return compiled
+    with timed(timings, "scan"):
+        tokens = SCANNERS[scanner](content).scanTokens()
+    with timed(timings, "parse"):
+        program = parseTokens(tokens, lazy)
+    eliminated = 0
+    if optimizeLevel >= 1:
+        with timed(timings, "optimize"):
+            from optimizer import optimize
+
+            program, eliminated = optimize(program)
+    reportOptimized(optimizeLevel, eliminated)
+    with timed(timings, "resolve"):
+        inpr = Interpreter()
+        Resolver(inpr).resolve(program)
+    compiled = Compiled(program, inpr.globals.keys, eliminated)
+    if cache is not None and not lazy:
+        with timed(timings, "store"):
+            cache.store(content, compiled, optimizeLevel)
+    return compiled
+
+
+def run(
+    content,
+    engine="tree",
+    filename="<lox>",
+    maxCallDepth=None,
+    optimizeLevel=0,
+    scanner="regex",
+    cache=None,
+    lazy=False,
+    timings=None,
+    profiler=None,
+    sampler=None,
+):
+    """Runs a program, `maxCallDepth` limits the vm engine and defaults to
+    `vm.MAX_CALL_DEPTH`. `profiler` times the Lox calls of the tree and
+    closure engines, `sampler` samples the lines the tree engine runs."""
+    program, names, _ = compileProgram(
+        content, optimizeLevel, scanner, cache, lazy, timings
+    )
+    if engine == "closure":
+        with timed(timings, "import"):
+            from closures import ClosureCompiler
+        with timed(timings, "execute"), running(profiler):
+            compiler = ClosureCompiler()
+            for name in names:
+                compiler.globals.index(name)
+            compiler.interpret(program)
+        return
+
+    if engine == "vm":
+        with timed(timings, "import"):
+            from vm import MAX_CALL_DEPTH, VM
+        with timed(timings, "execute"):
+            VM(maxCallDepth or MAX_CALL_DEPTH).interpret(program)
+        return
+    if engine == "python":
+        with timed(timings, "import"):
+            from transpiler import runPython, transpile
+        with timed(timings, "execute"):
+            runPython(transpile(program, filename), filename)
+        return
+    with timed(timings, "execute"), running(profiler), running(sampler):
+        inpr = Interpreter()
+        for name in names:
+            inpr.globals.index(name)
+        for line in program:
+            line.visit(inpr)
+
+
+def runFile(
+    filename,
+    engine="tree",
+    maxCallDepth=None,
+    optimizeLevel=0,
+    scanner="regex",
+    cache=None,
+    lazy=False,
+    timings=None,
+    profiler=None,
+    sampler=None,
+):
     with open(filename) as contents:
         data = contents.read()
-        run(data)
+    run(
+        data,
+        engine,
+        filename,
+        maxCallDepth,
+        optimizeLevel,
+        scanner,
+        cache,
+        lazy,
+        timings,
+        profiler,
+        sampler,
+    )
+
+
+def emitPython(filename, optimizeLevel=0, scanner="regex", cache=None):
+    from transpiler import transpile
+
+    with open(filename) as contents:
+        compiled = compileProgram(contents.read(), optimizeLevel, scanner, cache)
+    print(transpile(compiled.program, filename), end="")
 
 
 def runPrompt():
@@ -30,6 +175,7 @@ def runPrompt():
         try:
             line = input("> ")
             expr = Parse(line)[0]
+            Resolver(inpr).resolve(expr)
             out = expr.visit(inpr)
             if out is not None:
                 print(out)
@@ -37,12 +183,226 @@ def runPrompt():
             print(e)
 
 
-args = sys.argv[1:]
-if len(args) > 1:
-    print("Usage: plox [script]")
-    exit(64)
+def warmUp():
+    """Runs a small program on every engine, so what they set up on first
+    use is ready in the forks of a server"""
+    import io
+    from contextlib import redirect_stdout
+
+    from cache import interpreterVersion
+
+    interpreterVersion()
+    with redirect_stdout(io.StringIO()):
+        for engine in ENGINES:
+            run(WARM_UP, engine)
+
+
+def argumentParser():
+    argparser = argparse.ArgumentParser(
+        prog="plox", epilog="`plox bench` runs the benchmarks, see `plox bench --help`"
+    )
+    argparser.add_argument("script", nargs="?")
+    argparser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="tree",
+        help="tree walks the AST (the reference engine), closure runs it compiled "
+        "to Python closures, vm runs compiled bytecode, python runs it "
+        "transpiled to Python source",
+    )
+    argparser.add_argument(
+        "--emit-python",
+        action="store_true",
+        help="print the Python module the script transpiles to instead of running it",
+    )
+    argparser.add_argument(
+        "--max-call-depth",
+        type=int,
+        help="deepest nesting of Lox calls the vm engine allows before "
+        "reporting a stack overflow, 100000 by default",
+    )
+    argparser.add_argument(
+        "-O",
+        dest="optimize",
+        type=int,
+        choices=[0, 1],
+        default=0,
+        help="-O1 folds constants and removes unreachable code before running, "
+        "and reports how many nodes it eliminated",
+    )
+    argparser.add_argument(
+        "--scanner",
+        choices=list(SCANNERS),
+        default="regex",
+        help="regex tokenizes with one compiled pattern, char is the original "
+        "character at a time scanner, compact scans like regex into parallel "
+        "arrays over the source to save memory on large scripts; all give the "
+        "same tokens",
+    )
+    argparser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="always compile the script instead of loading it from the cache "
+        "of compiled programs, and don't store it there",
+    )
+    argparser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="directory of the cache of compiled programs, keyed by the hash of "
+        "their source and the interpreter version",
+    )
+    argparser.add_argument(
+        "--lazy",
+        action="store_true",
+        help="with the tree engine, only brace-match function and method bodies "
+        "when loading the script and parse and resolve each one the first time "
+        "it is called, so startup scales with the code that runs",
+    )
+    argparser.add_argument(
+        "--server",
+        action="store_true",
+        help="stay running on --socket with everything imported, and run the "
+        "scripts of --client requests, each in a fresh fork",
+    )
+    argparser.add_argument(
+        "--client",
+        action="store_true",
+        help="run the script, with the other options, on the --server, "
+        "skipping interpreter startup",
+    )
+    argparser.add_argument(
+        "--socket",
+        help="Unix socket of the --server, plox-<uid>.sock in $XDG_RUNTIME_DIR "
+        "or the temporary directory by default",
+    )
+    argparser.add_argument(
+        "--timings",
+        action="store_true",
+        help="report wall time, CPU time and peak memory of each phase of the "
+        "run on stderr: import, cache lookup, scan, parse, optimize, resolve, "
+        "cache store and execute",
+    )
+    argparser.add_argument(
+        "--profile",
+        action="store_true",
+        help="with the tree or closure engine, report the calls, total and self "
+        "time of each Lox function on stderr, most self time first",
+    )
+    argparser.add_argument(
+        "--profile-collapsed",
+        metavar="PATH",
+        help="profile like --profile and write the time spent in each stack of "
+        "calls to PATH as collapsed stacks, for flamegraph.pl or speedscope",
+    )
+    argparser.add_argument(
+        "--sample-profile",
+        metavar="HZ",
+        type=int,
+        help="with the tree engine, sample the running line and Lox calls HZ "
+        "times a second of CPU time, 100 costs a few percent, and report "
+        "the hits of each line and function on stderr",
+    )
+    return argparser
+
+
+def runArguments(argparser, args, timings=None):
+    """Runs what the arguments ask for, other than --server and --client.
+
+    With --timings, `timings` may already hold the import phase.
+    """
+    if args.lazy and (args.engine != "tree" or args.emit_python):
+        argparser.error("--lazy only works with the tree engine")
+    if args.max_call_depth is not None:
+        if args.engine != "vm" or args.emit_python:
+            argparser.error("--max-call-depth only works with the vm engine")
+        if args.max_call_depth <= 0:
+            argparser.error("--max-call-depth needs a positive depth")
+    profiler = None
+    if args.profile or args.profile_collapsed:
+        if args.engine not in ("tree", "closure") or args.emit_python:
+            argparser.error("--profile only works with the tree and closure engines")
+        from profiler import Profiler
+
+        profiler = Profiler()
+    sampler = None
+    if args.sample_profile is not None:
+        if args.engine != "tree" or args.emit_python or args.script is None:
+            argparser.error("--sample-profile only works with the tree engine")
+        if args.sample_profile <= 0:
+            argparser.error("--sample-profile needs a positive rate")
+        from sampler import Sampler
+
+        sampler = Sampler(args.sample_profile)
+    cache = None if args.no_cache else ProgramCache(args.cache_dir)
+    if args.timings and timings is None:
+        timings = Timings()
+    if not args.timings:
+        timings = None
+
+    try:
+        if args.emit_python:
+            if args.script is None:
+                argparser.error("--emit-python needs a script")
+            emitPython(args.script, args.optimize, args.scanner, cache)
+        elif args.script is not None:
+            runFile(
+                args.script,
+                args.engine,
+                args.max_call_depth,
+                args.optimize,
+                args.scanner,
+                cache,
+                args.lazy,
+                timings,
+                profiler,
+                sampler,
+            )
+        else:
+            runPrompt()
+    finally:
+        if timings is not None:
+            sys.stdout.flush()
+            timings.report()
+        if profiler is not None:
+            sys.stdout.flush()
+            if args.profile:
+                profiler.report()
+            if args.profile_collapsed:
+                with open(args.profile_collapsed, "w") as f:
+                    profiler.writeCollapsed(f)
+        if sampler is not None:
+            sys.stdout.flush()
+            with open(args.script) as f:
+                sampler.report(f.read())
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["bench"]:
+        from bench import main as bench
+
+        sys.exit(bench(argv[1:]))
+    timings = Timings()
+    timings.add("import", IMPORTED[0] - STARTED[0], IMPORTED[1] - STARTED[1])
+    argparser = argumentParser()
+    args = argparser.parse_args(argv)
+    if args.server and args.client:
+        argparser.error("--server and --client can't be used together")
+    if args.server or args.client:
+        from server import DEFAULT_SOCKET, runRemote, serve
+
+        socket = args.socket or DEFAULT_SOCKET
+    if args.server:
+        warmUp()
+        serve(
+            socket,
+            lambda argv: runArguments(argparser, argparser.parse_args(argv)),
+        )
+    elif args.client:
+        sys.exit(runRemote(socket, argv))
+    else:
+        runArguments(argparser, args, timings)
+
 
-if len(args) == 1:
-    runFile(args[0])
-elif len(args) < 1:
-    runPrompt()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+from typing import List, Optional, Tuple
+
+from expr import ExprVisitor, Literal
+from interpreter import BINARY_OPERATIONS, NUMBER_BINARY_OPERATIONS, isTruthy
+from rope import Rope
+from stmt import StmtVisitor, Stmt, Block, BreakStmt, Return
+from tokens import TokenType
+from util import RuntimeException, Visitable, trampoline
+
+
+def countNodes(node) -> int:
+    """Number of AST nodes in `node`, a node or a list of them"""
+    count = 0
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, list):
+            pending.extend(node)
+        elif isinstance(node, Visitable):
+            count += 1
+            if isinstance(node, tuple):
+                pending.extend(node)
+    return count
+
+
+def foldBinary(operator: TokenType, left, right) -> Optional[Literal]:
+    """The `Literal` `left <operator> right` evaluates to, or None when
+    evaluating it raises and the error has to be left for runtime"""
+    if operator in NUMBER_BINARY_OPERATIONS:
+        if type(left) is not float or type(right) is not float:
+            return None
+    try:
+        value = BINARY_OPERATIONS[operator](left, right)
+    except (RuntimeException, ArithmeticError):
+        return None
+    if value.__class__ is Rope:
+        value = str(value)
+    return Literal(value)
+
+
+class Optimizer(ExprVisitor, StmtVisitor):
+    """Rewrites a parsed program into a smaller one that runs the same.
+
+    Runs between parsing and resolution. Expressions on literals are folded
+    with the operations of the interpreter, so they give exactly what the
+    program would compute, and any that would raise are left for runtime.
+    Groupings are dropped, constant conditions pick their branch and
+    statements that can never run are removed.
+
+    Every visit results in the rewritten node, statements may also result
+    in None when nothing is left of them. Visits of nodes with children are
+    generators that yield the visits of their children, like those of the
+    resolver, and `optimize` runs them with `trampoline`.
+    """
+
+    def statements(self, statements: List[Stmt]):
+        out = []
+        for stmt in statements:
+            stmt = yield stmt.visit(self)
+            if stmt is None or (type(stmt) is Block and not stmt.statements):
+                continue
+            out.append(stmt)
+            if type(stmt) is Return or type(stmt) is BreakStmt:
+                # the rest of the list is unreachable
+                break
+        return out
+
+    def branch(self, stmt: Stmt):
+        """Rewrites a statement that has to stay, like the body of a loop"""
+        stmt = yield stmt.visit(self)
+        if stmt is None:
+            return Block([])
+        return stmt
+
+    # statements
+
+    def visitPrint(self, val):
+        return val._replace(expression=(yield val.expression.visit(self)))
+
+    def visitExpression(self, val):
+        return val._replace(expression=(yield val.expression.visit(self)))
+
+    def visitVar(self, val):
+        if val.value is None:
+            return val
+        return val._replace(value=(yield val.value.visit(self)))
+
+    def visitBlock(self, val):
+        return val._replace(statements=(yield self.statements(val.statements)))
+
+    def visitIfStmt(self, val):
+        condition = yield val.condition.visit(self)
+        if type(condition) is Literal:
+            if isTruthy(condition.value):
+                return (yield val.thenBranch.visit(self))
+            if val.elseBranch is not None:
+                return (yield val.elseBranch.visit(self))
+            return None
+        elseBranch = None
+        if val.elseBranch is not None:
+            elseBranch = yield self.branch(val.elseBranch)
+        return val._replace(
+            condition=condition,
+            thenBranch=(yield self.branch(val.thenBranch)),
+            elseBranch=elseBranch,
+        )
+
+    def visitWhileStmt(self, val):
+        condition = yield val.condition.visit(self)
+        if type(condition) is Literal and not isTruthy(condition.value):
+            return None
+        return val._replace(condition=condition, body=(yield self.branch(val.body)))
+
+    def visitBreakStmt(self, val):
+        return val
+
+    def visitFunction(self, val):
+        if val.lazy is not None:
+            # bodies parsed on their first call are not optimized
+            return val
+        function = val._replace(body=(yield self.statements(val.body)))
+        function.line = val.line
+        return function
+
+    def visitReturn(self, val):
+        if val.expression is None:
+            return val
+        return val._replace(expression=(yield val.expression.visit(self)))
+
+    def visitClass(self, val):
+        methods = []
+        for method in val.methods:
+            methods.append((yield method.visit(self)))
+        return val._replace(methods=methods)
+
+    # expressions
+
+    def visitLiteral(self, val):
+        return val
+
+    def visitGrouping(self, val):
+        return (yield val.expr.visit(self))
+
+    def visitUnary(self, val):
+        value = yield val.value.visit(self)
+        if type(value) is Literal:
+            if val.operator.type == TokenType.BANG:
+                return Literal(not isTruthy(value.value))
+            if val.operator.type == TokenType.MINUS and type(value.value) is float:
+                return Literal(0 - value.value)
+        return val._replace(value=value)
+
+    def visitBinary(self, val):
+        left = yield val.left.visit(self)
+        right = yield val.right.visit(self)
+        if type(left) is Literal:
+            if val.operator.type == TokenType.COMMA:
+                return right
+            if type(right) is Literal:
+                folded = foldBinary(val.operator.type, left.value, right.value)
+                if folded is not None:
+                    return folded
+        return val._replace(left=left, right=right)
+
+    def visitTernary(self, val):
+        test = yield val.test.visit(self)
+        if type(test) is Literal:
+            if isTruthy(test.value):
+                return (yield val.left.visit(self))
+            return (yield val.right.visit(self))
+        return val._replace(
+            test=test,
+            left=(yield val.left.visit(self)),
+            right=(yield val.right.visit(self)),
+        )
+
+    def visitLogical(self, val):
+        left = yield val.left.visit(self)
+        if type(left) is Literal:
+            if val.operator.type == TokenType.OR and isTruthy(left.value):
+                return left
+            if val.operator.type == TokenType.AND and not isTruthy(left.value):
+                return left
+            return (yield val.right.visit(self))
+        return val._replace(left=left, right=(yield val.right.visit(self)))
+
+    def visitVariable(self, val):
+        return val
+
+    def visitAssign(self, val):
+        return val._replace(value=(yield val.value.visit(self)))
+
+    def visitCall(self, val):
+        callee = yield val.callee.visit(self)
+        arguments = []
+        for arg in val.arguments:
+            arguments.append((yield arg.visit(self)))
+        return val._replace(callee=callee, arguments=arguments)
+
+    def visitGet(self, val):
+        return val._replace(obj=(yield val.obj.visit(self)))
+
+    def visitSet(self, val):
+        obj = yield val.obj.visit(self)
+        return val._replace(obj=obj, val=(yield val.val.visit(self)))
+
+    def visitThis(self, val):
+        return val
+
+    def visitSuper(self, val):
+        return val
+
+
+def optimize(program: List[Stmt]) -> Tuple[List[Stmt], int]:
+    """Optimizes a parsed program, returning it and how many nodes it lost"""
+    optimized = trampoline(Optimizer().statements(program))
+    return optimized, countNodes(program) - countNodes(optimized)
@@ -1,5 +1,4 @@
-from logging import error
-from typing import List
+from typing import List, Optional, Union
 from dataclasses import dataclass
 
 from expr import (
@@ -30,14 +29,30 @@ from stmt import (
     WhileStmt,
     Class,
 )
-from tokens import TokenType as TT, Token
-from scanner import Scanner
+from tokens import EOF_KIND, TokenStore, TokenType as TT, Token
+from scanner import RegexScanner, Scanner
+from util import error, trampoline
+
+LEFT_BRACE_KIND = TT.LEFT_BRACE.kind
+RIGHT_BRACE_KIND = TT.RIGHT_BRACE.kind
 
 
 @dataclass
 class TokenIter:
-    tokens: List[Token]
+    """Walks the tokens of a list, or of a `TokenStore` without
+    materializing the tokens it only checks the type of"""
+
+    tokens: Union[List[Token], TokenStore]
     current: int = 0
+    # only brace-match the bodies of named functions and methods, leaving
+    # them to be parsed when they are first called
+    lazy: bool = False
+
+    def __post_init__(self):
+        if isinstance(self.tokens, TokenStore):
+            self.kinds = self.tokens.kinds
+        else:
+            self.kinds = [token.type.kind for token in self.tokens]
 
     def previous(self):
         return self.tokens[self.current - 1]
@@ -48,20 +63,22 @@ class TokenIter:
         return self.previous()
 
     def isAtEnd(self):
-        return self.peek().type == TT.EOF
+        return self.kinds[self.current] == EOF_KIND
 
     def peek(self):
         return self.tokens[self.current]
 
     def check(self, token_type: TT) -> bool:
-        if self.isAtEnd():
-            return False
-        return self.peek().type == token_type
+        kind = self.kinds[self.current]
+        return kind != EOF_KIND and kind == token_type.kind
 
     def match(self, *types) -> bool:
+        kind = self.kinds[self.current]
+        if kind == EOF_KIND:
+            return False
         for type in types:
-            if self.check(type):
-                self.advance()
+            if kind == type.kind:
+                self.current += 1
                 return True
         return False
 
@@ -70,6 +87,21 @@ class TokenIter:
             return self.advance()
         raise Exception(f"Peek: \n {self.peek()} \n\nError: \n {message}")
 
+    def matchingBrace(self) -> Optional[int]:
+        """Index of the `}` closing the `{` just consumed, or None when the
+        tokens end first"""
+        kinds = self.kinds
+        depth = 1
+        for index in range(self.current, len(kinds)):
+            kind = kinds[index]
+            if kind == LEFT_BRACE_KIND:
+                depth += 1
+            elif kind == RIGHT_BRACE_KIND:
+                depth -= 1
+                if depth == 0:
+                    return index
+        return None
+
     def synchronize(self):
         self.advance()
         while not self.isAtEnd():
@@ -91,8 +123,10 @@ class TokenIter:
 
 def function(ti, kind):
     name = None
+    line = ti.previous().line
     if kind != "lambda":
         name = ti.consume(TT.IDENTIFIER, f"Expect {kind} name")
+        line = name.line
     ti.consume(TT.LEFT_PAREN, f"Expect ( after {kind} name")
     params = []
     while True:
@@ -106,8 +140,33 @@ def function(ti, kind):
     ti.consume(TT.RIGHT_PAREN, "Expect ) after params")
 
     ti.consume(TT.LEFT_BRACE, "Expect { before " + kind + " body")
-    body = block(ti)
-    return Function(name, params, body.statements)
+    if ti.lazy and kind != "lambda":
+        end = ti.matchingBrace()
+        if end is not None:
+            lazy = LazyBody(ti, ti.current)
+            ti.current = end + 1
+            function = Function(name, params, [])
+            function.lazy = lazy
+            function.line = line
+            return function
+    body = yield block(ti)
+    function = Function(name, params, body.statements)
+    function.line = line
+    return function
+
+
+@dataclass
+class LazyBody:
+    """A function body that was only brace-matched, from its first token
+    after the `{`"""
+
+    ti: TokenIter
+    start: int
+
+    def parse(self) -> List[Stmt]:
+        ti = self.ti
+        ti.current = self.start
+        return trampoline(block(ti)).statements
 
 
 def classDecl(ti):
@@ -122,7 +181,7 @@ def classDecl(ti):
 
     methods = []
     while not ti.check(TT.RIGHT_BRACE) and not ti.isAtEnd():
-        methods.append(function(ti, "method"))
+        methods.append((yield function(ti, "method")))
     ti.consume(TT.RIGHT_BRACE, "Expect } after class body")
 
     return Class(name, methods, superclass)
@@ -150,7 +209,7 @@ def varDecl(ti) -> Stmt:
     name = ti.consume(TT.IDENTIFIER, "Expect variable name")
     initializer = None
     if ti.match(TT.EQUAL):
-        initializer = expression(ti)
+        initializer = yield parsePrecedence(ti, ASSIGNMENT)
     ti.consume(TT.SEMICOLON, "Expect statement to end with ';'")
     return Var(name, initializer)
 
@@ -158,28 +217,28 @@ def varDecl(ti) -> Stmt:
 def block(ti):
     out = []
     while not ti.check(TT.RIGHT_BRACE) and not ti.isAtEnd():
-        out.append(declaration(ti))
+        out.append((yield declaration(ti)))
     ti.consume(TT.RIGHT_BRACE, "Expect block to end with '}'")
     return Block(out)
 
 
 def whileStmt(ti):
     ti.consume(TT.LEFT_PAREN, "Expect '(' after while")
-    condition = expression(ti)
+    condition = yield parsePrecedence(ti, ASSIGNMENT)
     ti.consume(TT.RIGHT_PAREN, "Expect ')' after while")
-    body = statement(ti)
+    body = yield statement(ti)
 
     return WhileStmt(condition, body)
 
 
 def ifStmt(ti):
     ti.consume(TT.LEFT_PAREN, "Expect ( after if")
-    condition = expression(ti)
+    condition = yield parsePrecedence(ti, ASSIGNMENT)
     ti.consume(TT.RIGHT_PAREN, "Expect ) after if condition")
-    thenBranch = statement(ti)
+    thenBranch = yield statement(ti)
     elseBranch = None
     if ti.match(TT.ELSE):
-        elseBranch = statement(ti)
+        elseBranch = yield statement(ti)
     return IfStmt(condition, thenBranch, elseBranch)
 
 
@@ -189,21 +248,21 @@ def forStmt(ti):
     if ti.match(TT.SEMICOLON):
         pass
     elif ti.match(TT.VAR):
-        initializer = varDecl(ti)
+        initializer = yield varDecl(ti)
     else:
-        initializer = exprStmt(ti)
+        initializer = yield exprStmt(ti)
 
     condition = None
     if not ti.check(TT.SEMICOLON):
-        condition = expression(ti)
+        condition = yield parsePrecedence(ti, ASSIGNMENT)
     ti.consume(TT.SEMICOLON, "Expect ; after loop condition")
 
     increment = None
     if not ti.check(TT.RIGHT_PAREN):
-        increment = expression(ti)
+        increment = yield parsePrecedence(ti, ASSIGNMENT)
     ti.consume(TT.RIGHT_PAREN, "expect ) after for clauses")
 
-    body = statement(ti)
+    body = yield statement(ti)
     if increment is not None:
         body = Block([body, Expression(increment)])
     if condition is None:
@@ -238,7 +297,7 @@ def returnStmt(ti):
     keyword = ti.previous()
     value = None
     if not ti.check(TT.SEMICOLON):
-        value = expression(ti)
+        value = yield parsePrecedence(ti, ASSIGNMENT)
 
     ti.consume(TT.SEMICOLON, "Expect ; after return statement")
     return Return(keyword, value)
@@ -251,19 +310,24 @@ def breakStmt(ti):
 
 
 def exprStmt(ti: TokenIter):
-    value = expression(ti)
+    value = yield parsePrecedence(ti, ASSIGNMENT)
     ti.consume(TT.SEMICOLON, "Expect statement to end with ';'")
     return Expression(value)
 
 
 def printStmt(ti: TokenIter):
-    value = expression(ti)
+    value = yield parsePrecedence(ti, ASSIGNMENT)
     ti.consume(TT.SEMICOLON, "Expect statement to end with ';'")
     return Print(value)
 
 
 def expression(ti: TokenIter):
-    return assignment(ti)
+    return trampoline(parsePrecedence(ti, ASSIGNMENT))
+
+
+# Recursive descent for expressions, one function per precedence level. The
+# Pratt parser below gives the same nodes and is what `expression` uses,
+# this is kept as its reference.
 
 
 def logic_or(ti):
@@ -286,7 +350,7 @@ def logic_and(ti):
 
 def assignment(ti):
     if ti.match(TT.FUN):
-        return function(ti, "lambda")
+        return trampoline(function(ti, "lambda"))
 
     expr = logic_or(ti)
 
@@ -375,7 +439,7 @@ def finishCall(ti, callee):
 
     arguments = []
     while True:
-        arguments.append(expression(ti))
+        arguments.append(assignment(ti))
         if not ti.match(TT.COMMA):
             break
     if len(arguments) > 255:
@@ -403,7 +467,7 @@ def primary(ti: TokenIter):
         return Literal(ti.previous().literal)
 
     if ti.match(TT.LEFT_PAREN):
-        expr = expression(ti)
+        expr = assignment(ti)
         ti.consume(TT.RIGHT_PAREN, "Expect ')' after expression.")
         return Grouping(expr)
 
@@ -414,12 +478,208 @@ def primary(ti: TokenIter):
     raise Exception(f"{ti.peek()}")
 
 
-def Parse(text):
-    sc = Scanner(text)
-    tokens = sc.scanTokens()
-    ti = TokenIter(tokens)
+# Pratt parser for expressions: the token after an operand picks the rule
+# from a table instead of descending through every precedence level.
+
+# binding powers, lowest first
+ASSIGNMENT, OR, AND, TERNARY, EQUALITY, COMPARISON, TERM, FACTOR, UNARY, CALL = range(
+    1, 11
+)
+
+
+def parsePrecedence(ti: TokenIter, precedence: int):
+    """Parses an expression whose operators bind at least as tight as
+    `precedence`, to be run by `trampoline`.
+
+    Most operands are a single token, those are returned as the node right
+    away instead of as a generator.
+    """
+    kinds = ti.kinds
+    current = ti.current
+    leaf = LEAF_RULES.get(kinds[current])
+    if leaf is not None:
+        rule = INFIX_RULES.get(kinds[current + 1])
+        if rule is None or rule[0] < precedence:
+            ti.current = current + 1
+            return leaf(ti)
+    return parseOperators(ti, precedence)
+
+
+def parseOperators(ti: TokenIter, precedence: int):
+    kinds = ti.kinds
+    kind = kinds[ti.current]
+    if kind == TT.FUN.kind and precedence == ASSIGNMENT:
+        ti.current += 1
+        return (yield function(ti, "lambda"))
+    prefix = PREFIX_RULES.get(kind)
+    if prefix is None:
+        raise Exception(f"{ti.peek()}")
+    ti.current += 1
+    expr = yield prefix(ti)
+
+    # a ternary can't be the test of another one, after it only the
+    # operators binding looser can follow. Nothing follows an assignment.
+    ceiling = CALL
+    while True:
+        rule = INFIX_RULES.get(kinds[ti.current])
+        if rule is None:
+            return expr
+        infixPrecedence, infix = rule
+        if infixPrecedence < precedence or infixPrecedence > ceiling:
+            return expr
+        ti.current += 1
+        expr = yield infix(ti, expr, infixPrecedence)
+        if infixPrecedence == ASSIGNMENT:
+            return expr
+        if infixPrecedence == TERNARY:
+            ceiling = TERNARY - 1
+
+
+def literalFalse(ti):
+    return Literal(False)
+
+
+def literalTrue(ti):
+    return Literal(True)
+
+
+def literalNil(ti):
+    return Literal(None)
+
+
+def literal(ti):
+    return Literal(ti.previous().literal)
+
+
+def variable(ti):
+    return Variable(ti.previous())
+
+
+def this(ti):
+    return This(ti.previous())
+
+
+def superGet(ti):
+    keyword = ti.previous()
+    ti.consume(TT.DOT, "Expect '.' after super")
+    method = ti.consume(TT.IDENTIFIER, "expect superclass method name")
+    return Super(keyword, method)
+
+
+def grouping(ti):
+    expr = yield parsePrecedence(ti, ASSIGNMENT)
+    ti.consume(TT.RIGHT_PAREN, "Expect ')' after expression.")
+    return Grouping(expr)
+
+
+def prefixUnary(ti):
+    operator = ti.previous()
+    return Unary(operator, (yield parsePrecedence(ti, UNARY)))
+
+
+def infixAssign(ti, target, precedence):
+    eql = ti.previous()
+    value = yield parsePrecedence(ti, ASSIGNMENT)
+    if type(target) == Variable:
+        return Assign(target.name, value)
+    if type(target) == Get:
+        return Set(target.obj, target.name, value)
+    raise Exception(f"invalid assignment target: {eql}")
+
+
+def infixLogical(ti, left, precedence):
+    operator = ti.previous()
+    right = yield parsePrecedence(ti, precedence + 1)
+    return Logical(left, operator, right)
+
+
+def infixBinary(ti, left, precedence):
+    operator = ti.previous()
+    right = yield parsePrecedence(ti, precedence + 1)
+    return Binary(left, operator, right)
+
+
+def infixTernary(ti, test, precedence):
+    left = yield parsePrecedence(ti, EQUALITY)
+    if not ti.match(TT.COLON):
+        raise Exception("Expected colon for ternary operator")
+    right = yield parsePrecedence(ti, EQUALITY)
+    return Ternary(test, left, right)
+
+
+def infixCall(ti, callee, precedence):
+    arguments = []
+    if not ti.check(TT.RIGHT_PAREN):
+        while True:
+            arguments.append((yield parsePrecedence(ti, ASSIGNMENT)))
+            if not ti.match(TT.COMMA):
+                break
+    if len(arguments) > 255:
+        error(ti.peek(), "Can't have more than 255 arguments")
+    paren = ti.consume(TT.RIGHT_PAREN, "Expect ) after arguments")
+    return Call(callee, paren, arguments)
+
+
+def infixGet(ti, obj, precedence):
+    name = ti.consume(TT.IDENTIFIER, "Expect property name after '.'")
+    return Get(obj, name)
+
+
+# rules by the integer kind of the token starting them
+PREFIX_RULES = {
+    TT.FALSE.kind: literalFalse,
+    TT.TRUE.kind: literalTrue,
+    TT.NIL.kind: literalNil,
+    TT.STRING.kind: literal,
+    TT.NUMBER.kind: literal,
+    TT.IDENTIFIER.kind: variable,
+    TT.THIS.kind: this,
+    TT.SUPER.kind: superGet,
+    TT.LEFT_PAREN.kind: grouping,
+    TT.BANG.kind: prefixUnary,
+    TT.MINUS.kind: prefixUnary,
+}
+# the prefix rules that parse a single token
+LEAF_RULES = {
+    TT.FALSE.kind: literalFalse,
+    TT.TRUE.kind: literalTrue,
+    TT.NIL.kind: literalNil,
+    TT.STRING.kind: literal,
+    TT.NUMBER.kind: literal,
+    TT.IDENTIFIER.kind: variable,
+    TT.THIS.kind: this,
+}
+INFIX_RULES = {
+    TT.EQUAL.kind: (ASSIGNMENT, infixAssign),
+    TT.OR.kind: (OR, infixLogical),
+    TT.AND.kind: (AND, infixLogical),
+    TT.QUESTION.kind: (TERNARY, infixTernary),
+    TT.EQUAL_EQUAL.kind: (EQUALITY, infixBinary),
+    TT.BANG_EQUAL.kind: (EQUALITY, infixBinary),
+    TT.GREATER.kind: (COMPARISON, infixBinary),
+    TT.GREATER_EQUAL.kind: (COMPARISON, infixBinary),
+    TT.LESS.kind: (COMPARISON, infixBinary),
+    TT.LESS_EQUAL.kind: (COMPARISON, infixBinary),
+    TT.PLUS.kind: (TERM, infixBinary),
+    TT.MINUS.kind: (TERM, infixBinary),
+    TT.STAR.kind: (FACTOR, infixBinary),
+    TT.SLASH.kind: (FACTOR, infixBinary),
+    TT.MOD.kind: (FACTOR, infixBinary),
+    TT.LEFT_PAREN.kind: (CALL, infixCall),
+    TT.DOT.kind: (CALL, infixGet),
+}
+
+
+def Parse(text, scanner=RegexScanner, lazy=False):
+    sc = scanner(text)
+    return parseTokens(sc.scanTokens(), lazy)
+
+
+def parseTokens(tokens, lazy=False):
+    """Parses the tokens of a scanner into statements"""
+    ti = TokenIter(tokens, lazy=lazy)
     out = []
     while not ti.isAtEnd():
-        decl = declaration(ti)
+        decl = trampoline(declaration(ti))
         out.append(decl)
     return out
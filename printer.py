@@ -1,83 +1,147 @@
+from functools import wraps
+
 from expr import ExprVisitor
 from stmt import StmtVisitor
 from parser import Parse
+from util import trampoline
+
+
+def nested(method):
+    """Runs a visit written as a generator on the explicit stack of
+    `trampoline` when it is the outermost one, so printing a node still
+    returns its text"""
+
+    @wraps(method)
+    def visit(self, val):
+        if self.running:
+            return method(self, val)
+        self.running = True
+        try:
+            return trampoline(method(self, val))
+        finally:
+            self.running = False
+
+    return visit
 
 
 class ExprPrinter(ExprVisitor, StmtVisitor):
-    """"""
+    """Prints nodes in polish notation.
+
+    Visits that print children yield them and are sent their text, so deep
+    trees print without deep recursion.
+    """
+
+    running = False
 
     def visitLiteral(self, val):
         if type(val.value) == str:
             return f"'{val.value}'"
         return val.value
 
+    @nested
     def visitGrouping(self, val):
-        return f"(group {val.expr.visit(self)})"
+        return f"(group {(yield val.expr.visit(self))})"
 
+    @nested
     def visitUnary(self, val):
-        return f"({val.operator.lexeme} {val.value.visit(self)})"
+        return f"({val.operator.lexeme} {(yield val.value.visit(self))})"
 
+    @nested
     def visitBinary(self, val):
-        return f"({val.operator.lexeme} {val.left.visit(self)} {val.right.visit(self)})"
+        left = yield val.left.visit(self)
+        right = yield val.right.visit(self)
+        return f"({val.operator.lexeme} {left} {right})"
 
+    @nested
     def visitTernary(self, val):
-        return (
-            f"(? {val.test.visit(self)} {val.left.visit(self)} {val.right.visit(self)})"
-        )
+        test = yield val.test.visit(self)
+        left = yield val.left.visit(self)
+        right = yield val.right.visit(self)
+        return f"(? {test} {left} {right})"
 
     def visitVariable(self, val):
         return f"(var {val.name.lexeme})"
 
+    @nested
     def visitPrint(self, val):
-        return f"(print {val.expression.visit(self)})"
+        return f"(print {(yield val.expression.visit(self))})"
 
+    @nested
     def visitExpression(self, val):
-        return val.expression.visit(self)
+        return (yield val.expression.visit(self))
 
+    @nested
     def visitVar(self, val):
         value = None
         if val.value:
-            value = val.value.visit(self)
+            value = yield val.value.visit(self)
         return f"(var {val.name.lexeme} {value})"
 
+    @nested
     def visitAssign(self, val):
-        return f"(assign {val.name.lexeme} {val.value.visit(self)})"
+        return f"(assign {val.name.lexeme} {(yield val.value.visit(self))})"
 
+    @nested
     def visitBlock(self, val):
-        return f'(block {" ".join([v.visit(self) for v in val.statements])})'
+        statements = []
+        for v in val.statements:
+            statements.append((yield v.visit(self)))
+        return f'(block {" ".join(statements)})'
 
+    @nested
     def visitIfStmt(self, val):
+        condition = yield val.condition.visit(self)
+        thenBranch = yield val.thenBranch.visit(self)
         elseBranch = ""
         if val.elseBranch is not None:
-            elseBranch = val.elseBranch.visit(self)
-        return f"(if {val.condition.visit(self)} {val.thenBranch.visit(self)} {elseBranch})"
+            elseBranch = yield val.elseBranch.visit(self)
+        return f"(if {condition} {thenBranch} {elseBranch})"
 
+    @nested
     def visitLogical(self, val):
-        return f"({val.operator.lexeme} {val.left.visit(self)} {val.right.visit(self)})"
+        left = yield val.left.visit(self)
+        right = yield val.right.visit(self)
+        return f"({val.operator.lexeme} {left} {right})"
 
+    @nested
     def visitWhileStmt(self, val):
-        return f"(while {val.condition.visit(self)} {val.body.visit(self)})"
+        condition = yield val.condition.visit(self)
+        body = yield val.body.visit(self)
+        return f"(while {condition} {body})"
 
     def visitBreakStmt(self, val):
         return "(break)"
 
+    @nested
     def visitCall(self, val):
-        return f"(call {val.callee.visit(self)} (args {', '.join([repr(arg.visit(self)) for arg in val.arguments])})"
+        callee = yield val.callee.visit(self)
+        arguments = []
+        for arg in val.arguments:
+            arguments.append(repr((yield arg.visit(self))))
+        return f"(call {callee} (args {', '.join(arguments)})"
 
     def visitFunction(self, val):
         return f"<func {val.name and val.name.lexeme} (args {', '.join((arg.lexeme for arg in val.params))} )>"
 
+    @nested
     def visitReturn(self, val):
-        return f"(return {val.expression.visit(self) if val.expression is not None else None})"
+        value = None
+        if val.expression is not None:
+            value = yield val.expression.visit(self)
+        return f"(return {value})"
 
     def visitClass(self, val):
         return f"(class {val.name.lexeme} {[fn.visit(self) for fn in val.methods]})"
 
+    @nested
     def visitGet(self, val):
-        return f"(get {val.name.lexeme} {val.obj.visit(self)})"
+        return f"(get {val.name.lexeme} {(yield val.obj.visit(self))})"
 
+    @nested
     def visitSet(self, val):
-        return f"(set {val.name.lexeme} {val.obj.visit(self)} {val.val.visit(self)})"
+        obj = yield val.obj.visit(self)
+        value = yield val.val.visit(self)
+        return f"(set {val.name.lexeme} {obj} {value})"
 
     def visitThis(self, val):
         return f"(this)"
@@ -0,0 +1,164 @@
+"""`plox --profile`: call counts and times of the Lox functions a script runs.
+
+While a script runs, the call paths of `LoxFunction`, `LoxClass` and the
+native functions are replaced by ones that time every call, so the report
+is in terms of the script's functions rather than of the visitor methods
+running them. Both the tree and closure engines call through them.
+"""
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+from interpreter import ClockFn, JoinFn, LoxClass, LoxFunction
+
+ROOT = "<script>"
+NATIVES = {ClockFn: "<native clock>", JoinFn: "<native join>"}
+
+
+def functionName(declaration) -> str:
+    """The name a function is reported under, its name and line"""
+    if declaration.name is None:
+        return f"<lambda>:{declaration.line}"
+    return f"{declaration.name.lexeme}:{declaration.line}"
+
+
+class Profiler:
+    """Calls, inclusive and self time of each function, and self time of
+    each distinct stack of calls for flame graphs.
+
+    A tail call replaces the frame of the function making it, like
+    `LoxFunction.run` does, so each shows up as its own call. The inclusive
+    time of a recursive function only counts its outermost calls.
+    """
+
+    def __init__(self):
+        # name: [calls, inclusive ns, self ns]
+        self.functions: Dict[str, List[int]] = {}
+        self.stacks: Dict[Tuple[str, ...], int] = {}
+        # [name, stack, start ns, ns spent in callees] of the running calls
+        self.frames: List[list] = []
+        self.active: Dict[str, int] = {}
+        self.names: Dict[int, str] = {}
+
+    def name(self, declaration) -> str:
+        name = self.names.get(id(declaration))
+        if name is None:
+            name = self.names[id(declaration)] = functionName(declaration)
+        return name
+
+    def enter(self, name: str):
+        frames = self.frames
+        stack = frames[-1][1] + (name,) if frames else (name,)
+        self.active[name] = self.active.get(name, 0) + 1
+        frames.append([name, stack, time.perf_counter_ns(), 0])
+
+    def exit(self):
+        name, stack, start, callees = self.frames.pop()
+        elapsed = time.perf_counter_ns() - start
+        stats = self.functions.get(name)
+        if stats is None:
+            stats = self.functions[name] = [0, 0, 0]
+        stats[0] += 1
+        stats[2] += elapsed - callees
+        self.active[name] -= 1
+        if not self.active[name]:
+            stats[1] += elapsed
+        self.stacks[stack] = self.stacks.get(stack, 0) + elapsed - callees
+        if self.frames:
+            self.frames[-1][3] += elapsed
+
+    def replace(self, name: str):
+        """Ends the running call and starts a tail call in its place"""
+        self.exit()
+        self.enter(name)
+
+    def patches(self):
+        """(class, method name, replacement) of the instrumented calls"""
+        profiler = self
+        call = LoxFunction.call
+        invoke = LoxFunction.invoke
+        frame = LoxFunction.frame
+        classCall = LoxClass.call
+
+        def functionCall(function, inpr, args):
+            if function.receiver is not None:
+                # bound methods are timed by `invoke`
+                return call(function, inpr, args)
+            profiler.enter(profiler.name(function.declaration))
+            try:
+                return call(function, inpr, args)
+            finally:
+                profiler.exit()
+
+        def methodInvoke(function, inpr, instance, args):
+            profiler.enter(profiler.name(function.declaration))
+            try:
+                return invoke(function, inpr, instance, args)
+            finally:
+                profiler.exit()
+
+        def tailCallFrame(function, this, args):
+            profiler.replace(profiler.name(function.declaration))
+            return frame(function, this, args)
+
+        def instantiate(klass, inpr, args):
+            profiler.enter(klass.name)
+            try:
+                return classCall(klass, inpr, args)
+            finally:
+                profiler.exit()
+
+        patches = [
+            (LoxFunction, "call", functionCall),
+            (LoxFunction, "invoke", methodInvoke),
+            (LoxFunction, "frame", tailCallFrame),
+            (LoxClass, "call", instantiate),
+        ]
+        for native, name in NATIVES.items():
+
+            def nativeCall(function, inpr, args, call=native.call, name=name):
+                profiler.enter(name)
+                try:
+                    return call(function, inpr, args)
+                finally:
+                    profiler.exit()
+
+            patches.append((native, "call", nativeCall))
+        return patches
+
+    @contextmanager
+    def running(self):
+        """Profiles the calls made inside, the time outside of any of them
+        counts as `<script>`"""
+        patches = self.patches()
+        originals = [(cls, name, cls.__dict__[name]) for cls, name, _ in patches]
+        for cls, name, replacement in patches:
+            setattr(cls, name, replacement)
+        self.enter(ROOT)
+        try:
+            yield self
+        finally:
+            # frames of calls an error unwound through were already ended
+            self.exit()
+            for cls, name, original in originals:
+                setattr(cls, name, original)
+
+    def report(self, file=None):
+        """Prints the functions by self time, most first"""
+        file = file or sys.stderr
+        print(f"{'calls':>10}{'total ms':>12}{'self ms':>12}  function", file=file)
+        rows = sorted(self.functions.items(), key=lambda item: -item[1][2])
+        for name, (calls, inclusive, exclusive) in rows:
+            print(
+                f"{calls:>10}{inclusive / 1e6:>12.2f}{exclusive / 1e6:>12.2f}  {name}",
+                file=file,
+            )
+
+    def writeCollapsed(self, file):
+        """Writes one `caller;...;callee microseconds` line per stack, the
+        input of flamegraph.pl and speedscope, with self time as the count"""
+        for stack, exclusive in sorted(self.stacks.items()):
+            microseconds = exclusive // 1000
+            if microseconds:
+                print(f"{';'.join(stack)} {microseconds}", file=file)
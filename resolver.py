@@ -1,15 +1,11 @@
-from typing import List, Dict, Union, Optional
+from typing import List, Dict, Set, Union, Optional
 from enum import Enum
 
 from tokens import Token
-from expr import ExprVisitor, Expr
+from expr import Call, ExprVisitor, Expr
 from stmt import Function, StmtVisitor, Stmt
-from interpreter import Interpreter
-from logging import error
-
-from printer import ExprPrinter
-
-prnt = ExprPrinter()
+from interpreter import Interpreter, PropertyCache
+from util import RuntimeException, error, trampoline
 
 
 class ClassType(Enum):
@@ -18,99 +14,155 @@ class ClassType(Enum):
 
 
 class Resolver(ExprVisitor, StmtVisitor):
-    scopes: List[Dict[str, bool]]
+    """Resolves every local variable to a (depth, slot) pair.
+
+    Each scope maps the names declared in it to their slot, in declaration
+    order. The pair is stored on the `Variable`, `Assign`, `This` and
+    `Super` nodes, and declarations and scopes get their slot and size.
+    Globals keep depth None and get the index of their name in the global
+    table of the interpreter instead.
+
+    Visits of nodes with children are generators that yield the visits of
+    their children, `resolve` runs them with `trampoline` so nesting depth
+    is not limited by the Python stack.
+    """
+
+    scopes: List[Dict[str, int]]
+    defined: List[Set[str]]
     interpreter: Interpreter
     currentFunction = None
 
     def __init__(self, interpreter):
         self.interpreter = interpreter
         self.scopes = []
+        self.defined = []
         self.currentClass = ClassType.NONE
+        # loops around the statement being resolved, in the current function
+        self.loopDepth = 0
 
     def beginScope(self):
         self.scopes.append({})
+        self.defined.append(set())
 
-    def endScope(self):
-        self.scopes.pop()
+    def endScope(self) -> int:
+        """Closes the innermost scope and returns its number of slots"""
+        self.defined.pop()
+        return len(self.scopes.pop())
 
     def resolve(self, val: Union[List[Stmt], Stmt, Expr]):
         if isinstance(val, List):
             for v in val:
-                v.visit(self)
+                trampoline(v.visit(self))
         else:
-            val.visit(self)
+            trampoline(val.visit(self))
 
     def visitBlock(self, val):
         self.beginScope()
-        self.resolve(val.statements)
-        self.endScope()
+        for stmt in val.statements:
+            yield stmt.visit(self)
+        val.size = self.endScope()
 
-    def declare(self, val: Token):
+    def declare(self, val: Token, decl: Optional[Stmt] = None):
+        """Adds a name to the innermost scope, storing its slot on `decl`"""
         if len(self.scopes) == 0:
+            if decl is not None:
+                decl.slot = self.interpreter.globals.index(val.lexeme)
             return
         scope = self.scopes[-1]
-        scope[val.lexeme] = False
+        if val.lexeme in scope:
+            raise RuntimeException(f"Variable already defined: {val.lexeme}")
+        scope[val.lexeme] = len(scope)
+        if decl is not None:
+            decl.depth = 0
+            decl.slot = scope[val.lexeme]
 
     def define(self, val: Token):
         if len(self.scopes) == 0:
             return
-        self.scopes[-1][val.lexeme] = True
+        self.defined[-1].add(val.lexeme)
 
     def visitVar(self, val):
-        self.declare(val.name)
+        self.declare(val.name, val)
         if val.value is not None:
-            self.resolve(val.value)
+            yield val.value.visit(self)
         self.define(val.name)
 
     def resolveLocal(self, val: Expr, name: Token):
         for i in range(len(self.scopes) - 1, -1, -1):
             if name.lexeme in self.scopes[i]:
-                self.interpreter.resolve(val, len(self.scopes) - i - 1)
+                val.depth = len(self.scopes) - i - 1
+                val.slot = self.scopes[i][name.lexeme]
                 return
+        val.slot = self.interpreter.globals.index(name.lexeme)
 
     def visitVariable(self, val):
         if (
             len(self.scopes) > 0
             and val.name.lexeme in self.scopes[-1]
-            and self.scopes[-1][val.name.lexeme] == False
+            and val.name.lexeme not in self.defined[-1]
         ):
-            error(val.name, "Can't read local variable in its own initalizer")
+            raise RuntimeException(
+                f"Can't read local variable in its own initializer: {val.name.lexeme}"
+            )
         self.resolveLocal(val, val.name)
 
     def visitAssign(self, val):
-        self.resolve(val.value)
+        yield val.value.visit(self)
         self.resolveLocal(val, val.name)
 
     # TODO: function type should be an enum
     def resolveFunction(self, val: Function, type: Optional[str] = None):
+        enclosingFunction = self.currentFunction
+        enclosingLoopDepth = self.loopDepth
         self.currentFunction = type
+        self.loopDepth = 0
 
         self.beginScope()
+        if type in {"method", "initialzer"}:
+            # methods get `this` in slot 0 of their own frame
+            self.scopes[-1]["this"] = 0
+            self.defined[-1].add("this")
         for param in val.params:
             self.declare(param)
             self.define(param)
-        self.resolve(val.body)
-        self.endScope()
+        if val.lazy is not None:
+            # resolved on the first call, against the scopes as they are now
+            val.lazy = LazyFunction(
+                val,
+                val.lazy,
+                [dict(scope) for scope in self.scopes],
+                [set(names) for names in self.defined],
+                self.currentClass,
+                type,
+            )
+            self.endScope()
+        else:
+            for stmt in val.body:
+                yield stmt.visit(self)
+            val.size = self.endScope()
+
+        self.currentFunction = enclosingFunction
+        self.loopDepth = enclosingLoopDepth
 
     def visitFunction(self, val):
         if val.name:
-            self.declare(val.name)
+            self.declare(val.name, val)
             self.define(val.name)
-        self.resolveFunction(val)
+        yield self.resolveFunction(val, "function")
 
     def visitExpression(self, val):
-        self.resolve(val.expression)
+        yield val.expression.visit(self)
 
     def visitIfStmt(self, val):
-        self.resolve(val.condition)
-        self.resolve(val.thenBranch)
+        yield val.condition.visit(self)
+        yield val.thenBranch.visit(self)
         if val.elseBranch:
-            self.resolve(val.elseBranch)
+            yield val.elseBranch.visit(self)
 
     def visitClass(self, val):
         enclosingClass = self.currentClass
         self.currentClass = ClassType.CLASS
-        self.declare(val.name)
+        self.declare(val.name, val)
         self.define(val.name)
 
         if val.superclass is not None:
@@ -118,21 +170,17 @@ class Resolver(ExprVisitor, StmtVisitor):
                 raise Exception(
                     f"A class cannot inherit from itself: {val.name.lexeme}"
                 )
-            self.resolve(val.superclass)
+            yield val.superclass.visit(self)
 
         if val.superclass is not None:
             self.beginScope()
-            self.scopes[-1]["super"] = True
-
-        self.beginScope()
-        self.scopes[-1]["this"] = True
+            self.scopes[-1]["super"] = 0
 
         for method in val.methods:
             kind = "method"
             if method.name and method.name.lexeme == "init":
                 kind = "initialzer"
-            self.resolveFunction(method, kind)
-        self.endScope()
+            yield self.resolveFunction(method, kind)
 
         if val.superclass is not None:
             self.endScope()
@@ -140,7 +188,7 @@ class Resolver(ExprVisitor, StmtVisitor):
         self.currentClass = enclosingClass
 
     def visitPrint(self, val):
-        self.resolve(val.expression)
+        yield val.expression.visit(self)
 
     def visitSuper(self, val):
         self.resolveLocal(val, val.keyword)
@@ -153,30 +201,36 @@ class Resolver(ExprVisitor, StmtVisitor):
         if val.expression is not None:
             if self.currentFunction == "initialzer":
                 raise Exception("can't return a value from an initializer")
-            self.resolve(val.expression)
+            yield val.expression.visit(self)
+            if type(val.expression) is Call:
+                val.tail = True
 
     def visitWhileStmt(self, val):
-        self.resolve(val.condition)
-        self.resolve(val.body)
+        yield val.condition.visit(self)
+        self.loopDepth += 1
+        yield val.body.visit(self)
+        self.loopDepth -= 1
 
     def visitBinary(self, val):
-        self.resolve(val.left)
-        self.resolve(val.right)
+        yield val.left.visit(self)
+        yield val.right.visit(self)
 
     def visitCall(self, val):
-        self.resolve(val.callee)
+        yield val.callee.visit(self)
         for arg in val.arguments:
-            self.resolve(arg)
+            yield arg.visit(self)
 
     def visitGrouping(self, val):
-        self.resolve(val.expr)
+        yield val.expr.visit(self)
 
     def visitGet(self, val):
-        self.resolve(val.obj)
+        val.cache = PropertyCache(val.name.lexeme)
+        yield val.obj.visit(self)
 
     def visitSet(self, val):
-        self.resolve(val.val)
-        self.resolve(val.obj)
+        val.cache = PropertyCache(val.name.lexeme)
+        yield val.val.visit(self)
+        yield val.obj.visit(self)
 
     def visitThis(self, val):
         if self.currentClass == ClassType.NONE:
@@ -185,22 +239,54 @@ class Resolver(ExprVisitor, StmtVisitor):
         self.resolveLocal(val, val.keyword)
 
     def visitBreakStmt(self, val):
-        return
+        if self.loopDepth == 0:
+            raise RuntimeException("Can't break outside of a loop")
 
     def visitLiteral(self, val):
         return
 
     def visitLogical(self, val):
-        self.resolve(val.left)
-        self.resolve(val.right)
+        yield val.left.visit(self)
+        yield val.right.visit(self)
 
     def visitTernary(self, val):
-        self.resolve(val.left)
-        self.resolve(val.test)
-        self.resolve(val.right)
+        yield val.left.visit(self)
+        yield val.test.visit(self)
+        yield val.right.visit(self)
 
     def visitUnary(self, val):
-        self.resolve(val.value)
+        yield val.value.visit(self)
+
+
+class LazyFunction:
+    """A function whose body is parsed and resolved on its first call.
+
+    Keeps copies of the scopes around the function when it was declared,
+    with its parameters in the innermost one, so names in the body resolve
+    as if it had been resolved in place.
+    """
+
+    def __init__(self, function, body, scopes, defined, currentClass, kind):
+        self.function = function
+        self.body = body
+        self.scopes = scopes
+        self.defined = defined
+        self.currentClass = currentClass
+        self.kind = kind
+
+    def complete(self, interpreter):
+        """Fills in the body and size of the function"""
+        statements = self.body.parse()
+        resolver = Resolver(interpreter)
+        resolver.scopes = [dict(scope) for scope in self.scopes]
+        resolver.defined = [set(names) for names in self.defined]
+        resolver.currentClass = self.currentClass
+        resolver.currentFunction = self.kind
+        resolver.resolve(statements)
+        function = self.function
+        function.body.extend(statements)
+        function.size = len(resolver.scopes[-1])
+        function.lazy = None
 
 
 if __name__ == "__main__":
@@ -0,0 +1,84 @@
+from typing import List
+
+# concatenations shorter than this stay plain strings, copying them is
+# cheaper than keeping their pieces
+ROPE_THRESHOLD = 256
+
+
+class Rope:
+    """A Lox string built by concatenation, joined into a `str` only when it
+    is printed, compared or hashed.
+
+    Ropes appended to one after another share a single list of pieces: a
+    rope owns the first `count` pieces of the list, and appending to the
+    rope owning all of them adds to the list in place. Building a string
+    piece by piece with `+` is then linear instead of copying the whole
+    string every time.
+    """
+
+    __slots__ = ("pieces", "count", "length", "flat")
+
+    def __init__(self, pieces: List[str], count: int, length: int):
+        self.pieces = pieces
+        self.count = count
+        self.length = length
+        self.flat = None
+
+    def append(self, text: str) -> "Rope":
+        pieces = self.pieces
+        if len(pieces) != self.count:
+            # a longer rope already shares the list
+            pieces = pieces[: self.count]
+        pieces.append(text)
+        return Rope(pieces, self.count + 1, self.length + len(text))
+
+    def __str__(self):
+        if self.flat is None:
+            pieces = self.pieces
+            if len(pieces) != self.count:
+                pieces = pieces[: self.count]
+            self.flat = "".join(pieces)
+        return self.flat
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __eq__(self, other):
+        if other.__class__ is Rope:
+            return self.length == other.length and str(self) == str(other)
+        if other.__class__ is str:
+            return self.length == len(other) and str(self) == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    def __hash__(self):
+        return hash(str(self))
+
+
+def concat(left, right):
+    """`left + right` for a `str` or `Rope` on the left and a `str`, `Rope`
+    or float on the right"""
+    if right.__class__ is float:
+        right = f"{right}"
+    elif right.__class__ is Rope:
+        right = str(right)
+    if left.__class__ is Rope:
+        return left.append(right)
+    length = len(left) + len(right)
+    if length < ROPE_THRESHOLD:
+        return left + right
+    return Rope([left, right], 2, length)
+
+
+def join(left, right):
+    """The `join` native: both values as `print` shows them, concatenated"""
+    if left.__class__ is not Rope:
+        left = str(left)
+    if right.__class__ is not str:
+        right = str(right)
+    return concat(left, right)
@@ -0,0 +1,132 @@
+"""`plox --sample-profile`: where a script spends its time, by source line.
+
+A profiling timer interrupts the tree engine HZ times a second of CPU time,
+and the handler walks the Python stack. The innermost visit of a node that
+carries a token gives the Lox line running, and the `LoxFunction.run`
+frames give the Lox calls around it. Unlike `--profile`, nothing runs
+between samples, so hot loops run at full speed.
+"""
+import signal
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from interpreter import Interpreter, LoxFunction
+from profiler import ROOT, functionName
+from stmt import Function
+from tokens import Token
+from util import Visitable
+
+DEFAULT_HZ = 100
+# samples taken outside of any node with a line
+OUTSIDE = 0
+
+VISITS = frozenset(
+    method.__code__
+    for name, method in vars(Interpreter).items()
+    if name.startswith("visit")
+)
+RUN = LoxFunction.run.__code__
+
+
+def nodeLine(node) -> Optional[int]:
+    """Line of the first token in `node`, None when it has none, like the
+    leaf statements `break` and `nil`"""
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        if type(node) is Token or type(node) is Function:
+            return node.line
+        if isinstance(node, list) or (
+            isinstance(node, tuple) and isinstance(node, Visitable)
+        ):
+            pending.extend(reversed(node))
+    return None
+
+
+class Sampler:
+    """Samples of the line and Lox call stack running, taken every 1/`hz`
+    seconds of CPU time"""
+
+    def __init__(self, hz: int = DEFAULT_HZ):
+        self.hz = hz
+        self.lines: Counter = Counter()
+        self.stacks: Counter = Counter()
+        self.nodeLines: Dict[int, int] = {}
+        self.names: Dict[int, str] = {}
+
+    def sample(self, signum, frame):
+        # the handler runs inside the script, it must never raise into it
+        try:
+            line, stack = self.where(frame)
+        except Exception:
+            line, stack = None, []
+        self.lines[line or OUTSIDE] += 1
+        stack.append(ROOT)
+        self.stacks[tuple(reversed(stack))] += 1
+
+    def where(self, frame):
+        """The line and the Lox calls, innermost first, running in `frame`"""
+        line = None
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            if code is RUN:
+                # `self` until the first tail call sets `function`
+                values = frame.f_locals
+                declaration = values.get("function", values["self"]).declaration
+                name = self.names.get(id(declaration))
+                if name is None:
+                    name = self.names[id(declaration)] = functionName(declaration)
+                stack.append(name)
+            elif line is None and code in VISITS:
+                node = frame.f_locals["val"]
+                line = self.nodeLines.get(id(node))
+                if line is None:
+                    line = self.nodeLines[id(node)] = nodeLine(node) or 0
+                if not line:
+                    line = None
+            frame = frame.f_back
+        return line, stack
+
+    @contextmanager
+    def running(self):
+        interval = 1 / self.hz
+        previous = signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, interval, interval)
+        try:
+            yield self
+        finally:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, previous)
+
+    def report(self, source: str, file=None):
+        """Prints the sampled lines of `source` with their hits, then the
+        functions by the samples they were running in"""
+        file = file or sys.stderr
+        total = sum(self.lines.values())
+        print(f"{total} samples at {self.hz} Hz", file=file)
+        if not total:
+            return
+        print(f"{'hits':>8}{'%':>8}{'line':>6}  source", file=file)
+        text = source.splitlines()
+        for line, hits in sorted(self.lines.items()):
+            code = text[line - 1].strip() if 0 < line <= len(text) else ""
+            where = line if line else "-"
+            print(f"{hits:>8}{hits / total:>8.1%}{where:>6}  {code}", file=file)
+
+        # a recursive function counts once per sample it is on the stack of
+        inclusive: Counter = Counter()
+        exclusive: Counter = Counter()
+        for stack, hits in self.stacks.items():
+            for name in set(stack):
+                inclusive[name] += hits
+            exclusive[stack[-1]] += hits
+        print(f"{'total':>8}{'%':>8}{'self':>8}{'%':>8}  function", file=file)
+        for name, hits in inclusive.most_common():
+            print(
+                f"{hits:>8}{hits / total:>8.1%}{exclusive[name]:>8}"
+                f"{exclusive[name] / total:>8.1%}  {name}",
+                file=file,
+            )
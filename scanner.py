@@ -1,5 +1,12 @@
+import re
 from typing import List, Optional
-from tokens import Token, TokenType, SINGLE_CHAR_LEXEMES, RESERVED_KEYWORDS
+from tokens import (
+    Token,
+    TokenStore,
+    TokenType,
+    SINGLE_CHAR_LEXEMES,
+    RESERVED_KEYWORDS,
+)
 
 
 def isDigit(c):
@@ -155,3 +162,137 @@ class Scanner:
 
         self.tokens.append(Token(TokenType.EOF, "", None, self.line))
         return self.tokens
+
+
+# One alternative per kind of token, tried in order at each position and
+# after any spaces before the token. The group that matched tells
+# `RegexScanner` what it found.
+TOKEN_PATTERN = re.compile(
+    r"""
+    [^\S\n]*
+    (?:
+        ([A-Za-z_][A-Za-z0-9_]*)    # 1 identifier or keyword
+        | (//[^\n]*)                # 2 comment, before `/`
+        | (!=|==|<=|>=|[-(){},.+;/*?:%!=<>])  # 3 operator
+        | (\n\s*)                   # 4 newlines, and the spaces after them
+        | ([0-9]+(?:\.[0-9]+)?)     # 5 number
+        | ("[^"]*")                 # 6 string
+        | (")                       # 7 unterminated string
+        | (\S)                      # 8 unexpected character
+    )
+    """,
+    re.VERBOSE,
+)
+IDENTIFIER, COMMENT, OPERATOR, NEWLINES, NUMBER, STRING, UNTERMINATED = range(1, 8)
+
+KEYWORD_TYPES = {keyword: TokenType(keyword) for keyword in RESERVED_KEYWORDS}
+OPERATOR_TYPES = {tp.value: tp for tp in TokenType if tp.value and not tp.value.isalpha()}
+
+
+class RegexScanner:
+    """Scans a string with `TOKEN_PATTERN`, giving the tokens `Scanner` gives.
+
+    Whole identifiers, numbers, strings, comments and runs of whitespace
+    are matched at once instead of a character at a time. Errors are
+    reported like `Scanner` does, including the `IndexError` it runs into
+    after an unterminated string.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.tokens: List[Token] = []
+        self.line = 1
+
+    def scanTokens(self) -> List[Token]:
+        tokens = self.tokens
+        append = tokens.append
+        line = self.line
+        identifier = TokenType.IDENTIFIER
+        keywords = KEYWORD_TYPES
+        operators = OPERATOR_TYPES
+        for match in TOKEN_PATTERN.finditer(self.source):
+            kind = match.lastindex
+            text = match.group(kind)
+            if kind == IDENTIFIER:
+                append(Token(keywords.get(text, identifier), text, None, line))
+            elif kind == OPERATOR:
+                append(Token(operators[text], text, None, line))
+            elif kind == NEWLINES:
+                line += text.count("\n")
+            elif kind == NUMBER:
+                append(Token(TokenType.NUMBER, text, float(text), line))
+            elif kind == STRING:
+                # like `Scanner`, the line is the one the string ends on
+                line += text.count("\n")
+                append(Token(TokenType.STRING, text, text[1:-1], line))
+            elif kind == UNTERMINATED:
+                line += self.source.count("\n", match.end())
+                print(line, f"Unterminated string in line: {line}")
+                self.line = line
+                raise IndexError("string index out of range")
+            elif kind != COMMENT:
+                print(line, f"Unexpected character found: {text}")
+
+        self.line = line
+        append(Token(TokenType.EOF, "", None, line))
+        return tokens
+
+
+class CompactScanner:
+    """Scans like `RegexScanner` into a `TokenStore` instead of a list.
+
+    No `Token` or lexeme is created while scanning, `TokenIter` reads the
+    kinds straight from the store and only the tokens the parser keeps are
+    materialized.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.tokens = TokenStore(source)
+        self.line = 1
+
+    def scanTokens(self) -> TokenStore:
+        tokens = self.tokens
+        kinds = tokens.kinds.append
+        starts = tokens.starts.append
+        lengths = tokens.lengths.append
+        lines = tokens.lines.append
+        line = self.line
+        identifier = TokenType.IDENTIFIER.kind
+        keywords = {keyword: type.kind for keyword, type in KEYWORD_TYPES.items()}
+        operators = {text: type.kind for text, type in OPERATOR_TYPES.items()}
+        for match in TOKEN_PATTERN.finditer(self.source):
+            kind = match.lastindex
+            if kind == IDENTIFIER:
+                kinds(keywords.get(match.group(kind), identifier))
+            elif kind == OPERATOR:
+                kinds(operators[match.group(kind)])
+            elif kind == NEWLINES:
+                line += match.group(kind).count("\n")
+                continue
+            elif kind == NUMBER:
+                kinds(TokenType.NUMBER.kind)
+            elif kind == STRING:
+                line += match.group(kind).count("\n")
+                kinds(TokenType.STRING.kind)
+            elif kind == UNTERMINATED:
+                line += self.source.count("\n", match.end())
+                print(line, f"Unterminated string in line: {line}")
+                self.line = line
+                raise IndexError("string index out of range")
+            else:
+                if kind != COMMENT:
+                    print(line, f"Unexpected character found: {match.group(kind)}")
+                continue
+            start, end = match.span(kind)
+            starts(start)
+            lengths(end - start)
+            lines(line)
+
+        self.line = line
+        tokens.append(TokenType.EOF.kind, len(self.source), 0, line)
+        return tokens
+
+
+# scanners `Parse` can use, by name
+SCANNERS = {"regex": RegexScanner, "char": Scanner, "compact": CompactScanner}
@@ -0,0 +1,199 @@
+"""Runs scripts in a long-lived plox process instead of a fresh Python.
+
+`plox --server` imports everything once and listens on a Unix socket.
+`plox --client` sends its arguments, working directory and its stdin,
+stdout and stderr to the server, which forks a child to run them. The child
+writes straight to the client's terminal or pipes, and sends back its exit
+status. Every request gets its own fork of the server, so scripts never see
+each other's globals. The socket is private to the user running the
+server, and clients only hand their streams to a server of their own user.
+
+The client imports as little as it can, so it starts quickly.
+"""
+import os
+import signal
+import socket
+import stat
+import struct
+import sys
+
+DEFAULT_SOCKET = os.path.join(
+    os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("TMPDIR") or "/tmp",
+    f"plox-{os.getuid()}.sock",
+)
+
+# the largest request, the working directory and the arguments separated by
+# NUL bytes, which arguments can't contain
+MAX_REQUEST = 1 << 16
+STATUS = struct.Struct("!i")
+# pid, uid and gid of SO_PEERCRED
+CREDS = struct.Struct("3i")
+
+
+def receiveInt(conn: socket.socket) -> int:
+    data = b""
+    while len(data) < STATUS.size:
+        chunk = conn.recv(STATUS.size - len(data))
+        if not chunk:
+            raise ConnectionError("plox server closed the connection")
+        data += chunk
+    return STATUS.unpack(data)[0]
+
+
+def exitStatus(code) -> int:
+    """The status `sys.exit(code)` exits the process with"""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def peerUid(conn: socket.socket, path: str) -> int:
+    """The user running the other end of `conn`, connected to `path`"""
+    if hasattr(socket, "SO_PEERCRED"):
+        creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, CREDS.size)
+        return CREDS.unpack(creds)[1]
+    # no peer credentials on this platform, trust the owner of the socket
+    return os.stat(path).st_uid
+
+
+def listen(path: str) -> socket.socket:
+    """A socket listening on `path` that only this user can connect to"""
+    if os.path.lexists(path):
+        info = os.lstat(path)
+        if info.st_uid != os.getuid() or not stat.S_ISSOCK(info.st_mode):
+            raise SystemExit(f"plox: {path} is not a socket of this user's")
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            # left behind by a server that died
+            os.unlink(path)
+        else:
+            probe.close()
+            raise SystemExit(f"plox: a server is already listening on {path}")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # created 0600, so the socket is never open to others, even briefly
+    umask = os.umask(0o177)
+    try:
+        listener.bind(path)
+    finally:
+        os.umask(umask)
+    listener.listen()
+    return listener
+
+
+def serve(path, handle):
+    """Serves requests on the socket at `path` until interrupted.
+
+    `handle` gets the arguments of a request and runs them in the child,
+    with the client's streams as its own.
+    """
+    listener = listen(path)
+    # children are reaped by the kernel, the server never waits for them
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    print(f"plox: serving on {path}", file=sys.stderr)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    try:
+        while True:
+            conn, _ = listener.accept()
+            with conn:
+                try:
+                    message, fds, _, _ = socket.recv_fds(conn, MAX_REQUEST, 3)
+                    cwd, *argv = os.fsdecode(message).split("\0")
+                except (OSError, ValueError):
+                    continue
+                if len(fds) == 3 and os.fork() == 0:
+                    try:
+                        listener.close()
+                        runRequest(conn, cwd, argv, fds, handle)
+                    finally:
+                        os._exit(1)
+                for fd in fds:
+                    os.close(fd)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        os.unlink(path)
+
+
+def runRequest(conn, cwd, argv, fds, handle):
+    """Runs in the forked child, never returns"""
+    import traceback
+
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    sys.stdout.reconfigure(line_buffering=os.isatty(1))
+    status = 0
+    try:
+        os.chdir(cwd)
+        conn.sendall(STATUS.pack(os.getpid()))
+        handle(argv)
+    except SystemExit as exit:
+        status = exitStatus(exit.code)
+    except KeyboardInterrupt:
+        traceback.print_exc()
+        status = 130
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        conn.sendall(STATUS.pack(status))
+    finally:
+        os._exit(0)
+
+
+def runRemote(path, argv) -> int:
+    """Runs plox with `argv` on the server at `path`, returning the exit
+    status. Interrupting the client interrupts the script."""
+    request = os.fsencode("\0".join([os.getcwd(), *argv]))
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        try:
+            conn.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            print(
+                f"plox: no server on {path}, start one with `plox --server`",
+                file=sys.stderr,
+            )
+            return 1
+        if peerUid(conn, path) != os.getuid():
+            # it would get this user's terminal
+            print(f"plox: the server on {path} is another user's", file=sys.stderr)
+            return 1
+        sys.stdout.flush()
+        socket.send_fds(conn, [request], [0, 1, 2])
+        try:
+            pid = receiveInt(conn)
+            while True:
+                try:
+                    return receiveInt(conn)
+                except KeyboardInterrupt:
+                    os.kill(pid, signal.SIGINT)
+        except ConnectionError as error:
+            print(error, file=sys.stderr)
+            return 1
+
+
+def socketPath(argv) -> str:
+    """The value of --socket in `argv`, the last one like argparse, without
+    the cost of importing argparse"""
+    path = DEFAULT_SOCKET
+    for index, arg in enumerate(argv):
+        if arg.startswith("--socket="):
+            path = arg[len("--socket=") :]
+        elif arg == "--socket" and index + 1 < len(argv):
+            path = argv[index + 1]
+    return path
+
+
+if __name__ == "__main__":
+    # the `plox --client` fast path, lox.py accepts the same arguments
+    sys.exit(runRemote(socketPath(sys.argv[1:]), sys.argv[1:]))
@@ -35,7 +35,8 @@ class _Var(NamedTuple):
 
 
 class Var(Stmt, _Var):
-    pass
+    depth: Optional[int] = None
+    slot: int = 0
 
 
 class _Block(NamedTuple):
@@ -46,7 +47,8 @@ class Block(
     Stmt,
     _Block,
 ):
-    pass
+    # number of locals declared directly in the block, set by the resolver
+    size: int = 0
 
 
 class _IfStmt(NamedTuple):
@@ -79,7 +81,15 @@ class _Function(NamedTuple):
 
 
 class Function(Expr, Stmt, _Function):
-    pass
+    depth: Optional[int] = None
+    slot: int = 0
+    # slots needed by a call: the parameters and the top level locals
+    size: int = 0
+    # set instead of the body when it is parsed on the first call, see
+    # `parser.LazyBody` and `resolver.LazyFunction`
+    lazy: Any = None
+    # line of the name, or of `fun` for a lambda, set by the parser
+    line: int = 0
 
 
 class _Return(NamedTuple):
@@ -88,7 +98,9 @@ class _Return(NamedTuple):
 
 
 class Return(Stmt, _Return):
-    pass
+    # set by the resolver when the expression is a call whose result is
+    # returned as is, so the call can reuse the frame of the function
+    tail: bool = False
 
 
 class _Class(NamedTuple):
@@ -98,7 +110,8 @@ class _Class(NamedTuple):
 
 
 class Class(Stmt, _Class):
-    pass
+    depth: Optional[int] = None
+    slot: int = 0
 
 
 class StmtVisitor(ABC):
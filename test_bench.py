@@ -0,0 +1,64 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+import bench
+
+
+class TestBench(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.corpus = bench.BENCHMARKS
+        bench.BENCHMARKS = self.directory.name
+        self.script("tiny", "var a = 0; for (var i = 0; i < 9; i = i + 1) a = a + i;")
+
+    def tearDown(self):
+        bench.BENCHMARKS = self.corpus
+        self.directory.cleanup()
+
+    def script(self, name, source):
+        with open(os.path.join(self.directory.name, f"{name}.lox"), "w") as f:
+            f.write(source)
+
+    def bench(self, *args):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            status = bench.main(["--runs=2", *args])
+        return status, output.getvalue()
+
+    def testResults(self):
+        path = os.path.join(self.directory.name, "results.json")
+        status, output = self.bench("--engines=tree,vm", f"--json={path}")
+        self.assertEqual(status, 0)
+        self.assertEqual(len(output.splitlines()), 3)
+        with open(path) as f:
+            results = json.load(f)
+        self.assertEqual(results["runs"], 2)
+        self.assertEqual(
+            [(r["benchmark"], r["engine"]) for r in results["results"]],
+            [("tiny", "tree"), ("tiny", "vm")],
+        )
+        for result in results["results"]:
+            self.assertEqual(len(result["times"]), 2)
+            self.assertEqual(result["min"], min(result["times"]))
+            self.assertGreater(result["peakRssMB"], 1)
+
+        # against itself nothing is 10x slower, everything is slower than -100%
+        baseline = f"--baseline={path}"
+        status, output = self.bench("--engines=vm", baseline, "--threshold=9")
+        self.assertEqual(status, 0)
+        self.assertIn("%", output)
+        status, output = self.bench("--engines=vm", baseline, "--threshold=-1")
+        self.assertEqual(status, 1)
+        self.assertIn("slower", output)
+
+    def testOutputMustMatch(self):
+        self.script("clock", "print clock();")
+        self.script("broken", "print undefined;")
+        status, output = self.bench("clock", "broken", "--engines=tree,closure")
+        self.assertEqual(status, 0)
+        self.assertIn("prints something else", output)
+        self.assertIn("exited with status 1", output)
@@ -0,0 +1,81 @@
+import os
+import subprocess
+import tempfile
+import unittest
+
+from cache import ProgramCache
+from lox import compileProgram
+
+SOURCE = """
+var total = 0;
+fun add(a, b) { var sum = a + b; return sum; }
+class Point { init(x) { this.x = x; } }
+total = add(total, Point(2).x);
+print total;
+"""
+
+
+class TestProgramCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ProgramCache(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def entries(self):
+        directory = self.directory.name
+        return [os.path.join(directory, name) for name in os.listdir(directory)]
+
+    def testRoundTrip(self):
+        compiled = compileProgram(SOURCE, cache=self.cache)
+        [entry] = self.entries()
+        self.assertTrue(entry.endswith(".loxc"))
+
+        loaded = self.cache.load(SOURCE)
+        self.assertEqual(loaded, compiled)
+        self.assertEqual(loaded.globals, compiled.globals)
+        # what the resolver stored on the nodes comes back too
+        function = loaded.program[1]
+        self.assertEqual(function.size, 3)
+        result = function.body[1].expression
+        self.assertEqual((result.depth, result.slot), (0, 2))
+        self.assertTrue(function.body[1].tail is False)
+
+    def testKeyedBySourceAndLevel(self):
+        compileProgram(SOURCE, cache=self.cache)
+        self.assertIsNone(self.cache.load(SOURCE + "print 1;"))
+        self.assertIsNone(self.cache.load(SOURCE, optimizeLevel=1))
+        self.assertIsNotNone(self.cache.load(SOURCE))
+
+    def testBadEntriesAreRecompiled(self):
+        compiled = compileProgram(SOURCE, cache=self.cache)
+        [entry] = self.entries()
+        with open(entry, "rb") as f:
+            data = f.read()
+        for bad in [b"", data[:40], data[:-10], b"x" + data[1:], data[:70] + b"junk"]:
+            with open(entry, "wb") as f:
+                f.write(bad)
+            self.assertIsNone(self.cache.load(SOURCE))
+            self.assertEqual(compileProgram(SOURCE, cache=self.cache), compiled)
+            self.assertIsNotNone(self.cache.load(SOURCE))
+
+    def testTooDeepIsNotStored(self):
+        source = "print " + "(" * 100_000 + "1" + ")" * 100_000 + ";"
+        compileProgram(source, cache=self.cache)
+        self.assertEqual(self.entries(), [])
+
+    def testCommandLine(self):
+        def run(*options):
+            return subprocess.run(
+                ["python3", "lox.py", *options, "./test_programs/hello_world.lox"],
+                capture_output=True,
+                text=True,
+            ).stdout
+
+        cacheDir = f"--cache-dir={self.directory.name}"
+        self.assertEqual(run("--no-cache", cacheDir), "hello world\n")
+        self.assertEqual(self.entries(), [])
+        self.assertEqual(run(cacheDir), "hello world\n")
+        self.assertEqual(len(self.entries()), 1)
+        self.assertEqual(run(cacheDir), "hello world\n")
@@ -0,0 +1,91 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+
+from closures import ClosureCompiler
+from parser import Parse
+from resolver import Resolver
+from util import RuntimeException
+
+
+def getOutput(program):
+    stmts = Parse(program)
+    compiler = ClosureCompiler()
+    Resolver(compiler).resolve(stmts)
+    out = io.StringIO()
+    with redirect_stdout(out):
+        compiler.interpret(stmts)
+    return out.getvalue().splitlines()
+
+
+class TestClosureCompiler(unittest.TestCase):
+    def testOperators(self):
+        program = """
+        print 1 + 2 * 3;
+        print "potato " + 3;
+        print 5 > 3 ? "yes" : "no";
+        print nil or 2;
+        print 2 and false;
+        print !nil;
+        print -(-4);
+        """
+        self.assertEqual(
+            getOutput(program), ["7.0", "potato 3.0", "yes", "2.0", "False", "True", "4.0"]
+        )
+        with self.assertRaises(RuntimeException):
+            getOutput("print 4/0;")
+        with self.assertRaises(RuntimeException):
+            getOutput('print 2 * "potato";')
+
+    def testFunctions(self):
+        program = """
+        fun fib(n) {
+            if (n <= 2) return 1;
+            return fib(n - 1) + fib(n - 2);
+        }
+        fun makeCounter() {
+            var i = 0;
+            return fun () { i = i + 1; return i; };
+        }
+        var counter = makeCounter();
+        counter();
+        print counter();
+        print fib(10);
+        """
+        self.assertEqual(getOutput(program), ["2.0", "55.0"])
+
+    def testLoops(self):
+        program = """
+        var total = 0;
+        for (var i = 0; i < 10; i = i + 1) {
+            if (i == 4) break;
+            total = total + i;
+        }
+        print total;
+        """
+        self.assertEqual(getOutput(program), ["6.0"])
+
+    def testClasses(self):
+        program = """
+        class Donut {
+            init(filling) { this.filling = filling; }
+            cook() { return "fry until golden brown"; }
+        }
+        class CreamDonut < Donut {
+            init() { super.init("cream"); }
+            cook() { return super.cook() + " add " + this.filling; }
+        }
+        print CreamDonut().cook();
+        print CreamDonut;
+        """
+        self.assertEqual(
+            getOutput(program), ["fry until golden brown add cream", "CreamDonut"]
+        )
+
+    def testTailCalls(self):
+        program = """
+        fun even(n) { if (n == 0) return true; return odd(n - 1); }
+        fun odd(n) { if (n == 0) return false; return even(n - 1); }
+        print even(100001);
+        """
+        self.assertEqual(getOutput(program), ["False"])
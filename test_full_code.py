@@ -1,6 +1,10 @@
+import os
 import subprocess
+import tempfile
 import unittest
 
+from lox import ENGINES
+
 CASES = {
     "for": (
         """0.0
@@ -43,16 +47,103 @@ True
         "",
     ),
     "hello_world": ("hello world\n", ""),
+    "function_values": (
+        """<fn global>
+<fn inner>
+<fn lambda>
+<fn method>
+A
+<native fn>
+<fn global><native fn>
+""",
+        "",
+    ),
 }
 
 
+def setUpModule():
+    # the programs cache their compiles here rather than in ~/.cache/plox
+    global CACHE
+    CACHE = tempfile.TemporaryDirectory()
+
+
+def tearDownModule():
+    CACHE.cleanup()
+
+
+def runProgram(filename, engine="tree", *options):
+    return subprocess.run(
+        ["python3", "lox.py", f"--engine={engine}", *options, filename],
+        capture_output=True,
+        text=True,
+        env=dict(os.environ, XDG_CACHE_HOME=CACHE.name),
+    )
+
+
+def errorMessage(stderr: str) -> str:
+    """The error a program died of, the last line of its traceback"""
+    lines = stderr.splitlines()
+    return lines[-1] if lines else ""
+
+
 class TestPrograms(unittest.TestCase):
     def testPrograms(self):
         for filename, (out, err) in CASES.items():
-            output = subprocess.run(
-                f"python3 lox.py ./test_programs/{filename}.lox".split(" "),
-                capture_output=True,
-                text=True,
-            )
+            output = runProgram(f"./test_programs/{filename}.lox")
             self.assertEqual(str(output.stdout), out, f'program: {filename}')
             self.assertIn(err, str(output.stderr))
+
+    def testEngines(self):
+        """Every engine prints, fails and exits exactly like the tree-walker."""
+        for filename in sorted(os.listdir("test_programs")):
+            path = f"./test_programs/{filename}"
+            reference = runProgram(path)
+            for engine in ENGINES:
+                output = runProgram(path, engine)
+                message = f"program: {filename}, engine: {engine}"
+                self.assertEqual(output.stdout, reference.stdout, message)
+                self.assertEqual(
+                    errorMessage(output.stderr), errorMessage(reference.stderr), message
+                )
+                self.assertEqual(output.returncode, reference.returncode, message)
+
+    def testOptimized(self):
+        """-O1 does not change what any program prints."""
+        for filename in sorted(os.listdir("test_programs")):
+            path = f"./test_programs/{filename}"
+            reference = runProgram(path)
+            output = runProgram(path, "tree", "-O1")
+            self.assertEqual(output.stdout, reference.stdout, f"program: {filename}")
+            self.assertIn("-O1: eliminated", output.stderr)
+
+    def testMaxCallDepth(self):
+        path = "./test_programs/hello_world.lox"
+        output = runProgram(path, "vm", "--max-call-depth=10")
+        self.assertEqual(output.stdout, "hello world\n")
+        for engine, depth in [("tree", 10), ("python", 10), ("vm", 0)]:
+            output = runProgram(path, engine, f"--max-call-depth={depth}")
+            self.assertEqual(output.returncode, 2)
+            self.assertIn("--max-call-depth", output.stderr)
+
+    def testTimings(self):
+        path = "./test_programs/hello_world.lox"
+        output = runProgram(path, "tree", "--timings", "--no-cache")
+        self.assertEqual(output.stdout, "hello world\n")
+        phases = [line.split()[0] for line in output.stderr.splitlines()]
+        self.assertEqual(phases[0], "phase")
+        for phase in ["import", "scan", "parse", "resolve", "execute", "total"]:
+            self.assertIn(phase, phases)
+
+    def testLazyImports(self):
+        """A tree run imports neither the other engines nor tooling."""
+        check = (
+            "import sys, lox;"
+            "lox.main(['--no-cache', 'test_programs/hello_world.lox']);"
+            "print(sorted({'closures', 'vm', 'transpiler', 'optimizer', 'printer',"
+            " 'server', 'logging', 'pickle', 'hashlib', 'profiler', 'sampler',"
+            " 'signal'} & set(sys.modules)))"
+        )
+        output = subprocess.run(
+            ["python3", "-c", check], capture_output=True, text=True
+        )
+        self.assertEqual(output.stdout, "hello world\n[]\n")
@@ -2,6 +2,7 @@ import unittest
 from interpreter import Interpreter
 from parser import Parse
 from resolver import Resolver
+from util import RuntimeException
 
 
 def getLines(program):
@@ -119,3 +120,272 @@ class TestInterpreter(unittest.TestCase):
         self.assertEqual(
             getLines(program)[-1], "fry until golden brown\n add cream obviously"
         )
+
+    def testResolvedSlots(self):
+        program = """
+        var total = 0;
+        {
+            var a = 1;
+            var b = 2;
+            fun add() { return a + b; }
+            total = add();
+        }
+        total;
+        """
+        stmts = Parse(program)
+        Resolver(Interpreter()).resolve(stmts)
+        block = stmts[1]
+        self.assertEqual(block.size, 3)
+        add = block.statements[2]
+        self.assertEqual(add.slot, 2)
+        read = add.body[0].expression
+        self.assertEqual((read.left.depth, read.left.slot), (1, 0))
+        self.assertEqual((read.right.depth, read.right.slot), (1, 1))
+        self.assertIsNone(block.statements[3].expression.depth)
+        self.assertEqual(getLines(program)[-1], 3.0)
+
+        with self.assertRaises(RuntimeException):
+            getLines("{ var a = 1; var a = 2; }")
+        with self.assertRaises(RuntimeException):
+            getLines("{ var a = a; }")
+
+    def testGlobalTable(self):
+        stmts = Parse("var a = 1; fun f() { return a; } a = 2;")
+        inpr = Interpreter()
+        Resolver(inpr).resolve(stmts)
+        index = inpr.globals.index("a")
+        self.assertIsNone(stmts[0].depth)
+        self.assertEqual(stmts[0].slot, index)
+        self.assertEqual(stmts[1].body[0].expression.slot, index)
+        self.assertEqual(stmts[2].expression.slot, index)
+        for stmt in stmts:
+            stmt.visit(inpr)
+        self.assertEqual(inpr.globals.get(index), 2.0)
+
+        with self.assertRaises(RuntimeException):
+            getLines("var a; a;")
+        with self.assertRaises(RuntimeException):
+            getLines("b;")
+        with self.assertRaises(RuntimeException):
+            getLines("b = 1;")
+        with self.assertRaises(RuntimeException):
+            getLines("var a = 1; var a = 2;")
+
+    def testShapes(self):
+        program = """
+        class Point { init(x, y) { this.x = x; this.y = y; } }
+        var a = Point(1, 2);
+        var b = Point(3, 4);
+        var c = Point(5, 6);
+        c.z = 7;
+        a;
+        b;
+        c;
+        """
+        a, b, c = getLines(program)[-3:]
+        self.assertIs(a.shape, b.shape)
+        self.assertIsNot(a.shape, c.shape)
+        self.assertEqual(a.shape.slots, {"x": 0, "y": 1})
+        self.assertEqual(c.fields, {"x": 5.0, "y": 6.0, "z": 7.0})
+
+    def testPropertyCache(self):
+        program = """
+        class A { init() { this.a = 1; } name() { return "A"; } }
+        class B { init() { this.b = 2; this.a = 3; } name() { return "B"; } }
+        fun read(o) { return o.a; }
+        fun name(o) { return o.name(); }
+        read(A()) + read(B()) + read(A());
+        name(A()) + name(B());
+        """
+        stmts = Parse(program)
+        inpr = Interpreter()
+        Resolver(inpr).resolve(stmts)
+        lines = [stmt.visit(inpr) for stmt in stmts]
+        self.assertEqual(lines[-2:], [5.0, "AB"])
+
+        cache = stmts[2].body[0].expression.cache
+        self.assertEqual((cache.slot, len(cache.entries)), (0, 1))
+        self.assertEqual(list(cache.entries.values()), [1])
+
+    def testMethodInvocation(self):
+        program = """
+        class Counter {
+            init() { this.n = 0; }
+            inc(by) { this.n = this.n + by; return this; }
+        }
+        fun double(x) { return x * 2; }
+        var c = Counter();
+        c.inc(1).inc(2);
+        var inc = c.inc;
+        inc(3);
+        c.double = double;
+        c.double(c.n);
+        """
+        lines = getLines(program)
+        self.assertEqual(lines[-1], 12.0)
+        self.assertEqual(lines[-5].klass.name, "Counter")
+
+        with self.assertRaises(RuntimeException):
+            getLines(program + "c.inc();")
+
+    def testFlattenedMethods(self):
+        program = """
+        class A { init(x) { this.x = x; } get() { return this.x; } }
+        class B < A { get() { return super.get() + 1; } }
+        class C < B { init(x) { super.init(x * 2); } }
+        C(2).get();
+        fun make(base) { class D < base { who() { return super.get(); } } return D; }
+        class E { get() { return "E"; } }
+        make(C)(1).who() + make(A)(5).who();
+        make(E)().who();
+        A;
+        C;
+        """
+        lines = getLines(program)
+        self.assertEqual(lines[3], 5.0)
+        self.assertEqual(lines[6:8], [8.0, "E"])
+        a, c = lines[8:]
+        self.assertIs(c.table["get"], c.superclass.methods["get"])
+        self.assertIs(c.table["init"], c.methods["init"])
+        self.assertIs(c.initializer, c.methods["init"])
+        self.assertEqual((a.arity(), c.arity()), (1, 1))
+
+    def testCompletions(self):
+        program = """
+        fun firstOver(limit) {
+            for (var i = 0; ; i = i + 1) {
+                { if (i > limit) return i; }
+            }
+        }
+        fun noValue() { return; }
+        var n = 0;
+        while (true) { n = n + 1; if (n == 3) break; }
+        firstOver(4);
+        noValue();
+        n;
+        """
+        self.assertEqual(getLines(program)[-3:], [5.0, None, 3.0])
+
+        with self.assertRaises(RuntimeException):
+            getLines("break;")
+        with self.assertRaises(RuntimeException):
+            getLines("while (true) { fun f() { break; } }")
+
+    def testTailCalls(self):
+        program = """
+        fun count(n, total) {
+            if (n == 0) return total;
+            return count(n - 1, total + 1);
+        }
+        class Walker {
+            init() { this.steps = 0; }
+            walk(n) {
+                if (n == 0) return this.steps;
+                this.steps = this.steps + 1;
+                return this.walk(n - 1);
+            }
+        }
+        fun fib(n) {
+            if (n < 2) return n;
+            return fib(n - 1) + fib(n - 2);
+        }
+        fun make() { return Walker(); }
+        count(100000, 0);
+        Walker().walk(100000);
+        fib(10);
+        make().steps;
+        """
+        self.assertEqual(getLines(program)[-4:], [100000.0, 100000.0, 55.0, 0.0])
+
+        stmts = Parse("fun f() { return f(); } fun g() { return 1 + g(); }")
+        Resolver(Interpreter()).resolve(stmts)
+        self.assertTrue(stmts[0].body[0].tail)
+        self.assertFalse(stmts[1].body[0].tail)
+
+    def testQuickening(self):
+        program = """
+        fun add(a, b) { return a + b; }
+        fun either(a, b) { return a or b; }
+        add(1, 2);
+        add(3, 4);
+        add("a", 5);
+        add("b", 6);
+        either(false, 1);
+        either(nil, 2);
+        """
+        stmts = Parse(program)
+        inpr = Interpreter()
+        Resolver(inpr).resolve(stmts)
+        plus = stmts[0].body[0].expression
+        logical = stmts[1].body[0].expression
+        results = [stmt.visit(inpr) for stmt in stmts]
+
+        self.assertEqual(results[2:], [3.0, 7.0, "a5.0", "b6.0", 1.0, 2.0])
+        # specialized on floats, then de-optimized by the string
+        self.assertIs(plus.quick, False)
+        self.assertIs(logical.quick, False)
+
+        stmts = Parse("var i = 0; while (i < 3) i = i + 1; -i;")
+        Resolver(inpr).resolve(stmts)
+        self.assertEqual([stmt.visit(inpr) for stmt in stmts][-1], -3.0)
+        self.assertEqual(stmts[1].condition.quick[:2], (float, float))
+        self.assertEqual(stmts[2].expression.quick[0], float)
+
+        with self.assertRaises(RuntimeException):
+            getLines("fun neg(a) { return -a; } neg(1); neg(nil);")
+
+    def testStringBuilding(self):
+        program = """
+        var s = "";
+        for (var i = 0; i < 100; i = i + 1) { s = s + "line " + i + ";"; }
+        var t = join(s, nil);
+        s == t;
+        t;
+        """
+        lines = getLines(program)
+        expected = "".join(f"line {float(i)};" for i in range(100))
+        self.assertFalse(lines[-2])
+        self.assertEqual(str(lines[-1]), expected + "None")
+
+    def testLazyParsing(self):
+        program = """
+        var base = 10;
+        fun unused() { this is not even valid; }
+        fun outer(a) {
+            var local = 1;
+            fun inner(b) { return a + b + local + base; }
+            return inner;
+        }
+        class Counter {
+            init(start) { this.count = start; }
+            next() { this.count = this.count + 1; return this.count; }
+        }
+        fun loop(n) { if (n == 0) return "done"; return loop(n - 1); }
+        outer(1)(2);
+        Counter(5).next();
+        loop(3);
+        """
+        stmts = Parse(program, lazy=True)
+        inpr = Interpreter()
+        Resolver(inpr).resolve(stmts)
+        unused, outer, counter, loop = stmts[1:5]
+        self.assertEqual(outer.body, [])
+        results = [stmt.visit(inpr) for stmt in stmts]
+
+        self.assertEqual(results[5:], [14.0, 6.0, "done"])
+        self.assertIsNotNone(unused.lazy)
+        self.assertIsNone(outer.lazy)
+        self.assertEqual(outer.size, 3)
+        # nested functions are lazy too, until they are called
+        self.assertIsNone(outer.body[1].lazy)
+        self.assertEqual([method.lazy for method in counter.methods], [None, None])
+        self.assertTrue(loop.body[1].tail)
+
+        # names declared after a function still resolve as they would have
+        # when it was declared
+        program = "{ fun f() { return g(); } fun g() { return 1; } f(); }"
+        stmts = Parse(program, lazy=True)
+        inpr = Interpreter()
+        Resolver(inpr).resolve(stmts)
+        with self.assertRaisesRegex(RuntimeException, "undefined variable: g"):
+            stmts[0].visit(inpr)
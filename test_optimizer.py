@@ -0,0 +1,109 @@
+import unittest
+
+from expr import Binary, Literal
+from interpreter import Interpreter
+from optimizer import optimize
+from parser import Parse
+from resolver import Resolver
+from stmt import Block, Print, WhileStmt
+
+
+def getOptimized(program):
+    return optimize(Parse(program))
+
+
+class TestOptimizer(unittest.TestCase):
+    def testConstantFolding(self):
+        program = """
+        (1 + 2) * -3;
+        "a" + 1 + "b";
+        !nil;
+        1 == true;
+        4 < 2 ? "yes" : "no";
+        """
+        stmts, eliminated = getOptimized(program)
+        self.assertEqual(
+            [stmt.expression for stmt in stmts],
+            [Literal(-9.0), Literal("a1.0b"), Literal(True), Literal(True), Literal("no")],
+        )
+        self.assertEqual(eliminated, 18)
+
+    def testErrorsAreLeftForRuntime(self):
+        stmts, eliminated = getOptimized('1 / 0; 2 * "potato"; 1 + nil; -"x";')
+        self.assertEqual(eliminated, 0)
+        self.assertIs(type(stmts[0].expression), Binary)
+
+    def testLogical(self):
+        stmts, _ = getOptimized("nil or a; 2 or a; false and a; 1 and a;")
+        values = [stmt.expression for stmt in stmts]
+        self.assertEqual(values[1], Literal(2.0))
+        self.assertEqual(values[2], Literal(False))
+        self.assertEqual(values[0].name.lexeme, "a")
+        self.assertEqual(values[3].name.lexeme, "a")
+
+    def testDeadCode(self):
+        program = """
+        if (true) print 1; else print 2;
+        if (nil) print 3;
+        while (false) print 4;
+        fun f() { return 1; print 5; }
+        while (true) { break; print 6; }
+        """
+        stmts, _ = getOptimized(program)
+        self.assertEqual(len(stmts), 3)
+        self.assertEqual(stmts[0], Print(Literal(1.0)))
+        self.assertEqual(len(stmts[1].body), 1)
+        self.assertIs(type(stmts[2]), WhileStmt)
+        self.assertEqual(len(stmts[2].body.statements), 1)
+
+        stmts, _ = getOptimized("while (x) if (false) print 1;")
+        self.assertEqual(stmts[0].body, Block([]))
+
+
+class TestDeepNesting(unittest.TestCase):
+    """-O1 keeps its stack on the heap, like parsing and resolving"""
+
+    DEPTH = 100_000
+
+    def optimize(self, text):
+        program, eliminated = getOptimized(text)
+        Resolver(Interpreter()).resolve(program)
+        return program, eliminated
+
+    def testParentheses(self):
+        program, eliminated = self.optimize(
+            "{ var a = 1; print " + "(" * self.DEPTH + "a" + ")" * self.DEPTH + "; }"
+        )
+        self.assertEqual(eliminated, self.DEPTH)
+        node = program[0].statements[1].expression
+        self.assertEqual((node.name.lexeme, node.depth, node.slot), ("a", 0, 0))
+
+    def testUnary(self):
+        program, _ = self.optimize("-" * self.DEPTH + "1;")
+        self.assertEqual(program[0].expression, Literal(1.0))
+        program, eliminated = self.optimize("var a;" + "-" * self.DEPTH + "a;")
+        self.assertEqual(eliminated, 0)
+
+    def testBinaryChain(self):
+        program, _ = self.optimize("{ var a = 1; a" + " + -1" * self.DEPTH + "; }")
+        node = program[0].statements[1].expression
+        for _ in range(self.DEPTH):
+            self.assertEqual(node.right, Literal(-1.0))
+            node = node.left
+        self.assertEqual((node.depth, node.slot), (0, 0))
+
+    def testElseIfChain(self):
+        program, _ = self.optimize(
+            "var a = 1;" + "if (a) a; else " * self.DEPTH + "print a;"
+        )
+        node = program[1]
+        for _ in range(self.DEPTH):
+            node = node.elseBranch
+        self.assertEqual(node.expression.name.lexeme, "a")
+
+    def testBlocks(self):
+        program, _ = self.optimize("{" * self.DEPTH + "var a = 1;" + "}" * self.DEPTH)
+        node = program[0]
+        for _ in range(self.DEPTH - 1):
+            node = node.statements[0]
+        self.assertEqual(node.size, 1)
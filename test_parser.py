@@ -3,8 +3,11 @@ import parser
 
 from expr import *
 from tokens import *
+from scanner import CompactScanner, RegexScanner
 
+from interpreter import Interpreter
 from printer import PolishNotation, ExprPrinter
+from resolver import Resolver
 
 
 def parse(text):
@@ -229,3 +232,99 @@ class TestFunction(unittest.TestCase):
             PolishNotation("RandoFunction(123, 34, x+y);"),
             "(call (var RandoFunction) (args 123.0, 34.0, '(+ (var x) (var y))')",
         )
+
+
+class TestTokenStore(unittest.TestCase):
+    def testParsesStore(self):
+        with open("test_programs/closures.lox") as contents:
+            source = contents.read()
+        self.assertEqual(
+            parser.Parse(source, CompactScanner), parser.Parse(source, RegexScanner)
+        )
+
+
+class TestPratt(unittest.TestCase):
+    def parseBoth(self, text):
+        out = []
+        for parse in (parser.assignment, parser.expression):
+            ti = parser.TokenIter(RegexScanner(text).scanTokens())
+            try:
+                out.append((parse(ti), ti.current))
+            except Exception as e:
+                out.append(str(e))
+        return out
+
+    def testSameNodes(self):
+        for text in [
+            "a + b * c - -d / e % f",
+            "x < y == y >= z and !done or other",
+            "a = b.c = d ? e : f",
+            "p ? q : r and s ? t : u",
+            "first().second.third(1, (2), fun (x) { return x; })",
+            "super.method(this)",
+            "f = fun () {} + 1",
+            '"str" != nil',
+        ]:
+            descent, pratt = self.parseBoth(text)
+            self.assertEqual(pratt, descent, text)
+
+    def testSameErrors(self):
+        for text in ["a + b = c", "a ? b : c ? d : e", "a ? b or c : d", "1 +", "x.1"]:
+            descent, pratt = self.parseBoth(text)
+            self.assertEqual(pratt, descent, text)
+
+
+class TestDeepNesting(unittest.TestCase):
+    """Parsing, resolving and printing keep their stack on the heap"""
+
+    DEPTH = 100_000
+
+    def resolve(self, text):
+        program = parser.Parse(text)
+        Resolver(Interpreter()).resolve(program)
+        return program
+
+    def testParentheses(self):
+        program = self.resolve(
+            "{ var a = 1; print " + "(" * self.DEPTH + "a" + ")" * self.DEPTH + "; }"
+        )
+        node = program[0].statements[1].expression
+        for _ in range(self.DEPTH):
+            node = node.expr
+        self.assertEqual((node.depth, node.slot), (0, 0))
+
+    def testUnary(self):
+        program = self.resolve("-" * self.DEPTH + "1;")
+        printed = program[0].visit(ExprPrinter())
+        self.assertEqual(printed, "(- " * self.DEPTH + "1.0" + ")" * self.DEPTH)
+
+    def testBinaryChain(self):
+        program = self.resolve("{ var a = 1; a" + " + a" * self.DEPTH + "; }")
+        node = program[0].statements[1].expression
+        for _ in range(self.DEPTH):
+            self.assertEqual((node.right.depth, node.right.slot), (0, 0))
+            node = node.left
+        self.assertEqual(node.name.lexeme, "a")
+
+    def testAssignmentChain(self):
+        program = self.resolve("var a;" + "a = " * self.DEPTH + "1;")
+        node = program[1].expression
+        for _ in range(self.DEPTH):
+            node = node.value
+        self.assertEqual(node.value, 1.0)
+
+    def testElseIfChain(self):
+        program = self.resolve(
+            "var a = 1;" + "if (a) a; else " * self.DEPTH + "print a;"
+        )
+        node = program[1]
+        for _ in range(self.DEPTH):
+            node = node.elseBranch
+        self.assertEqual(node.expression.name.lexeme, "a")
+
+    def testBlocks(self):
+        program = self.resolve("{" * self.DEPTH + "var a = 1;" + "}" * self.DEPTH)
+        node = program[0]
+        for _ in range(self.DEPTH - 1):
+            node = node.statements[0]
+        self.assertEqual(node.size, 1)
@@ -0,0 +1,110 @@
+import io
+import os
+import subprocess
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from interpreter import ClockFn, LoxClass, LoxFunction
+from lox import run
+from profiler import Profiler
+
+SOURCE = """
+fun fib(n) { if (n < 2) return n; return fib(n - 1) + fib(n - 2); }
+fun loop(n) { if (n == 0) return 0; return loop(n - 1); }
+class A { init(x) { this.x = x; } get() { return this.x; } }
+class B < A { init(x) { super.init(x); } }
+var square = fun (x) { return x * x; };
+clock();
+print fib(10) + loop(50) + B(1).get() + square(2);
+"""
+
+
+def profile(source, engine="tree"):
+    profiler = Profiler()
+    output = io.StringIO()
+    with redirect_stdout(output):
+        run(source, engine, profiler=profiler)
+    return profiler, output.getvalue()
+
+
+class TestProfiler(unittest.TestCase):
+    def testCalls(self):
+        for engine in ["tree", "closure"]:
+            profiler, output = profile(SOURCE, engine)
+            self.assertEqual(output, "60.0\n")
+            calls = {name: stats[0] for name, stats in profiler.functions.items()}
+            self.assertEqual(
+                calls,
+                {
+                    "<script>": 1,
+                    "fib:2": 177,
+                    # tail calls replace the frame of their caller
+                    "loop:3": 51,
+                    "B": 1,
+                    "init:5": 1,
+                    "init:4": 1,
+                    "get:4": 1,
+                    "<lambda>:6": 1,
+                    "<native clock>": 1,
+                },
+            )
+
+    def testTimes(self):
+        profiler, _ = profile(SOURCE)
+        [_, total, _] = profiler.functions["<script>"]
+        exclusive = sum(stats[2] for stats in profiler.functions.values())
+        self.assertEqual(exclusive, total)
+        for calls, inclusive, exclusive in profiler.functions.values():
+            self.assertLessEqual(exclusive, inclusive)
+        self.assertEqual(sum(profiler.stacks.values()), total)
+        self.assertIn(("<script>", "B", "init:5", "init:4"), profiler.stacks)
+        self.assertIn(("<script>", "loop:3"), profiler.stacks)
+        self.assertNotIn(("<script>", "loop:3", "loop:3"), profiler.stacks)
+
+    def testReport(self):
+        profiler, _ = profile(SOURCE)
+        report = io.StringIO()
+        profiler.report(report)
+        lines = report.getvalue().splitlines()
+        header = ["calls", "total", "ms", "self", "ms", "function"]
+        self.assertEqual(lines[0].split(), header)
+        self.assertEqual(len(lines), 1 + len(profiler.functions))
+
+        collapsed = io.StringIO()
+        profiler.writeCollapsed(collapsed)
+        for line in collapsed.getvalue().splitlines():
+            stack, microseconds = line.rsplit(" ", 1)
+            self.assertTrue(stack.startswith("<script>"))
+            self.assertGreater(int(microseconds), 0)
+
+    def testRestoresCalls(self):
+        originals = [LoxFunction.call, LoxFunction.invoke, LoxClass.call, ClockFn.call]
+        with self.assertRaises(Exception):
+            profile("fun f() { return undefined; } f();")
+        self.assertEqual(
+            [LoxFunction.call, LoxFunction.invoke, LoxClass.call, ClockFn.call],
+            originals,
+        )
+
+    def testCommandLine(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "stacks.txt")
+            output = subprocess.run(
+                ["python3", "lox.py", "--no-cache", "--profile"]
+                + [f"--profile-collapsed={path}", "test_programs/hello_world.lox"],
+                capture_output=True,
+                text=True,
+            )
+            self.assertEqual(output.stdout, "hello world\n")
+            self.assertIn("<script>", output.stderr)
+            with open(path) as f:
+                self.assertTrue(f.read().startswith("<script> "))
+
+        output = subprocess.run(
+            ["python3", "lox.py", "--engine=vm", "--profile", "x.lox"],
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(output.returncode, 2)
+        self.assertIn("tree and closure engines", output.stderr)
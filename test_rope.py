@@ -0,0 +1,40 @@
+import unittest
+
+from rope import ROPE_THRESHOLD, Rope, concat, join
+
+
+class TestRope(unittest.TestCase):
+    def testConcat(self):
+        self.assertEqual(concat("a", 1.0), "a1.0")
+        self.assertIs(type(concat("a", "b")), str)
+
+        long = "x" * ROPE_THRESHOLD
+        rope = concat(long, "y")
+        self.assertIs(type(rope), Rope)
+        self.assertEqual(concat(rope, 2.0), long + "y2.0")
+        self.assertEqual(concat("<", rope), "<" + long + "y")
+
+    def testSharedPieces(self):
+        base = concat("x" * ROPE_THRESHOLD, "!")
+        first = concat(base, "first")
+        second = concat(base, "second")
+        # appending to the same rope twice must not change the first result
+        self.assertEqual(str(first), "x" * ROPE_THRESHOLD + "!first")
+        self.assertEqual(str(second), "x" * ROPE_THRESHOLD + "!second")
+        self.assertEqual(str(base), "x" * ROPE_THRESHOLD + "!")
+        self.assertIs(first.pieces, base.pieces)
+
+    def testEquality(self):
+        long = "x" * ROPE_THRESHOLD
+        rope = concat(long, "y")
+        self.assertTrue(rope == long + "y")
+        self.assertTrue(long + "y" == rope)
+        self.assertTrue(rope == concat(long, "y"))
+        self.assertTrue(rope != long)
+        self.assertFalse(rope == 1.0)
+        self.assertEqual(hash(rope), hash(long + "y"))
+
+    def testJoin(self):
+        self.assertEqual(join(None, 1.0), "None1.0")
+        self.assertEqual(join("a", True), "aTrue")
+        self.assertEqual(join(concat("x" * ROPE_THRESHOLD, ""), "z"), "x" * ROPE_THRESHOLD + "z")
@@ -0,0 +1,87 @@
+import io
+import signal
+import subprocess
+import unittest
+from contextlib import redirect_stdout
+
+from lox import run
+from parser import Parse
+from sampler import OUTSIDE, Sampler, nodeLine
+
+SOURCE = """fun spin(n) {
+  var total = 0;
+  for (var i = 0; i < n; i = i + 1) {
+    total = total + i * 2;
+  }
+  return total;
+}
+var f = fun () {
+  return spin(40000) + 1;
+};
+print f() > 0;
+"""
+
+
+class TestSampler(unittest.TestCase):
+    def testNodeLine(self):
+        spin, f, printed = Parse(SOURCE)
+        self.assertEqual(nodeLine(spin), 1)
+        self.assertEqual(nodeLine(spin.body[1]), 3)
+        self.assertEqual(nodeLine(f.value), 8)
+        self.assertEqual(nodeLine(printed), 11)
+        self.assertIsNone(nodeLine(Parse("print nil;")[0]))
+        loop = Parse("while (true) break;")[0]
+        self.assertIsNone(nodeLine(loop.body))
+
+    def testSamples(self):
+        sampler = Sampler(1000)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            run(SOURCE, sampler=sampler)
+        self.assertEqual(output.getvalue(), "True\n")
+        self.assertEqual(signal.getsignal(signal.SIGPROF), signal.SIG_DFL)
+        self.assertEqual(signal.getitimer(signal.ITIMER_PROF), (0.0, 0.0))
+
+        total = sum(sampler.lines.values())
+        self.assertGreater(total, 10)
+        # the loop is where the time goes
+        self.assertGreater(sampler.lines[3] + sampler.lines[4], total // 2)
+        self.assertLessEqual(set(sampler.lines), {OUTSIDE, 3, 4, 11})
+        self.assertIn(("<script>", "<lambda>:8", "spin:1"), sampler.stacks)
+
+        report = io.StringIO()
+        sampler.report(SOURCE, report)
+        lines = report.getvalue().splitlines()
+        self.assertEqual(lines[0], f"{total} samples at 1000 Hz")
+        self.assertTrue(any(line.endswith("total = total + i * 2;") for line in lines))
+        self.assertTrue(any(line.endswith("  spin:1") for line in lines))
+
+    def testBreak(self):
+        sampler = Sampler(5000)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            run(
+                "var n = 0; while (n < 100000) {"
+                " n = n + 1; while (true) { if (true) break; } } print n;",
+                sampler=sampler,
+            )
+        self.assertEqual(output.getvalue(), "100000.0\n")
+        self.assertGreater(sum(sampler.lines.values()), 0)
+
+    def testCommandLine(self):
+        output = subprocess.run(
+            ["python3", "lox.py", "--sample-profile=100", "--engine=vm", "x.lox"],
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(output.returncode, 2)
+        self.assertIn("only works with the tree engine", output.stderr)
+
+        output = subprocess.run(
+            ["python3", "lox.py", "--no-cache", "--sample-profile=100"]
+            + ["test_programs/hello_world.lox"],
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(output.stdout, "hello world\n")
+        self.assertIn("samples at 100 Hz", output.stderr)
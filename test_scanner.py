@@ -1,3 +1,6 @@
+import io
+import os
+from contextlib import redirect_stdout
 import unittest
 from scanner import *
 from tokens import *
@@ -93,3 +96,51 @@ class TestScanner(unittest.TestCase):
                 Token.fromTokenType(TokenType.EOF, 1),
             ],
         )
+
+
+class TestRegexScanner(unittest.TestCase):
+    def assertSameTokens(self, source):
+        self.assertListEqual(RegexScanner(source).scanTokens(), Scanner(source).scanTokens())
+
+    def testPrograms(self):
+        for filename in sorted(os.listdir("test_programs")):
+            with open(f"test_programs/{filename}") as contents:
+                self.assertSameTokens(contents.read())
+
+    def testTokens(self):
+        self.assertSameTokens("")
+        self.assertSameTokens("// only a comment\n\n")
+        self.assertSameTokens("a//b\n/ /=!=!<=>=<>==\t\r\n")
+        self.assertSameTokens('print "two\nlines" + 1.5 + 2. + .3;\nvar _x1 = nil;')
+        self.assertSameTokens("class classy { fun funny() { return this.orchid; } }")
+
+    def testErrors(self):
+        for source in ["var x = @;", 'print "no end\n\n']:
+            outputs = []
+            for scanner in (Scanner, RegexScanner):
+                out = io.StringIO()
+                with redirect_stdout(out):
+                    try:
+                        outputs.append(scanner(source).scanTokens())
+                    except IndexError:
+                        outputs.append("IndexError")
+                outputs.append(out.getvalue())
+            self.assertEqual(outputs[:2], outputs[2:])
+
+
+class TestCompactScanner(unittest.TestCase):
+    def testSameTokens(self):
+        for filename in sorted(os.listdir("test_programs")):
+            with open(f"test_programs/{filename}") as contents:
+                source = contents.read()
+            store = CompactScanner(source).scanTokens()
+            self.assertListEqual(list(store), RegexScanner(source).scanTokens())
+
+    def testLazyLexemes(self):
+        store = CompactScanner('var greeting = "hi";\nprint 1.5;').scanTokens()
+        self.assertEqual(len(store), 9)
+        self.assertEqual(store.lexeme(3), '"hi"')
+        self.assertEqual(store[3], Token(TokenType.STRING, '"hi"', "hi", 1))
+        self.assertEqual(store[6], Token(TokenType.NUMBER, "1.5", 1.5, 2))
+        self.assertEqual(store[-1], Token(TokenType.EOF, "", None, 2))
+        self.assertEqual(store.kinds[0], TokenType.VAR.kind)
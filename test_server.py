@@ -0,0 +1,119 @@
+import io
+import os
+import signal
+import socket
+import stat
+import subprocess
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stderr
+from unittest import mock
+
+import server
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.socket = os.path.join(self.directory.name, "plox.sock")
+        # compiles are cached in the test directory, not ~/.cache/plox
+        self.env = dict(os.environ, XDG_CACHE_HOME=self.directory.name)
+        self.server = subprocess.Popen(
+            ["python3", "lox.py", "--server", f"--socket={self.socket}"],
+            stderr=subprocess.PIPE,
+            text=True,
+            env=self.env,
+        )
+        # the server prints once it listens
+        self.assertIn("serving on", self.server.stderr.readline())
+
+    def tearDown(self):
+        self.server.send_signal(signal.SIGINT)
+        self.server.wait(10)
+        self.server.stderr.close()
+        self.assertFalse(os.path.exists(self.socket))
+        self.directory.cleanup()
+
+    def script(self, name, source):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w") as f:
+            f.write(source)
+        return path
+
+    def client(self, *args, entry="server.py"):
+        return subprocess.run(
+            ["python3", entry, "--client", f"--socket={self.socket}", *args],
+            capture_output=True,
+            text=True,
+        )
+
+    def testRunsScripts(self):
+        hello = self.client("./test_programs/hello_world.lox")
+        self.assertEqual((hello.stdout, hello.returncode), ("hello world\n", 0))
+
+        # lox.py --client goes through the same server
+        path = "./test_programs/for.lox"
+        direct = subprocess.run(
+            ["python3", "lox.py", path], capture_output=True, env=self.env
+        )
+        for engine in ["tree", "vm"]:
+            output = self.client(f"--engine={engine}", path, entry="lox.py")
+            self.assertEqual(output.stdout, direct.stdout.decode())
+
+    def testFreshGlobals(self):
+        first = self.script("first.lox", "var leaked = 1; print leaked;")
+        second = self.script("second.lox", "print leaked;")
+        self.assertEqual(self.client(first).stdout, "1.0\n")
+        output = self.client(second)
+        self.assertEqual(output.returncode, 1)
+        self.assertIn("undefined variable: leaked", output.stderr)
+
+    def testExitStatus(self):
+        output = self.client("--engine=bogus", "x.lox")
+        self.assertEqual(output.returncode, 2)
+        self.assertIn("invalid choice", output.stderr)
+
+        output = self.client("--socket=/nonexistent/plox.sock", "x.lox")
+        self.assertEqual(output.returncode, 1)
+        self.assertIn("no server", output.stderr)
+
+    def testInterrupt(self):
+        loop = self.script("loop.lox", "while (true) {}")
+        client = subprocess.Popen(
+            ["python3", "server.py", "--client", f"--socket={self.socket}", loop],
+            stderr=subprocess.PIPE,
+        )
+        time.sleep(0.5)
+        client.send_signal(signal.SIGINT)
+        self.assertEqual(client.wait(10), 130)
+        self.assertIn(b"KeyboardInterrupt", client.stderr.read())
+        client.stderr.close()
+
+    def testPrivateSocket(self):
+        mode = os.stat(self.socket).st_mode
+        self.assertEqual(stat.S_IMODE(mode), 0o600)
+
+        # a client never sends its streams to another user's server
+        stderr = io.StringIO()
+        with mock.patch("os.getuid", return_value=os.getuid() + 1):
+            with redirect_stderr(stderr):
+                self.assertEqual(server.runRemote(self.socket, ["x.lox"]), 1)
+        self.assertIn("another user's", stderr.getvalue())
+
+    def testStaleSockets(self):
+        stale = os.path.join(self.directory.name, "stale.sock")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as dead:
+            dead.bind(stale)
+        # only removed when it belongs to this user
+        with mock.patch("os.getuid", return_value=os.getuid() + 1):
+            with self.assertRaises(SystemExit):
+                server.listen(stale)
+        self.assertTrue(os.path.exists(stale))
+        server.listen(stale).close()
+        os.unlink(stale)
+
+        plain = self.script("plain.txt", "")
+        with self.assertRaises(SystemExit):
+            server.listen(plain)
+        self.assertTrue(os.path.exists(plain))
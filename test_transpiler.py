@@ -0,0 +1,128 @@
+import io
+import unittest
+import warnings
+from contextlib import redirect_stdout
+
+from interpreter import Interpreter
+from parser import Parse
+from resolver import Resolver
+from transpiler import runPython, transpile
+from util import RuntimeException
+
+
+def getOutput(program):
+    stmts = Parse(program)
+    Resolver(Interpreter()).resolve(stmts)
+    out = io.StringIO()
+    with redirect_stdout(out):
+        runPython(transpile(stmts))
+    return out.getvalue().splitlines()
+
+
+class TestTranspiler(unittest.TestCase):
+    def testOperators(self):
+        program = """
+        var a = 2;
+        print a + 2 * 3;
+        print "potato " + 3;
+        print 5 > 3 ? "yes" : "no";
+        print nil or 2;
+        print 2 and false;
+        print !nil;
+        print -(-a);
+        """
+        self.assertEqual(
+            getOutput(program), ["8.0", "potato 3.0", "yes", "2.0", "False", "True", "2.0"]
+        )
+        with self.assertRaises(RuntimeException):
+            getOutput("print 4/0;")
+        with self.assertRaises(RuntimeException):
+            getOutput('var a = "potato"; print 2 * a;')
+
+    def testGlobals(self):
+        with self.assertRaises(RuntimeException):
+            getOutput("var c; print c;")
+        with self.assertRaises(RuntimeException):
+            getOutput("print d;")
+        with self.assertRaises(RuntimeException):
+            getOutput("d = 1;")
+        with self.assertRaises(RuntimeException):
+            getOutput("var a = 1; a();")
+
+    def testClosures(self):
+        program = """
+        fun makeCounter() {
+            var i = 0;
+            return fun () { i = i + 1; return i; };
+        }
+        var counter = makeCounter();
+        counter();
+        print counter();
+
+        var first;
+        var second;
+        for (var i = 0; i < 2; i = i + 1) {
+            var j = i;
+            fun get() { j = j + 10; return j; }
+            if (i == 0) first = get; else second = get;
+        }
+        print first();
+        print second();
+        print first();
+        """
+        self.assertEqual(getOutput(program), ["2.0", "10.0", "11.0", "20.0"])
+
+    def testClasses(self):
+        program = """
+        class Donut {
+            init(filling) { this.filling = filling; }
+            cook() { return "fry until golden brown"; }
+        }
+        class CreamDonut < Donut {
+            init() { super.init("cream"); }
+            cook() { return super.cook() + " add " + this.filling; }
+        }
+        print CreamDonut().cook();
+        print CreamDonut;
+        """
+        self.assertEqual(
+            getOutput(program), ["fry until golden brown add cream", "CreamDonut"]
+        )
+
+    def testLiteralConditions(self):
+        program = """
+        if (1) print "one";
+        print !0;
+        print !"s";
+        print !(nil);
+        print 0 ? "yes" : "no";
+        while (false) print "never";
+        """
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            output = getOutput(program)
+        self.assertEqual(output, ["one", "False", "False", "True", "yes"])
+
+    def testCallErrors(self):
+        for program in [
+            "fun f(a) {} f();",
+            "fun f(a) {} f(1, 2);",
+            "class A { init(x) {} } A();",
+            "class A {} A(1);",
+            "class A { m() {} } A().m(1);",
+        ]:
+            with self.assertRaisesRegex(RuntimeException, "Wrong arity"):
+                getOutput(program)
+        with self.assertRaisesRegex(RuntimeException, "Can only call"):
+            getOutput('"potato"();')
+
+        # a TypeError that isn't a Lox call is not reported as one
+        source = "import json\ndef main():\n    json.loads(1)\n"
+        with self.assertRaises(TypeError):
+            runPython(source, "bug.lox")
+
+    def testEmitsPython(self):
+        source = transpile(Parse("var a = 1; print a + 1;"))
+        compile(source, "<test>", "exec")
+        self.assertIn("def main():", source)
+        self.assertIn("G_a = 1.0", source)
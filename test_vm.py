@@ -0,0 +1,113 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+
+from interpreter import Interpreter
+from parser import Parse
+from resolver import Resolver
+from util import RuntimeException
+from vm import VM
+
+
+def getOutput(program, **options):
+    stmts = Parse(program)
+    Resolver(Interpreter()).resolve(stmts)
+    out = io.StringIO()
+    with redirect_stdout(out):
+        VM(**options).interpret(stmts)
+    return out.getvalue().splitlines()
+
+
+class TestVM(unittest.TestCase):
+    def testArithmetic(self):
+        program = """
+        var a = 1;
+        a = a + 4;
+        print a - 1;
+        print "potato " + 3;
+        print 10 % 3 * 2 + 1;
+        """
+        self.assertEqual(getOutput(program), ["4.0", "potato 3.0", "3.0"])
+
+        with self.assertRaises(RuntimeException):
+            getOutput("print 4/0;")
+        with self.assertRaises(RuntimeException):
+            getOutput('print "tomato" > 3;')
+
+    def testGlobals(self):
+        with self.assertRaises(RuntimeException):
+            getOutput("var c; print c;")
+        with self.assertRaises(RuntimeException):
+            getOutput("print d;")
+        with self.assertRaises(RuntimeException):
+            getOutput("d = 1;")
+
+    def testClosuresCaptureEachIteration(self):
+        program = """
+        var first;
+        var second;
+        for (var i = 0; i < 2; i = i + 1) {
+            var j = i;
+            fun get() { return j; }
+            if (i == 0) first = get; else second = get;
+        }
+        print first();
+        print second();
+        """
+        self.assertEqual(getOutput(program), ["0.0", "1.0"])
+
+    def testBreakUnwindsLocals(self):
+        program = """
+        var n = 0;
+        while (true) {
+            var a = 1;
+            { var b = 2; n = n + a + b; if (n > 5) break; }
+        }
+        { var after = "ok"; print after; }
+        print n;
+        """
+        self.assertEqual(getOutput(program), ["ok", "6.0"])
+
+    def testInheritance(self):
+        program = """
+        class Donut {
+            init(filling) { this.filling = filling; }
+            cook() { return "fry until golden brown"; }
+        }
+        class CreamDonut < Donut {
+            init() { super.init("cream"); }
+            cook() { return super.cook() + " add " + this.filling; }
+        }
+        class Glazed < Donut {}
+        print CreamDonut().cook();
+        print Glazed("none").filling;
+        """
+        self.assertEqual(
+            getOutput(program), ["fry until golden brown add cream", "none"]
+        )
+
+    def testDeepRecursion(self):
+        program = """
+        fun count(n) { if (n == 0) return 0; return 1 + count(n - 1); }
+        print count(20000);
+        """
+        self.assertEqual(getOutput(program), ["20000.0"])
+
+    def testStackOverflow(self):
+        program = """
+        fun forever(n) {
+            return forever(n + 1);
+        }
+        forever(0);
+        """
+        with self.assertRaises(RuntimeException) as context:
+            getOutput(program, maxCallDepth=50)
+        self.assertEqual(
+            str(context.exception).splitlines(),
+            [
+                "Stack overflow: more than 50 nested calls",
+                "  [line 3] in forever",
+                "  ... 48 more of the above",
+                "  [line 5] in script",
+            ],
+        )
@@ -0,0 +1,58 @@
+import resource
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List
+
+
+def peakMemory() -> float:
+    """Most memory the process has held so far, in megabytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+class Timings:
+    """Wall time, CPU time and peak memory of the phases of a run.
+
+    A phase that runs more than once, like the imports of an engine done
+    when it is first used, adds to its earlier time. Peak memory is the high
+    water mark of the process when the phase last ended.
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, List[float]] = {}
+
+    def add(self, name: str, wall: float, cpu: float):
+        phase = self.phases.setdefault(name, [0.0, 0.0, 0.0])
+        phase[0] += wall
+        phase[1] += cpu
+        phase[2] = peakMemory()
+
+    @contextmanager
+    def phase(self, name: str):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall, time.process_time() - cpu)
+
+    def report(self, file=None):
+        file = file or sys.stderr
+        row = "{:<10}{:>10.1f}{:>10.1f}{:>10.1f}"
+        header = "{:<10}{:>10}{:>10}{:>10}"
+        print(header.format("phase", "wall ms", "cpu ms", "peak MB"), file=file)
+        for name, (wall, cpu, peak) in self.phases.items():
+            print(row.format(name, wall * 1e3, cpu * 1e3, peak), file=file)
+        wall = sum(phase[0] for phase in self.phases.values())
+        cpu = sum(phase[1] for phase in self.phases.values())
+        print(row.format("total", wall * 1e3, cpu * 1e3, peakMemory()), file=file)
+
+
+def timed(timings, name: str):
+    """`timings.phase(name)`, or nothing when `timings` is None"""
+    if timings is None:
+        return nullcontext()
+    return timings.phase(name)
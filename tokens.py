@@ -1,3 +1,4 @@
+from array import array
 from typing import NamedTuple
 
 from enum import Enum
@@ -52,6 +53,15 @@ class TokenType(Enum):
     EOF = ""
 
 
+# token types by integer kind, every type also knows its own as `kind`
+TOKEN_TYPES = tuple(TokenType)
+for _kind, _type in enumerate(TOKEN_TYPES):
+    _type.kind = _kind
+EOF_KIND = TokenType.EOF.kind
+NUMBER_KIND = TokenType.NUMBER.kind
+STRING_KIND = TokenType.STRING.kind
+
+
 SINGLE_CHAR_LEXEMES = {
     tp.value
     for tp in [
@@ -106,3 +116,50 @@ class Token(NamedTuple):
     @classmethod
     def fromTokenType(cls, t_type: TokenType, line: int = 1):
         return Token(t_type, t_type.value, None, line)
+
+
+class TokenStore:
+    """Tokens kept as parallel arrays over the source they were scanned from.
+
+    Each token is an integer kind, the offset and length of its lexeme in
+    `source`, and its line. Lexemes and literals are only sliced out of the
+    source when a token is indexed, which returns the same `Token` the
+    scanners put in their lists.
+    """
+
+    __slots__ = ("source", "kinds", "starts", "lengths", "lines")
+
+    def __init__(self, source: str):
+        self.source = source
+        self.kinds = array("B")
+        self.starts = array("I")
+        self.lengths = array("I")
+        self.lines = array("I")
+
+    def append(self, kind: int, start: int, length: int, line: int):
+        self.kinds.append(kind)
+        self.starts.append(start)
+        self.lengths.append(length)
+        self.lines.append(line)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def lexeme(self, index: int) -> str:
+        start = self.starts[index]
+        return self.source[start : start + self.lengths[index]]
+
+    def __getitem__(self, index: int) -> Token:
+        kind = self.kinds[index]
+        start = self.starts[index]
+        lexeme = self.source[start : start + self.lengths[index]]
+        literal = None
+        if kind == NUMBER_KIND:
+            literal = float(lexeme)
+        elif kind == STRING_KIND:
+            literal = lexeme[1:-1]
+        return Token(TOKEN_TYPES[kind], lexeme, literal, self.lines[index])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
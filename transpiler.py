@@ -0,0 +1,1060 @@
+import functools
+import math
+import re
+import time
+import types
+from typing import Dict, List, Optional, Set
+
+from environment import Undefined
+from expr import (
+    ExprVisitor,
+    Expr,
+    Literal,
+    Grouping,
+    Unary,
+    Binary,
+    Logical,
+    Variable,
+    This,
+)
+import rope
+from interpreter import LoxClass, LoxInstance, PropertyCache, plus, showFunction
+from stmt import StmtVisitor, Stmt, Function, Class, Var
+from tokens import TokenType
+from util import RuntimeException
+
+INDENT = "    "
+
+COMPARISON_OPERATORS = {
+    TokenType.LESS: "<",
+    TokenType.LESS_EQUAL: "<=",
+    TokenType.GREATER: ">",
+    TokenType.GREATER_EQUAL: ">=",
+}
+
+NUMBER_OPERATORS = {
+    TokenType.MINUS: "-",
+    TokenType.STAR: "*",
+    TokenType.MOD: "%",
+    **COMPARISON_OPERATORS,
+}
+
+BOOLEAN_OPERATORS = {
+    TokenType.EQUAL_EQUAL,
+    TokenType.BANG_EQUAL,
+    *COMPARISON_OPERATORS,
+}
+
+
+# Runtime support for generated modules. Everything below up to
+# `Transpiler` is imported by the generated source.
+
+
+class Box:
+    """Holds a captured variable declared inside a loop body.
+
+    Each loop iteration creates a fresh box, so closures created in
+    different iterations see different variables like they do in Lox.
+    """
+
+    __slots__ = ("v",)
+
+    def __init__(self, v):
+        self.v = v
+
+    def set(self, v):
+        self.v = v
+        return v
+
+
+class PyMethod:
+    __slots__ = ("fn",)
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def arity(self):
+        return self.fn.__code__.co_argcount - 1
+
+    def bind(self, instance):
+        return functools.partial(self.fn, instance)
+
+
+class PyClass(LoxClass):
+    def __call__(self, *args):
+        instance = LoxInstance(self)
+        if len(args) != self.initArity:
+            raise RuntimeException("Wrong arity for function")
+        if self.initializer is not None:
+            self.initializer.fn(instance, *args)
+        return instance
+
+
+def clock():
+    return time.time_ns()
+
+
+def join(left, right):
+    return rope.join(show(left), show(right))
+
+
+# the Lox name in the Python name of a function: `G_` globals, `L<n>_`
+# locals, `F<n>_` closures and lambdas and `M_` methods
+LOX_NAME = re.compile(r"(?:G|M|[FL]\d+)_(\w+)")
+
+
+def show(value):
+    """`value`, or what the other engines print for it when it is a function"""
+    cls = value.__class__
+    if cls is types.FunctionType:
+        if value is clock or value is join:
+            return "<native fn>"
+        return showFunction(LOX_NAME.fullmatch(value.__name__)[1])
+    if cls is functools.partial:
+        return showFunction(LOX_NAME.fullmatch(value.func.__name__)[1])
+    return value
+
+
+def numberError(left, right):
+    if type(left) is not float:
+        raise RuntimeException(f"Non-float in number operation: {show(left)}")
+    raise RuntimeException(f"Non-float in number operation: {show(right)}")
+
+
+def add(left, right):
+    if left.__class__ is float is right.__class__:
+        return left + right
+    return plus(left, right)
+
+
+def subtract(left, right):
+    if left.__class__ is float is right.__class__:
+        return left - right
+    numberError(left, right)
+
+
+def multiply(left, right):
+    if left.__class__ is float is right.__class__:
+        return left * right
+    numberError(left, right)
+
+
+def modulo(left, right):
+    if left.__class__ is float is right.__class__:
+        return left % right
+    numberError(left, right)
+
+
+def divide(left, right):
+    if left.__class__ is not float or right.__class__ is not float:
+        numberError(left, right)
+    if right == 0:
+        raise RuntimeException("divide by zero is not allowed")
+    return left / right
+
+
+def less(left, right):
+    if left.__class__ is float is right.__class__:
+        return left < right
+    numberError(left, right)
+
+
+def lessEqual(left, right):
+    if left.__class__ is float is right.__class__:
+        return left <= right
+    numberError(left, right)
+
+
+def greater(left, right):
+    if left.__class__ is float is right.__class__:
+        return left > right
+    numberError(left, right)
+
+
+def greaterEqual(left, right):
+    if left.__class__ is float is right.__class__:
+        return left >= right
+    numberError(left, right)
+
+
+def negate(value):
+    if value.__class__ is not float:
+        raise RuntimeException(f"not able to negate number {show(value)}")
+    return 0 - value
+
+
+def truthy(value):
+    return value is not None and value is not False
+
+
+def checked(value, name):
+    if value is Undefined:
+        raise RuntimeException(f"Variable initialized but not defined: {name}")
+    return value
+
+
+def undefinedVariable(name):
+    raise RuntimeException(f"Get to undefined variable: {name}")
+
+
+def undefinedAssignment(name):
+    raise RuntimeException(f"Assignment to undefined variable: {name}")
+
+
+def notCallable(*args):
+    raise RuntimeException("Can only call functions and classes")
+
+
+def redefined(name):
+    raise RuntimeException(f"Variable already defined: {name}")
+
+
+def inherit(superclass):
+    if not isinstance(superclass, PyClass):
+        raise RuntimeException("superclass must be a class")
+    return superclass
+
+
+def getProperty(obj, cache):
+    if type(obj) is not LoxInstance:
+        raise RuntimeError("Only instances can have properties")
+    if obj.shape is cache.shape:
+        return obj.values[cache.slot]
+    return cache.get(obj)
+
+
+def setProperty(obj, cache, value):
+    if type(obj) is not LoxInstance:
+        raise RuntimeError("Only instances have fields")
+    if obj.shape is cache.shape:
+        obj.values[cache.slot] = value
+    else:
+        cache.set(obj, value)
+    return value
+
+
+def superMethod(superclass, instance, name):
+    method = superclass.findMethod(name)
+    if method is None:
+        raise RuntimeException(f"undefined method: {name}")
+    return method.bind(instance)
+
+
+# Lox globals the runtime defines
+NATIVES = ["clock", "join"]
+
+RUNTIME = [
+    "Box",
+    "PyMethod",
+    "PyClass",
+    "PropertyCache",
+    "Undefined",
+    "clock",
+    "join",
+    "show",
+    "plus",
+    "numberError",
+    "add",
+    "subtract",
+    "multiply",
+    "modulo",
+    "divide",
+    "less",
+    "lessEqual",
+    "greater",
+    "greaterEqual",
+    "negate",
+    "truthy",
+    "checked",
+    "undefinedVariable",
+    "undefinedAssignment",
+    "notCallable",
+    "redefined",
+    "inherit",
+    "getProperty",
+    "setProperty",
+    "superMethod",
+]
+
+HELPERS = {
+    TokenType.PLUS: "add",
+    TokenType.MINUS: "subtract",
+    TokenType.STAR: "multiply",
+    TokenType.MOD: "modulo",
+    TokenType.LESS: "less",
+    TokenType.LESS_EQUAL: "lessEqual",
+    TokenType.GREATER: "greater",
+    TokenType.GREATER_EQUAL: "greaterEqual",
+}
+
+
+# what Python says when a function is called with the wrong number of arguments
+ARITY_ERROR = re.compile(r"positional arguments? but|missing \d+ required positional")
+
+
+def execute(main):
+    """Runs a generated `main`, reporting Python errors as Lox errors"""
+    try:
+        main()
+    except NameError as e:
+        name = e.name or ""
+        raise RuntimeException(
+            f"Get to undefined variable: {name.removeprefix('G_')}"
+        ) from None
+    except TypeError as e:
+        # only the calls of the generated code are Lox calls, a TypeError
+        # from anywhere else is a bug to report as is
+        traceback = e.__traceback__
+        while traceback.tb_next is not None:
+            traceback = traceback.tb_next
+        if not traceback.tb_frame.f_code.co_filename.startswith("<lox"):
+            raise
+        message = str(e)
+        if "not callable" in message:
+            raise RuntimeException("Can only call functions and classes") from None
+        if ARITY_ERROR.search(message):
+            raise RuntimeException("Wrong arity for function") from None
+        raise
+
+
+# Scope analysis
+
+
+class _Decl:
+    """A declared variable and the Python name the generated code uses."""
+
+    def __init__(self, name: str, pyName: str, owner, inLoop: bool = False):
+        self.name = name
+        self.pyName = pyName
+        self.owner: Optional[_FunctionInfo] = owner
+        self.inLoop = inLoop
+        self.captured = False
+        self.defined = False
+        self.uninitialized = False
+
+    @property
+    def isGlobal(self):
+        return self.owner is None
+
+    @property
+    def boxed(self):
+        return self.captured and self.inLoop
+
+
+class _FunctionInfo:
+    def __init__(self, parent):
+        self.parent: Optional[_FunctionInfo] = parent
+        self.loopDepth = 0
+        # captured declarations referenced by this function or anything
+        # nested in it
+        self.refs: Set[_Decl] = set()
+        self.nonlocals: Set[_Decl] = set()
+        self.globals: Set[str] = set()
+
+
+class _Analyzer(ExprVisitor, StmtVisitor):
+    """Resolves every variable reference of a program to a `_Decl`.
+
+    Follows the scoping rules of `Resolver` and records which locals are
+    captured by nested functions, and which are assigned from them.
+    """
+
+    def __init__(self):
+        self.script = _FunctionInfo(None)
+        self.current = self.script
+        self.scopes: List[Dict[str, _Decl]] = []
+        self.globals: Dict[str, _Decl] = {}
+        self.definedGlobals = set(NATIVES)
+        self.declared: Dict[int, _Decl] = {}
+        self.references: Dict[int, Optional[_Decl]] = {}
+        self.redefinitions: Set[int] = set()
+        self.functions: Dict[int, _FunctionInfo] = {}
+        self.classes: Dict[int, _FunctionInfo] = {}
+        self.params: Dict[int, List[str]] = {}
+        self.count = 0
+
+    def analyze(self, program: List[Stmt]):
+        # globals are looked up by name when the code runs, so a global
+        # declared anywhere at the top level is visible from every function
+        for name in NATIVES:
+            self.globals[name] = _Decl(name, f"G_{name}", None)
+        for stmt in program:
+            if isinstance(stmt, (Var, Function, Class)) and stmt.name is not None:
+                name = stmt.name.lexeme
+                self.globals[name] = _Decl(name, f"G_{name}", None)
+        for stmt in program:
+            stmt.visit(self)
+
+    def declare(self, name: str, node=None) -> _Decl:
+        if not self.scopes:
+            if name in self.definedGlobals:
+                self.redefinitions.add(id(node))
+            self.definedGlobals.add(name)
+            decl = self.globals[name]
+        else:
+            scope = self.scopes[-1]
+            if name in scope:
+                raise RuntimeException(f"Variable already defined: {name}")
+            self.count += 1
+            decl = _Decl(
+                name, f"L{self.count}_{name}", self.current, self.current.loopDepth > 0
+            )
+            scope[name] = decl
+        if node is not None:
+            self.declared[id(node)] = decl
+        return decl
+
+    def reference(self, node: Expr, name: str, assign: bool = False):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                decl = scope[name]
+                break
+        else:
+            self.references[id(node)] = self.globals.get(name)
+            if assign and name in self.globals:
+                self.current.globals.add(name)
+            return
+
+        if not decl.defined and decl.owner is self.current:
+            raise RuntimeException(
+                f"Can't read local variable in its own initializer: {name}"
+            )
+        self.references[id(node)] = decl
+        if decl.owner is not self.current:
+            decl.captured = True
+            if assign:
+                self.current.nonlocals.add(decl)
+            function = self.current
+            while function is not decl.owner:
+                function.refs.add(decl)
+                function = function.parent
+
+    def beginScope(self):
+        self.scopes.append({})
+
+    def endScope(self):
+        self.scopes.pop()
+
+    def visitBlock(self, val):
+        self.beginScope()
+        for stmt in val.statements:
+            stmt.visit(self)
+        self.endScope()
+
+    def visitVar(self, val):
+        decl = self.declare(val.name.lexeme, val)
+        if decl.isGlobal:
+            decl.uninitialized = decl.uninitialized or val.value is None
+        if val.value is not None:
+            val.value.visit(self)
+        decl.defined = True
+
+    def function(self, val: Function, method: bool = False):
+        info = _FunctionInfo(self.current)
+        self.functions[id(val)] = info
+        enclosing = self.current
+        self.current = info
+        self.beginScope()
+        if method:
+            this = self.declare("this")
+            this.pyName = "this"
+            this.defined = True
+        params = []
+        for param in val.params:
+            decl = self.declare(param.lexeme)
+            decl.defined = True
+            params.append(decl.pyName)
+        self.params[id(val)] = params
+        for stmt in val.body:
+            stmt.visit(self)
+        self.endScope()
+        self.current = enclosing
+
+    def visitFunction(self, val):
+        if val.name is not None:
+            self.declare(val.name.lexeme, val).defined = True
+        self.function(val)
+
+    def visitClass(self, val):
+        self.declare(val.name.lexeme, val).defined = True
+        if val.superclass is not None:
+            val.superclass.visit(self)
+
+        # methods are created by a factory function that receives the
+        # superclass, so `super` is a parameter of that function
+        info = _FunctionInfo(self.current)
+        self.classes[id(val)] = info
+        enclosing = self.current
+        self.current = info
+        self.beginScope()
+        if val.superclass is not None:
+            superclass = self.declare("super")
+            superclass.pyName = "superclass"
+            superclass.defined = True
+        for method in val.methods:
+            self.function(method, method=True)
+        self.endScope()
+        self.current = enclosing
+
+    def visitExpression(self, val):
+        val.expression.visit(self)
+
+    def visitPrint(self, val):
+        val.expression.visit(self)
+
+    def visitIfStmt(self, val):
+        val.condition.visit(self)
+        val.thenBranch.visit(self)
+        if val.elseBranch is not None:
+            val.elseBranch.visit(self)
+
+    def visitWhileStmt(self, val):
+        val.condition.visit(self)
+        self.current.loopDepth += 1
+        val.body.visit(self)
+        self.current.loopDepth -= 1
+
+    def visitBreakStmt(self, val):
+        if self.current.loopDepth == 0:
+            raise RuntimeException("Can't break outside of a loop")
+
+    def visitReturn(self, val):
+        if val.expression is not None:
+            val.expression.visit(self)
+
+    def visitLiteral(self, val):
+        return
+
+    def visitGrouping(self, val):
+        val.expr.visit(self)
+
+    def visitUnary(self, val):
+        val.value.visit(self)
+
+    def visitBinary(self, val):
+        val.left.visit(self)
+        val.right.visit(self)
+
+    def visitTernary(self, val):
+        val.test.visit(self)
+        val.left.visit(self)
+        val.right.visit(self)
+
+    def visitLogical(self, val):
+        val.left.visit(self)
+        val.right.visit(self)
+
+    def visitVariable(self, val):
+        self.reference(val, val.name.lexeme)
+
+    def visitAssign(self, val):
+        val.value.visit(self)
+        self.reference(val, val.name.lexeme, assign=True)
+
+    def visitCall(self, val):
+        val.callee.visit(self)
+        for arg in val.arguments:
+            arg.visit(self)
+
+    def visitGet(self, val):
+        val.obj.visit(self)
+
+    def visitSet(self, val):
+        val.obj.visit(self)
+        val.val.visit(self)
+
+    def visitThis(self, val):
+        self.reference(val, "this")
+
+    def visitSuper(self, val):
+        self.reference(val, "super")
+
+
+# Code generation
+
+
+class _Output:
+    def __init__(self, info: _FunctionInfo, indent: int = 0, kind: str = "script"):
+        self.info = info
+        self.kind = kind
+        self.lines: List[str] = []
+        self.indent = indent
+
+
+class Transpiler(ExprVisitor, StmtVisitor):
+    """Lowers a resolved program to the source of a Python module.
+
+    Lox globals become module globals named `G_<name>`, locals become
+    Python locals named `L<n>_<name>` and the top level statements run
+    inside `main()`. Runtime checks that Lox needs and Python does not do
+    (float-only arithmetic, truthiness, undefined globals) are inlined or
+    call the helpers at the top of this module.
+    """
+
+    def __init__(self):
+        self.analyzer = _Analyzer()
+        self.out: _Output = None
+        self.count = 0
+        # module level `PropertyCache`s, one per property site
+        self.caches: List[str] = []
+
+    def transpile(self, program: List[Stmt], filename: str = "<lox>") -> str:
+        analyzer = self.analyzer
+        analyzer.analyze(program)
+
+        self.out = _Output(analyzer.script, 1)
+        for stmt in program:
+            stmt.visit(self)
+        body = self.out.lines or [INDENT + "pass"]
+
+        names = sorted(
+            decl.pyName
+            for decl in analyzer.globals.values()
+            if decl.name not in NATIVES
+        )
+        header = [
+            f"# Generated by plox from {filename}",
+            "from transpiler import (",
+            *[f"{INDENT}{name}," for name in RUNTIME + ["execute"]],
+            ")",
+            "",
+            *[f"G_{name} = {name}" for name in NATIVES],
+            *self.caches,
+            "",
+            "",
+            "def main():",
+        ]
+        if names:
+            header.append(f"{INDENT}global {', '.join(names)}")
+        footer = ["", "", 'if __name__ == "__main__":', f"{INDENT}execute(main)", ""]
+        return "\n".join(header + body + footer)
+
+    # output
+
+    def emit(self, line: str):
+        self.out.lines.append(INDENT * self.out.indent + line)
+
+    def nested(self, emitBody):
+        """Emits an indented block, padding it with `pass` when empty"""
+        self.out.indent += 1
+        count = len(self.out.lines)
+        emitBody()
+        if len(self.out.lines) == count:
+            self.emit("pass")
+        self.out.indent -= 1
+
+    def temp(self) -> str:
+        self.count += 1
+        return f"T{self.count}"
+
+    def propertyCache(self, name: str) -> str:
+        cache = f"P{len(self.caches)}_{name}"
+        self.caches.append(f'{cache} = PropertyCache("{name}")')
+        return cache
+
+    def uniqueName(self, name: str) -> str:
+        self.count += 1
+        return f"F{self.count}_{name}"
+
+    def hoisted(self, evaluate):
+        """Evaluates an expression, returning it with the lines it emitted.
+
+        Lambdas are emitted as `def`s in front of the statement using them,
+        which does not work for conditions that are re-evaluated, like the
+        ones of loops and `elif`s.
+        """
+        count = len(self.out.lines)
+        text = evaluate()
+        lines = self.out.lines[count:]
+        del self.out.lines[count:]
+        return text, lines
+
+    # variables
+
+    def decl(self, node: Expr) -> Optional[_Decl]:
+        return self.analyzer.references.get(id(node))
+
+    def read(self, node: Expr, name: str) -> str:
+        decl = self.decl(node)
+        if decl is None:
+            return f'undefinedVariable("{name}")'
+        if decl.boxed:
+            return f"{decl.pyName}.v"
+        if decl.isGlobal and decl.uninitialized:
+            return f'checked({decl.pyName}, "{name}")'
+        return decl.pyName
+
+    def simple(self, node: Expr) -> bool:
+        """True for expressions that are cheap and safe to evaluate twice"""
+        if type(node) is Grouping:
+            return self.simple(node.expr)
+        if type(node) is Literal:
+            return True
+        if type(node) in {Variable, This}:
+            decl = self.decl(node)
+            return decl is not None and not decl.boxed and not decl.uninitialized
+        return False
+
+    def isBool(self, node: Expr) -> bool:
+        if type(node) is Grouping:
+            return self.isBool(node.expr)
+        if type(node) is Literal:
+            return type(node.value) is bool
+        if type(node) is Binary:
+            return node.operator.type in BOOLEAN_OPERATORS
+        if type(node) is Unary:
+            return node.operator.type == TokenType.BANG
+        if type(node) is Logical:
+            return self.isBool(node.left) and self.isBool(node.right)
+        return False
+
+    def isFloat(self, node: Expr) -> bool:
+        if type(node) is Grouping:
+            return self.isFloat(node.expr)
+        return type(node) is Literal and type(node.value) is float
+
+    def literal(self, node: Expr) -> Optional[Literal]:
+        if type(node) is Grouping:
+            return self.literal(node.expr)
+        return node if type(node) is Literal else None
+
+    def condition(self, node: Expr) -> str:
+        text = node.visit(self)
+        # folded, `1 is not None` would be a SyntaxWarning
+        literal = self.literal(node)
+        if literal is not None:
+            return repr(truthy(literal.value))
+        if self.isBool(node):
+            return text
+        if self.simple(node):
+            return f"({text} is not None and {text} is not False)"
+        t = self.temp()
+        return f"(({t} := {text}) is not None and {t} is not False)"
+
+    # statements
+
+    def visitExpression(self, val):
+        expression = val.expression
+        if type(expression).__name__ == "Assign":
+            decl = self.decl(expression)
+            value = expression.value.visit(self)
+            if decl is None:
+                self.emit(value)
+                self.emit(f'undefinedAssignment("{expression.name.lexeme}")')
+            elif decl.boxed:
+                self.emit(f"{decl.pyName}.v = {value}")
+            else:
+                self.emit(f"{decl.pyName} = {value}")
+            return
+        self.emit(expression.visit(self))
+
+    def visitPrint(self, val):
+        value = val.expression.visit(self)
+        expression = val.expression
+        if self.literal(expression) is None and not self.isBool(expression):
+            value = f"show({value})"
+        self.emit(f"print({value})")
+
+    def visitVar(self, val):
+        decl = self.analyzer.declared[id(val)]
+        if decl.boxed:
+            self.emit(f"{decl.pyName} = Box(Undefined)")
+        value = "Undefined" if val.value is None else val.value.visit(self)
+        if id(val) in self.analyzer.redefinitions:
+            self.emit(value)
+            self.emit(f'redefined("{decl.name}")')
+        elif decl.boxed:
+            self.emit(f"{decl.pyName}.v = {value}")
+        else:
+            self.emit(f"{decl.pyName} = {value}")
+
+    def visitBlock(self, val):
+        for stmt in val.statements:
+            stmt.visit(self)
+
+    def visitIfStmt(self, val, keyword="if"):
+        self.emit(f"{keyword} {self.condition(val.condition)}:")
+        self.nested(lambda: val.thenBranch.visit(self))
+        branch = val.elseBranch
+        if branch is None:
+            return
+        if type(branch).__name__ == "IfStmt":
+            condition, lines = self.hoisted(lambda: self.condition(branch.condition))
+            if not lines:
+                self.emit(f"elif {condition}:")
+                self.nested(lambda: branch.thenBranch.visit(self))
+                if branch.elseBranch is not None:
+                    self.emit("else:")
+                    self.nested(lambda: branch.elseBranch.visit(self))
+                return
+        self.emit("else:")
+        self.nested(lambda: branch.visit(self))
+
+    def visitWhileStmt(self, val):
+        condition, lines = self.hoisted(lambda: self.condition(val.condition))
+        if not lines:
+            self.emit(f"while {condition}:")
+            self.nested(lambda: val.body.visit(self))
+            return
+
+        def body():
+            condition = self.condition(val.condition)
+            self.emit(f"if not {condition}:")
+            self.emit(f"{INDENT}break")
+            val.body.visit(self)
+
+        self.emit("while True:")
+        self.nested(body)
+
+    def visitBreakStmt(self, val):
+        self.emit("break")
+
+    def visitReturn(self, val):
+        if self.out.kind == "initializer":
+            self.emit("return this")
+        elif val.expression is None:
+            self.emit("return None")
+        else:
+            self.emit(f"return {val.expression.visit(self)}")
+
+    def binds(self, info: _FunctionInfo) -> List[str]:
+        """The boxes a closure has to capture when it is created"""
+        owner = self.out.info
+        return sorted(d.pyName for d in info.refs if d.boxed and d.owner is owner)
+
+    def functionDef(self, val: Function, defName: str, kind: str):
+        info = self.analyzer.functions[id(val)]
+        params = list(self.analyzer.params[id(val)])
+        if kind in {"method", "initializer"}:
+            params.insert(0, "this")
+
+        enclosing = self.out
+        self.out = _Output(info, 1, kind)
+        for stmt in val.body:
+            stmt.visit(self)
+        if kind == "initializer":
+            self.emit("return this")
+        body = self.out.lines or [INDENT + "pass"]
+        self.out = enclosing
+
+        declarations = []
+        globalNames = sorted(f"G_{name}" for name in info.globals)
+        if globalNames:
+            declarations.append(f"{INDENT}global {', '.join(globalNames)}")
+        nonlocalNames = sorted(
+            d.pyName for d in info.nonlocals if not d.boxed and not d.isGlobal
+        )
+        if nonlocalNames:
+            declarations.append(f"{INDENT}nonlocal {', '.join(nonlocalNames)}")
+
+        self.emit(f"def {defName}({', '.join(params)}):")
+        prefix = INDENT * self.out.indent
+        for line in declarations + body:
+            self.out.lines.append(prefix + line)
+
+    def closure(self, val: Function, defName: str) -> str:
+        """Emits the `def` for `val` and returns the expression for its value"""
+        binds = self.binds(self.analyzer.functions[id(val)])
+        if not binds:
+            self.functionDef(val, defName, "function")
+            return defName
+        factory = self.uniqueName(f"make_{defName}")
+        self.emit(f"def {factory}({', '.join(binds)}):")
+        self.out.indent += 1
+        self.functionDef(val, defName, "function")
+        self.emit(f"return {defName}")
+        self.out.indent -= 1
+        return f"{factory}({', '.join(binds)})"
+
+    def visitFunction(self, val):
+        if val.name is None:
+            return self.closure(val, self.uniqueName("lambda"))
+
+        decl = self.analyzer.declared[id(val)]
+        if id(val) in self.analyzer.redefinitions:
+            self.emit(f'redefined("{decl.name}")')
+            return
+        binds = self.binds(self.analyzer.functions[id(val)])
+        if not binds and not decl.boxed:
+            self.functionDef(val, decl.pyName, "function")
+            return
+        if decl.boxed:
+            self.emit(f"{decl.pyName} = Box(None)")
+        value = self.closure(val, self.uniqueName(decl.name))
+        if decl.boxed:
+            self.emit(f"{decl.pyName}.v = {value}")
+        else:
+            self.emit(f"{decl.pyName} = {value}")
+
+    def visitClass(self, val):
+        decl = self.analyzer.declared[id(val)]
+        info = self.analyzer.classes[id(val)]
+        name = val.name.lexeme
+
+        args = self.binds(info)
+        params = list(args)
+        superclass = "None"
+        if val.superclass is not None:
+            params.insert(0, "superclass")
+            args.insert(0, f"inherit({val.superclass.visit(self)})")
+            superclass = "superclass"
+        if id(val) in self.analyzer.redefinitions:
+            self.emit(f'redefined("{name}")')
+            return
+        if decl.boxed:
+            self.emit(f"{decl.pyName} = Box(None)")
+
+        factory = self.uniqueName(f"class_{name}")
+        self.emit(f"def {factory}({', '.join(params)}):")
+        enclosing = self.out
+        self.out = _Output(info, enclosing.indent + 1)
+        self.out.lines = enclosing.lines
+        methods = []
+        for method in val.methods:
+            kind = "initializer" if method.name.lexeme == "init" else "method"
+            defName = f"M_{method.name.lexeme}"
+            self.functionDef(method, defName, kind)
+            methods.append(f'"{method.name.lexeme}": PyMethod({defName})')
+        self.emit(f'return PyClass("{name}", {{{", ".join(methods)}}}, {superclass})')
+        self.out = enclosing
+
+        value = f"{factory}({', '.join(args)})"
+        if decl.boxed:
+            self.emit(f"{decl.pyName}.v = {value}")
+        else:
+            self.emit(f"{decl.pyName} = {value}")
+
+    # expressions
+
+    def visitLiteral(self, val):
+        value = val.value
+        if type(value) is float and not math.isfinite(value):
+            return f'float("{value}")'
+        return repr(value)
+
+    def visitGrouping(self, val):
+        return val.expr.visit(self)
+
+    def visitUnary(self, val):
+        value = val.value.visit(self)
+        if val.operator.type == TokenType.BANG:
+            if self.isBool(val.value):
+                return f"(not {value})"
+            literal = self.literal(val.value)
+            if literal is not None:
+                return repr(not truthy(literal.value))
+            if self.simple(val.value):
+                return f"({value} is None or {value} is False)"
+            return f"(not truthy({value}))"
+        if val.operator.type == TokenType.MINUS:
+            if self.simple(val.value):
+                return f"(0 - {value} if {value}.__class__ is float else negate({value}))"
+            return f"negate({value})"
+        raise RuntimeException(f"invalid unary: {val.operator} {val.value}")
+
+    def visitBinary(self, val):
+        operatorType = val.operator.type
+        left = val.left.visit(self)
+        right = val.right.visit(self)
+
+        if operatorType == TokenType.COMMA:
+            return f"({left}, {right})[1]"
+        if operatorType == TokenType.EQUAL_EQUAL:
+            return f"({left} == {right})"
+        if operatorType == TokenType.BANG_EQUAL:
+            return f"({left} != {right})"
+        if operatorType == TokenType.SLASH:
+            return f"divide({left}, {right})"
+        if operatorType not in HELPERS:
+            raise RuntimeException(f"Binary operation not implemented: {val.operator}")
+
+        helper = HELPERS[operatorType]
+        if not self.simple(val.right):
+            return f"{helper}({left}, {right})"
+        symbol = "+" if operatorType == TokenType.PLUS else NUMBER_OPERATORS[operatorType]
+        fallback = "plus" if operatorType == TokenType.PLUS else "numberError"
+
+        # the guard evaluates the left operand first, so only the right one
+        # has to be simple
+        if not self.simple(val.left):
+            t = self.temp()
+            guards = [f"({t} := {left}).__class__ is float"]
+            left = t
+        elif self.isFloat(val.left):
+            guards = []
+        else:
+            guards = [f"{left}.__class__ is float"]
+        if not self.isFloat(val.right):
+            guards.append(f"{right}.__class__ is float")
+        if not guards:
+            return f"({left} {symbol} {right})"
+        return (
+            f"({left} {symbol} {right} if {' and '.join(guards)}"
+            f" else {fallback}({left}, {right}))"
+        )
+
+    def visitTernary(self, val):
+        test = self.condition(val.test)
+        return f"({val.left.visit(self)} if {test} else {val.right.visit(self)})"
+
+    def visitLogical(self, val):
+        left = val.left.visit(self)
+        right = val.right.visit(self)
+        isOr = val.operator.type == TokenType.OR
+        if self.isBool(val.left):
+            return f"({left} {'or' if isOr else 'and'} {right})"
+        t = self.temp()
+        test = f"(({t} := {left}) is not None and {t} is not False)"
+        if isOr:
+            return f"({t} if {test} else {right})"
+        return f"({right} if {test} else {t})"
+
+    def visitVariable(self, val):
+        return self.read(val, val.name.lexeme)
+
+    def visitAssign(self, val):
+        value = val.value.visit(self)
+        decl = self.decl(val)
+        if decl is None:
+            return f'({value}, undefinedAssignment("{val.name.lexeme}"))[1]'
+        if decl.boxed:
+            return f"{decl.pyName}.set({value})"
+        return f"({decl.pyName} := {value})"
+
+    def visitCall(self, val):
+        callee = val.callee.visit(self)
+        args = ", ".join(arg.visit(self) for arg in val.arguments)
+        if self.literal(val.callee) is not None:
+            # `"s"()` would be a SyntaxWarning, the arguments still run first
+            return f"notCallable({args})"
+        return f"{callee}({args})"
+
+    def visitGet(self, val):
+        cache = self.propertyCache(val.name.lexeme)
+        return f"getProperty({val.obj.visit(self)}, {cache})"
+
+    def visitSet(self, val):
+        obj = val.obj.visit(self)
+        cache = self.propertyCache(val.name.lexeme)
+        return f"setProperty({obj}, {cache}, {val.val.visit(self)})"
+
+    def visitThis(self, val):
+        return self.read(val, "this")
+
+    def visitSuper(self, val):
+        superclass = self.read(val, "super")
+        return f'superMethod({superclass}, this, "{val.method.lexeme}")'
+
+
+def transpile(program: List[Stmt], filename: str = "<lox>") -> str:
+    return Transpiler().transpile(program, filename)
+
+
+def runPython(source: str, filename: str = "<lox>"):
+    # not the .lox file itself, whose lines don't match the generated ones
+    if not filename.startswith("<"):
+        filename = f"<lox:{filename}>"
+    code = compile(source, filename, "exec")
+    namespace = {"__name__": "lox"}
+    exec(code, namespace)
+    execute(namespace["main"])
@@ -1,19 +1,36 @@
-from typing import Any
-from dataclasses import dataclass
+from types import GeneratorType
 
 
 class ToDoException(Exception):
     pass
 
 
-@dataclass
-class ReturnException(Exception):
-    value: Any
-    pass
+def error(*args):
+    """`logging.error`, importing logging only once something is reported"""
+    import logging
 
+    logging.error(*args)
 
-class BreakException(Exception):
-    pass
+
+class Completion:
+    """How a statement that did not complete normally ended.
+
+    Statements return `RETURN` or `BREAK` instead of raising, anything else
+    means they completed normally. The value of a return is kept by the
+    engine running it. `TAIL_CALL` is a return whose call is left to the
+    caller of the function, see `LoxFunction.run`.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+RETURN = Completion("RETURN")
+BREAK = Completion("BREAK")
+TAIL_CALL = Completion("TAIL_CALL")
 
 
 class RuntimeException(Exception):
@@ -33,3 +50,32 @@ class Visitable:
 
     def __hash__(self):
         return hash(id(self))
+
+
+def trampoline(root):
+    """Runs a computation written as generators on an explicit stack.
+
+    A generator yields what it needs first and is sent back its result:
+    a yielded generator runs the same way on the stack, anything else is
+    sent straight back. What a generator returns is its result, and
+    anything that is not a generator is its own result. Nesting is then
+    bounded by memory instead of the Python recursion limit.
+    """
+    if root.__class__ is not GeneratorType:
+        return root
+    stack = [root]
+    value = None
+    while True:
+        try:
+            child = stack[-1].send(value)
+        except StopIteration as stop:
+            stack.pop()
+            if not stack:
+                return stop.value
+            value = stop.value
+            continue
+        if child.__class__ is GeneratorType:
+            stack.append(child)
+            value = None
+        else:
+            value = child
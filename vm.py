@@ -0,0 +1,464 @@
+from typing import Any, Dict, List
+
+from compiler import Compiler, FunctionProto, OpCode
+from environment import Undefined
+from interpreter import (
+    ClockFn,
+    JoinFn,
+    LoxClass,
+    LoxInstance,
+    div,
+    isTruthy,
+    plus,
+    showFunction,
+)
+from stmt import Stmt
+from util import RuntimeException
+
+CONSTANT = OpCode.CONSTANT.value
+NIL = OpCode.NIL.value
+TRUE = OpCode.TRUE.value
+FALSE = OpCode.FALSE.value
+POP = OpCode.POP.value
+GET_LOCAL = OpCode.GET_LOCAL.value
+SET_LOCAL = OpCode.SET_LOCAL.value
+GET_GLOBAL = OpCode.GET_GLOBAL.value
+DEFINE_GLOBAL = OpCode.DEFINE_GLOBAL.value
+SET_GLOBAL = OpCode.SET_GLOBAL.value
+GET_UPVALUE = OpCode.GET_UPVALUE.value
+SET_UPVALUE = OpCode.SET_UPVALUE.value
+GET_PROPERTY = OpCode.GET_PROPERTY.value
+SET_PROPERTY = OpCode.SET_PROPERTY.value
+GET_SUPER = OpCode.GET_SUPER.value
+EQUAL = OpCode.EQUAL.value
+NOT_EQUAL = OpCode.NOT_EQUAL.value
+GREATER = OpCode.GREATER.value
+GREATER_EQUAL = OpCode.GREATER_EQUAL.value
+LESS = OpCode.LESS.value
+LESS_EQUAL = OpCode.LESS_EQUAL.value
+ADD = OpCode.ADD.value
+SUBTRACT = OpCode.SUBTRACT.value
+MULTIPLY = OpCode.MULTIPLY.value
+DIVIDE = OpCode.DIVIDE.value
+MODULO = OpCode.MODULO.value
+NOT = OpCode.NOT.value
+NEGATE = OpCode.NEGATE.value
+PRINT = OpCode.PRINT.value
+JUMP = OpCode.JUMP.value
+JUMP_IF_FALSE = OpCode.JUMP_IF_FALSE.value
+JUMP_IF_TRUE = OpCode.JUMP_IF_TRUE.value
+POP_JUMP_IF_FALSE = OpCode.POP_JUMP_IF_FALSE.value
+LOOP = OpCode.LOOP.value
+CALL = OpCode.CALL.value
+CLOSURE = OpCode.CLOSURE.value
+CLOSE_UPVALUE = OpCode.CLOSE_UPVALUE.value
+RETURN = OpCode.RETURN.value
+CLASS = OpCode.CLASS.value
+
+
+class _Missing:
+    pass
+
+
+class Upvalue:
+    """A captured variable.
+
+    While open it refers to a slot on the VM stack by `index`, once the
+    slot is popped the value moves into `value` and `index` becomes -1.
+    """
+
+    __slots__ = ("index", "value")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.value = None
+
+
+class Closure:
+    __slots__ = ("proto", "upvalues")
+
+    def __init__(self, proto: FunctionProto, upvalues: List[Upvalue]):
+        self.proto = proto
+        self.upvalues = upvalues
+
+    def __repr__(self):
+        return showFunction(self.proto.name)
+
+    def arity(self):
+        return self.proto.arity
+
+    def bind(self, instance):
+        return BoundMethod(instance, self)
+
+
+class BoundMethod:
+    __slots__ = ("receiver", "method")
+
+    def __init__(self, receiver: Any, method: Closure):
+        self.receiver = receiver
+        self.method = method
+
+    def __repr__(self):
+        return repr(self.method)
+
+    def arity(self):
+        return self.method.arity()
+
+
+class CallFrame:
+    __slots__ = ("closure", "ip", "base")
+
+    def __init__(self, closure: Closure, ip: int, base: int):
+        self.closure = closure
+        self.ip = ip
+        self.base = base
+
+
+def _numbers(left, right):
+    if type(left) is not float:
+        raise RuntimeException(f"Non-float in number operation: {left}")
+    if type(right) is not float:
+        raise RuntimeException(f"Non-float in number operation: {right}")
+
+
+# how many Lox calls may be nested by default, see `--max-call-depth`
+MAX_CALL_DEPTH = 100_000
+
+
+class VM:
+    """A stack based virtual machine that runs `Compiler` output.
+
+    Lox calls push a `CallFrame` on `frames` instead of recursing in
+    Python, so the depth of Lox recursion is only limited by
+    `maxCallDepth`.
+    """
+
+    globals: Dict[str, Any]
+
+    def __init__(self, maxCallDepth: int = MAX_CALL_DEPTH):
+        self.globals = {"clock": ClockFn(), "join": JoinFn()}
+        self.stack: List[Any] = []
+        self.frames: List[CallFrame] = []
+        self.openUpvalues: Dict[int, Upvalue] = {}
+        self.maxCallDepth = maxCallDepth
+
+    def interpret(self, program: List[Stmt]):
+        script = Closure(Compiler().compile(program), [])
+        self.stack.append(script)
+        self.frames.append(CallFrame(script, 0, 0))
+        return self.run()
+
+    def captureUpvalue(self, index: int) -> Upvalue:
+        upvalue = self.openUpvalues.get(index)
+        if upvalue is None:
+            upvalue = Upvalue(index)
+            self.openUpvalues[index] = upvalue
+        return upvalue
+
+    def closeUpvalues(self, last: int):
+        stack = self.stack
+        for index in [i for i in self.openUpvalues if i >= last]:
+            upvalue = self.openUpvalues.pop(index)
+            upvalue.value = stack[index]
+            upvalue.index = -1
+
+    def callValue(self, callee: Any, argc: int) -> bool:
+        """Calls `callee` with the `argc` values on top of the stack.
+
+        Returns True when a new frame was pushed, otherwise the result has
+        already replaced the callee and its arguments on the stack.
+        """
+        stack = self.stack
+        calleeSlot = len(stack) - argc - 1
+        kind = type(callee)
+        if kind is Closure:
+            return self.callClosure(callee, argc, calleeSlot)
+        if kind is BoundMethod:
+            stack[calleeSlot] = callee.receiver
+            return self.callClosure(callee.method, argc, calleeSlot)
+        if kind is LoxClass:
+            instance = LoxInstance(callee)
+            stack[calleeSlot] = instance
+            if callee.initializer is not None:
+                return self.callClosure(callee.initializer, argc, calleeSlot)
+            if argc != 0:
+                raise RuntimeException("Wrong arity for function")
+            return False
+
+        callFunc = getattr(callee, "call", None)
+        arityFunc = getattr(callee, "arity", None)
+        if callFunc is None or arityFunc is None:
+            raise RuntimeException("Can only call functions and classes")
+        if arityFunc() != argc:
+            raise RuntimeException("Wrong arity for function")
+        args = stack[calleeSlot + 1 :]
+        del stack[calleeSlot:]
+        stack.append(callFunc(self, args))
+        return False
+
+    def callClosure(self, closure: Closure, argc: int, base: int) -> bool:
+        if closure.proto.arity != argc:
+            raise RuntimeException("Wrong arity for function")
+        if len(self.frames) >= self.maxCallDepth:
+            raise RuntimeException(self.stackOverflow())
+        self.frames.append(CallFrame(closure, 0, base))
+        return True
+
+    def stackOverflow(self) -> str:
+        """Describes the call stack, innermost call first, repeats folded"""
+        lines = [f"Stack overflow: more than {self.maxCallDepth} nested calls"]
+        previous, repeats = None, 0
+        for frame in reversed(self.frames):
+            proto = frame.closure.proto
+            entry = f"  [line {proto.lines[frame.ip - 1]}] in {proto.name}"
+            if entry == previous:
+                repeats += 1
+                continue
+            if repeats:
+                lines.append(f"  ... {repeats} more of the above")
+            lines.append(entry)
+            previous, repeats = entry, 0
+        if repeats:
+            lines.append(f"  ... {repeats} more of the above")
+        return "\n".join(lines)
+
+    def run(self):
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        frames = self.frames
+        globals = self.globals
+
+        frame = frames[-1]
+        closure = frame.closure
+        code = closure.proto.code
+        constants = closure.proto.constants
+        base = frame.base
+        ip = frame.ip
+
+        while True:
+            op = code[ip]
+            ip += 1
+
+            if op == GET_LOCAL:
+                push(stack[base + code[ip]])
+                ip += 1
+            elif op == CONSTANT:
+                push(constants[code[ip]])
+                ip += 1
+            elif op == POP:
+                pop()
+            elif op == GET_GLOBAL:
+                name = constants[code[ip]]
+                ip += 1
+                value = globals.get(name, _Missing)
+                if value is _Missing:
+                    raise RuntimeException(f"Get to undefined variable: {name}")
+                if value is Undefined:
+                    raise RuntimeException(
+                        f"Variable initialized but not defined: {name}"
+                    )
+                push(value)
+            elif op == SET_LOCAL:
+                stack[base + code[ip]] = stack[-1]
+                ip += 1
+            elif op == POP_JUMP_IF_FALSE:
+                value = pop()
+                if value is None or value is False:
+                    ip = code[ip]
+                else:
+                    ip += 1
+            elif op == LOOP or op == JUMP:
+                ip = code[ip]
+            elif op == ADD:
+                right = pop()
+                left = stack[-1]
+                if type(left) is float and type(right) is float:
+                    stack[-1] = left + right
+                else:
+                    stack[-1] = plus(left, right)
+            elif op == LESS:
+                right = pop()
+                left = stack[-1]
+                _numbers(left, right)
+                stack[-1] = left < right
+            elif op == SUBTRACT:
+                right = pop()
+                left = stack[-1]
+                _numbers(left, right)
+                stack[-1] = left - right
+            elif op == CALL:
+                argc = code[ip]
+                ip += 1
+                callee = stack[-1 - argc]
+                frame.ip = ip
+                if self.callValue(callee, argc):
+                    frame = frames[-1]
+                    closure = frame.closure
+                    code = closure.proto.code
+                    constants = closure.proto.constants
+                    base = frame.base
+                    ip = 0
+            elif op == RETURN:
+                result = pop()
+                if self.openUpvalues:
+                    self.closeUpvalues(base)
+                frames.pop()
+                del stack[base:]
+                if not frames:
+                    return result
+                push(result)
+                frame = frames[-1]
+                closure = frame.closure
+                code = closure.proto.code
+                constants = closure.proto.constants
+                base = frame.base
+                ip = frame.ip
+            elif op == GET_UPVALUE:
+                upvalue = closure.upvalues[code[ip]]
+                ip += 1
+                if upvalue.index >= 0:
+                    push(stack[upvalue.index])
+                else:
+                    push(upvalue.value)
+            elif op == SET_UPVALUE:
+                upvalue = closure.upvalues[code[ip]]
+                ip += 1
+                if upvalue.index >= 0:
+                    stack[upvalue.index] = stack[-1]
+                else:
+                    upvalue.value = stack[-1]
+            elif op == EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] == right
+            elif op == NOT_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] != right
+            elif op == LESS_EQUAL:
+                right = pop()
+                left = stack[-1]
+                _numbers(left, right)
+                stack[-1] = left <= right
+            elif op == GREATER:
+                right = pop()
+                left = stack[-1]
+                _numbers(left, right)
+                stack[-1] = left > right
+            elif op == GREATER_EQUAL:
+                right = pop()
+                left = stack[-1]
+                _numbers(left, right)
+                stack[-1] = left >= right
+            elif op == MULTIPLY:
+                right = pop()
+                left = stack[-1]
+                _numbers(left, right)
+                stack[-1] = left * right
+            elif op == DIVIDE:
+                right = pop()
+                left = stack[-1]
+                _numbers(left, right)
+                stack[-1] = div(left, right)
+            elif op == MODULO:
+                right = pop()
+                left = stack[-1]
+                _numbers(left, right)
+                stack[-1] = left % right
+            elif op == NOT:
+                stack[-1] = not isTruthy(stack[-1])
+            elif op == NEGATE:
+                value = stack[-1]
+                if type(value) is not float:
+                    raise RuntimeException(f"not able to negate number {value}")
+                stack[-1] = 0 - value
+            elif op == JUMP_IF_FALSE:
+                value = stack[-1]
+                if value is None or value is False:
+                    ip = code[ip]
+                else:
+                    ip += 1
+            elif op == JUMP_IF_TRUE:
+                value = stack[-1]
+                if value is None or value is False:
+                    ip += 1
+                else:
+                    ip = code[ip]
+            elif op == NIL:
+                push(None)
+            elif op == TRUE:
+                push(True)
+            elif op == FALSE:
+                push(False)
+            elif op == PRINT:
+                print(pop())
+            elif op == GET_PROPERTY:
+                obj = stack[-1]
+                if type(obj) is not LoxInstance:
+                    raise RuntimeException("Only instances can have properties")
+                cache = constants[code[ip]]
+                ip += 1
+                if obj.shape is cache.shape:
+                    stack[-1] = obj.values[cache.slot]
+                else:
+                    stack[-1] = cache.get(obj)
+            elif op == SET_PROPERTY:
+                value = pop()
+                obj = pop()
+                if type(obj) is not LoxInstance:
+                    raise RuntimeException("Only instances have fields")
+                cache = constants[code[ip]]
+                ip += 1
+                if obj.shape is cache.shape:
+                    obj.values[cache.slot] = value
+                else:
+                    cache.set(obj, value)
+                push(value)
+            elif op == DEFINE_GLOBAL:
+                name = constants[code[ip]]
+                ip += 1
+                if name in globals:
+                    raise RuntimeException(f"Variable already defined: {name}")
+                globals[name] = pop()
+            elif op == SET_GLOBAL:
+                name = constants[code[ip]]
+                ip += 1
+                if name not in globals:
+                    raise RuntimeException(f"Assignment to undefined variable: {name}")
+                globals[name] = stack[-1]
+            elif op == CLOSURE:
+                proto = constants[code[ip]]
+                ip += 1
+                upvalues = []
+                for isLocal, index in proto.upvalues:
+                    if isLocal:
+                        upvalues.append(self.captureUpvalue(base + index))
+                    else:
+                        upvalues.append(closure.upvalues[index])
+                push(Closure(proto, upvalues))
+            elif op == CLOSE_UPVALUE:
+                self.closeUpvalues(len(stack) - 1)
+                pop()
+            elif op == GET_SUPER:
+                name = constants[code[ip]]
+                ip += 1
+                superclass = pop()
+                method = superclass.findMethod(name.lexeme)
+                if method is None:
+                    raise RuntimeException(f"undefined method: {name.lexeme}")
+                stack[-1] = method.bind(stack[-1])
+            elif op == CLASS:
+                name = constants[code[ip]]
+                count = code[ip + 1]
+                hasSuper = code[ip + 2]
+                ip += 3
+                closures = stack[len(stack) - count :]
+                del stack[len(stack) - count :]
+                superclass = None
+                if hasSuper:
+                    superclass = stack[-1]
+                    if type(superclass) is not LoxClass:
+                        raise RuntimeException("superclass must be a class")
+                methods = {c.proto.name: c for c in closures}
+                push(LoxClass(name, methods, superclass))
+            else:
+                raise RuntimeException(f"Unknown opcode: {op}")